@@ -1,11 +1,102 @@
-from datetime import datetime
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context, shared_memory
+from collections import OrderedDict
+import bisect
 import csv
+import functools
+import gzip
+import heapq
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import queue
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zlib
 import tkinter as tk
 from tkinter import ttk
+from tkinter import filedialog
 from tkinter import messagebox
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+FORMAT_DATE = "%Y-%m-%d %H:%M:%S"
+NATURES = ("ventes", "achats")
+EPOQUE = datetime(1970, 1, 1)
+UNE_MICROSECONDE = timedelta(microseconds=1)
+UN_JOUR = 86400 * 1000000
+TAILLE_BLOC_EXPORT = 10000
+LIGNES_MAX_FEUILLE = 1048575
+ENTETE_COLONNES_COMPRESSEES = b"STOCKCOL1\n"
+COLONNES_RAPPORT = (["id_article", "prix_vente", "prix_achat", "valeur_achat", "valeur_vente", "benefice"], "sddddd")
+COLONNES_TRANSACTIONS = (["id_article", "nom", "quantite", "prix_unitaire", "valeur", "date"], "qsdddt")
+
+
+def horodatage(date):
+    return (date - EPOQUE) // UNE_MICROSECONDE
+
+
+def date_depuis_horodatage(valeur):
+    return EPOQUE + timedelta(microseconds=valeur)
+
+
+# Sommes de quantités exactes : chaque réel devient un entier à l'échelle du plus petit réel représentable
+# (2**-1074). L'addition d'entiers ne dépend ni de l'ordre ni du découpage en journées ou en tranches ;
+# seule la division finale arrondit, une fois, comme math.fsum.
+ECHELLE_SOMME = 1074
+
+
+def quantite_exacte(quantite):
+    numerateur, denominateur = quantite.as_integer_ratio()
+    return numerateur << (ECHELLE_SOMME + 1 - denominateur.bit_length())
+
+
+def arrondir_somme(total):
+    return total / (1 << ECHELLE_SOMME)
+
+
+class SommeExacte:
+    # Agrégat SQLite : la somme de SUM dépend de l'ordre des lignes, celle-ci est celle des autres moteurs
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, quantite):
+        self.total += quantite_exacte(quantite)
+
+    def finalize(self):
+        return arrondir_somme(self.total)
+
 
 class Article:
+    __slots__ = ("id_article", "nom", "prix_vente", "prix_achat", "stock_initial", "stock", "date")
 
     def __init__(self, id_article, nom, prix_vente, prix_achat, stock=0, date=None):
         if prix_vente <= 0 or prix_achat <= 0:
@@ -14,6 +105,8 @@ class Article:
         self.nom = nom
         self.prix_vente = prix_vente
         self.prix_achat = prix_achat
+        # stock_initial est le solde d'ouverture enregistré ; stock y ajoute les achats et retire les ventes
+        self.stock_initial = stock
         self.stock = stock
         self.date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -29,150 +122,2681 @@ class Article:
                 f"Stock: {self.stock} - Date d'ajout: {self.date}")
 
 
-class GestionStock:
-    FILENAME_ARTICLES = "articles.csv"
-    FILENAME_VENTES = "ventes.csv"
-    FILENAME_ACHATS = "achats.csv"
+class Journal:
+    # Journal en ajout seul : "+" pour une nouvelle transaction, "~" pour une correction.
+    # Chaque entrée porte le rang de la transaction, ce qui rend le rejeu idempotent.
 
-    def __init__(self):
-        self.articles = []
-        self.ventes = []
-        self.achats = []
-        self.charger_articles()
-        self.charger_ventes()
-        self.charger_achats()
+    def __init__(self, filename, fsync=False):
+        self.filename = filename
+        self.fsync = fsync
+        self.nb_entrees = 0
+        self._fichier = None
+        self._writer = None
 
-    def charger_articles(self):
+    def rejouer(self):
+        self.nb_entrees = 0
         try:
-            with open(self.FILENAME_ARTICLES, "r", newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    article = Article(int(row["id_article"]), row["nom"], float(
-                        row["prix_vente"]), float(row["prix_achat"]), int(row["stock"]), row["date"])
-                    self.articles.append(article)
+            with open(self.filename, "r", newline='') as csvfile:
+                for row in csv.reader(csvfile):
+                    try:
+                        operation, rang, id_article, quantite, date = row
+                        transaction = {
+                            "id_article": int(id_article),
+                            "quantite": float(quantite),
+                            "date": datetime.strptime(date, FORMAT_DATE)
+                        }
+                        rang = int(rang)
+                    except ValueError:
+                        # Ligne tronquée par un arrêt brutal : on l'ignore
+                        continue
+                    self.nb_entrees += 1
+                    yield operation, rang, transaction
         except FileNotFoundError:
             pass
 
-    def charger_ventes(self):
-        self._charger_transactions(self.FILENAME_VENTES, self.ventes)
+    def ecrire(self, operation, rang, transaction):
+        self.ecrire_lot([(operation, rang, transaction)])
+
+    def ecrire_lot(self, entrees):
+        # Un seul flush (et fsync) pour tout le lot
+        if self._fichier is None:
+            self._ouvrir()
+        for operation, rang, transaction in entrees:
+            self._writer.writerow([operation, rang, transaction["id_article"], transaction["quantite"],
+                                   transaction["date"].strftime(FORMAT_DATE)])
+            self.nb_entrees += 1
+        self._fichier.flush()
+        if self.fsync:
+            os.fsync(self._fichier.fileno())
+
+    def _ouvrir(self):
+        # Une dernière ligne sans fin de ligne ne doit pas se coller à la suivante
+        ligne_tronquee = False
+        try:
+            with open(self.filename, "rb") as fichier:
+                fichier.seek(0, os.SEEK_END)
+                if fichier.tell() > 0:
+                    fichier.seek(-1, os.SEEK_END)
+                    ligne_tronquee = fichier.read(1) != b"\n"
+        except FileNotFoundError:
+            pass
+        self._fichier = open(self.filename, "a", newline='')
+        if ligne_tronquee:
+            self._fichier.write("\r\n")
+        self._writer = csv.writer(self._fichier)
 
-    def charger_achats(self):
-        self._charger_transactions(self.FILENAME_ACHATS, self.achats)
+    def est_vide(self):
+        try:
+            return os.path.getsize(self.filename) == 0
+        except FileNotFoundError:
+            return True
+
+    def vider(self):
+        self.fermer()
+        open(self.filename, "w").close()
+        self.nb_entrees = 0
+
+    def fermer(self):
+        if self._fichier is not None:
+            self._fichier.close()
+            self._fichier = None
+            self._writer = None
+
+
+class TableTransactions(Sequence):
+    # Transactions en colonnes (array) : 24 octets par ligne au lieu d'un dict et d'un datetime.
+    # Les lignes sont rendues sous forme de dict neufs : modifier la table passe par modifier().
+
+    def __init__(self, transactions=()):
+        self.ids = array("q")
+        self.quantites = array("d")
+        self.dates = array("q")
+        for transaction in transactions:
+            self.append(transaction)
+
+    @classmethod
+    def depuis_colonnes(cls, ids, quantites, dates):
+        table = cls()
+        table.ids, table.quantites, table.dates = ids, quantites, dates
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, rang):
+        if isinstance(rang, slice):
+            return [self[i] for i in range(*rang.indices(len(self)))]
+        return {"id_article": self.ids[rang], "quantite": self.quantites[rang],
+                "date": date_depuis_horodatage(self.dates[rang])}
+
+    def __iter__(self):
+        for id_article, quantite, valeur in zip(self.ids, self.quantites, self.dates):
+            yield {"id_article": id_article, "quantite": quantite, "date": date_depuis_horodatage(valeur)}
+
+    def append(self, transaction):
+        self.ids.append(transaction["id_article"])
+        self.quantites.append(transaction["quantite"])
+        self.dates.append(horodatage(transaction["date"]))
+
+    def modifier(self, rang, transaction):
+        self.ids[rang] = transaction["id_article"]
+        self.quantites[rang] = transaction["quantite"]
+        self.dates[rang] = horodatage(transaction["date"])
+
+    # Lignes déjà écrites par un autre processus : seule la copie en mémoire est mise à jour
+    def integrer_ajout(self, transaction):
+        self.append(transaction)
+
+    def integrer_correction(self, rang, transaction):
+        self.modifier(rang, transaction)
+
+
+class TableMappee(TableTransactions):
+    # Colonnes d'une nature dans trois fichiers binaires (id, quantité, horodatage), lues par mmap :
+    # ids, quantites et dates sont des vues sans copie, partagées avec les autres lecteurs par le cache
+    # du système. Les ajouts sont écrits en fin de fichier, les corrections en place.
+    COLONNES = (("ids", "q"), ("quantites", "d"), ("dates", "q"))
+
+    def __init__(self, prefixe, fsync=False):
+        self.filenames = [f"{prefixe}.{nom}" for nom, _ in self.COLONNES]
+        self.fsync = fsync
+        self._fichiers = None
+        self._vues = None
+        self._a_tronquer = False
+        self.ouvrir()
+
+    def ouvrir(self):
+        self.fermer()
+        for filename in self.filenames:
+            open(filename, "ab").close()
+        self._fichiers = [open(filename, "r+b") for filename in self.filenames]
+        # Un arrêt pendant un ajout peut laisser une colonne plus longue que les autres : la lecture s'arrête
+        # à la plus courte, et le surplus n'est coupé qu'au prochain ajout, par celui qui écrit. Le couper
+        # ici pourrait amputer la ligne qu'un autre processus est en train d'écrire.
+        tailles = [os.fstat(fichier.fileno()).st_size for fichier in self._fichiers]
+        self._nb = min(tailles) // 8
+        self._a_tronquer = max(tailles) != self._nb * 8
+
+    def _vue(self, indice):
+        # Les vues sont reprises dans une variable locale : append() peut remettre _vues à None entre-temps
+        vues = self._vues
+        if vues is None:
+            self.vider_tampon()
+            nb = self._nb
+            cartes = []
+            for fichier, (_, code) in zip(self._fichiers, self.COLONNES):
+                if nb:
+                    carte = mmap.mmap(fichier.fileno(), nb * 8, access=mmap.ACCESS_READ)
+                    cartes.append(memoryview(carte).cast(code))
+                else:
+                    cartes.append(memoryview(b"").cast(code))
+            vues = tuple(cartes)
+            self._vues = vues
+        return vues[indice]
+
+    @property
+    def ids(self):
+        return self._vue(0)
+
+    @property
+    def quantites(self):
+        return self._vue(1)
+
+    @property
+    def dates(self):
+        return self._vue(2)
+
+    def __len__(self):
+        return self._nb
+
+    def actualiser(self):
+        # Reprend la longueur des fichiers, que d'autres processus ont pu allonger
+        self.vider_tampon()
+        self._nb = min(os.fstat(fichier.fileno()).st_size for fichier in self._fichiers) // 8
+        self._vues = None
+
+    def append(self, transaction):
+        if self._a_tronquer:
+            for fichier in self._fichiers:
+                fichier.truncate(self._nb * 8)
+            self._a_tronquer = False
+        for fichier, (_, code), valeur in zip(self._fichiers, self.COLONNES,
+                                              (transaction["id_article"], transaction["quantite"],
+                                               horodatage(transaction["date"]))):
+            fichier.seek(self._nb * 8)
+            fichier.write(struct.pack(code, valeur))
+        self._nb += 1
+        # Les vues seront recartographiées au prochain accès
+        self._vues = None
+
+    def modifier(self, rang, transaction):
+        for fichier, (_, code), valeur in zip(self._fichiers, self.COLONNES,
+                                              (transaction["id_article"], transaction["quantite"],
+                                               horodatage(transaction["date"]))):
+            fichier.seek(rang * 8)
+            fichier.write(struct.pack(code, valeur))
+        self.vider_tampon()
+
+    def integrer_ajout(self, transaction):
+        # La ligne est déjà dans les fichiers, et les corrections arrivent par le cache du système
+        self._nb += 1
+        self._vues = None
+
+    def integrer_correction(self, rang, transaction):
+        pass
+
+    def vider_tampon(self):
+        for fichier in self._fichiers:
+            fichier.flush()
+            if self.fsync:
+                os.fsync(fichier.fileno())
+
+    def fermer(self):
+        if self._fichiers is not None:
+            self.vider_tampon()
+            for fichier in self._fichiers:
+                fichier.close()
+        self._fichiers = None
+        self._vues = None
+
+
+class Instantane:
+    # Copie binaire du catalogue et des transactions, relue d'un bloc au démarrage.
+    # En-tête : signature, version, CRC32 du contenu, tailles, puis (taille, mtime) des fichiers sources.
+    # Contenu : articles en enregistrements de taille fixe, leurs textes, puis les colonnes ventes et achats.
+    MAGIQUE = b"GSTOCKSN"
+    VERSION = 1
+    NB_SOURCES = 5
+    ENTETE = struct.Struct(f"<8sIIqqqq{2 * NB_SOURCES}q")
+    ARTICLE = struct.Struct("<qddqIIII")
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def _lire_entete(self, fichier):
+        entete = fichier.read(self.ENTETE.size)
+        if len(entete) < self.ENTETE.size:
+            return None
+        magique, version, crc, nb_articles, nb_ventes, nb_achats, taille_textes, *sources = \
+            self.ENTETE.unpack(entete)
+        if magique != self.MAGIQUE or version != self.VERSION:
+            return None
+        return crc, nb_articles, {"ventes": nb_ventes, "achats": nb_achats}, taille_textes, sources
+
+    def lire(self, sources):
+        # Renvoie {"articles", "ventes", "achats"} ou None si l'instantané manque, est abîmé ou périmé
+        try:
+            with open(self.filename, "rb") as fichier:
+                entete = self._lire_entete(fichier)
+                if entete is None or entete[4] != sources:
+                    return None
+                crc, nb_articles, nb_lignes, taille_textes, _ = entete
+                contenu = memoryview(fichier.read())
+        except FileNotFoundError:
+            return None
+        attendu = nb_articles * self.ARTICLE.size + taille_textes + 24 * sum(nb_lignes.values())
+        if len(contenu) != attendu or zlib.crc32(contenu) != crc:
+            return None
+        position = nb_articles * self.ARTICLE.size
+        textes = contenu[position:position + taille_textes]
+        articles = [Article(id_article, bytes(textes[debut_nom:debut_nom + taille_nom]).decode("utf-8"), prix_vente,
+                            prix_achat, stock, bytes(textes[debut_date:debut_date + taille_date]).decode("utf-8"))
+                    for id_article, prix_vente, prix_achat, stock, debut_nom, taille_nom, debut_date, taille_date
+                    in self.ARTICLE.iter_unpack(contenu[:position])]
+        resultat = {"articles": articles}
+        position += taille_textes
+        for nature in NATURES:
+            colonnes = []
+            for code in "qdq":
+                colonne = array(code)
+                colonne.frombytes(contenu[position:position + 8 * nb_lignes[nature]])
+                if sys.byteorder != "little":
+                    colonne.byteswap()
+                colonnes.append(colonne)
+                position += 8 * nb_lignes[nature]
+            resultat[nature] = TableTransactions.depuis_colonnes(*colonnes)
+        return resultat
+
+    def ecrire(self, articles, tables, sources):
+        enregistrements = bytearray()
+        textes = bytearray()
+        for article in articles:
+            nom = article.nom.encode("utf-8")
+            date = str(article.date).encode("utf-8")
+            enregistrements += self.ARTICLE.pack(article.id_article, article.prix_vente, article.prix_achat,
+                                                 article.stock_initial, len(textes), len(nom),
+                                                 len(textes) + len(nom), len(date))
+            textes += nom
+            textes += date
+        morceaux = [enregistrements, textes]
+        for nature in NATURES:
+            for colonne in (tables[nature].ids, tables[nature].quantites, tables[nature].dates):
+                if sys.byteorder != "little":
+                    colonne = array(colonne.typecode, colonne)
+                    colonne.byteswap()
+                morceaux.append(colonne.tobytes())
+        crc = 0
+        for morceau in morceaux:
+            crc = zlib.crc32(morceau, crc)
+        filename_tmp = self.filename + ".tmp"
+        with open(filename_tmp, "wb") as fichier:
+            fichier.write(self.ENTETE.pack(self.MAGIQUE, self.VERSION, crc, len(articles), len(tables["ventes"]),
+                                           len(tables["achats"]), len(textes), *sources))
+            for morceau in morceaux:
+                fichier.write(morceau)
+        os.replace(filename_tmp, self.filename)
+
+
+class Coordination:
+    # Accès de plusieurs processus au même dossier. Les écritures se font sous un verrou consultatif
+    # (stock.lock), après avoir rattrapé le registre, puis y sont publiées : une ligne JSON par
+    # modification. Les autres processus comparent la taille du registre à leur position et ne
+    # relisent que la fin. Le registre commence par un numéro de génération, changé à chaque
+    # renouvellement : un processus qui ne le reconnaît plus relit tout depuis les fichiers.
+    FILENAME_VERROU = "stock.lock"
+    FILENAME_REGISTRE = "stock.registre"
+    TAILLE_RENOUVELLEMENT = 1 << 20
+
+    def __init__(self, dossier="."):
+        self.filename_verrou = os.path.join(dossier, self.FILENAME_VERROU)
+        self.filename_registre = os.path.join(dossier, self.FILENAME_REGISTRE)
+        self._verrou = threading.RLock()
+        self._profondeur = 0
+        self._fichier_verrou = open(self.filename_verrou, "a+b")
+        self._generation = None
+        self._position = 0
+
+    def __enter__(self):
+        self._verrou.acquire()
+        if self._profondeur == 0:
+            try:
+                self._verrouiller()
+            except BaseException:
+                self._verrou.release()
+                raise
+        self._profondeur += 1
+        return self
+
+    def __exit__(self, *exception):
+        self._profondeur -= 1
+        if self._profondeur == 0:
+            self._deverrouiller()
+        self._verrou.release()
+
+    def _verrouiller(self):
+        if fcntl is not None:
+            fcntl.flock(self._fichier_verrou.fileno(), fcntl.LOCK_EX)
+            return
+        # msvcrt.locking abandonne après dix essais d'une seconde : on insiste
+        self._fichier_verrou.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self._fichier_verrou.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+
+    def _deverrouiller(self):
+        if fcntl is not None:
+            fcntl.flock(self._fichier_verrou.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fichier_verrou.seek(0)
+            msvcrt.locking(self._fichier_verrou.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def modifie(self):
+        # Test sans verrou : le registre a-t-il bougé depuis la dernière lecture ?
+        try:
+            return os.path.getsize(self.filename_registre) != self._position
+        except FileNotFoundError:
+            return True
 
-    def _charger_transactions(self, filename, transaction_list):
+    def rattacher(self):
+        # Sous le verrou : les fichiers font foi pour tout ce que le registre contient déjà
         try:
-            with open(filename, "r", newline='') as csvfile:
+            with open(self.filename_registre, "rb") as fichier:
+                generation = fichier.readline()
+                taille = fichier.seek(0, os.SEEK_END)
+        except FileNotFoundError:
+            generation = b""
+        if generation.endswith(b"\n"):
+            self._generation, self._position = generation, taille
+        else:
+            self._renouveler()
+
+    def _renouveler(self):
+        self._generation = os.urandom(8).hex().encode("ascii") + b"\n"
+        filename_tmp = self.filename_registre + ".tmp"
+        with open(filename_tmp, "wb") as fichier:
+            fichier.write(self._generation)
+        os.replace(filename_tmp, self.filename_registre)
+        self._position = len(self._generation)
+
+    def nouveautes(self):
+        # Sous le verrou : entrées publiées depuis la dernière lecture, None si le registre a été renouvelé
+        try:
+            with open(self.filename_registre, "rb") as fichier:
+                if fichier.readline() != self._generation:
+                    return None
+                fichier.seek(self._position)
+                donnees = fichier.read()
+        except FileNotFoundError:
+            return None
+        self._position += len(donnees)
+        return [json.loads(ligne) for ligne in donnees.splitlines()]
+
+    def publier(self, entrees):
+        # Sous le verrou, registre rattrapé : la position est la fin du fichier
+        donnees = "".join(json.dumps(entree, ensure_ascii=False) + "\n" for entree in entrees).encode("utf-8")
+        if self._position + len(donnees) > self.TAILLE_RENOUVELLEMENT:
+            self._renouveler()
+        with open(self.filename_registre, "ab") as fichier:
+            fichier.write(donnees)
+        self._position += len(donnees)
+
+    def fermer(self):
+        self._fichier_verrou.close()
+
+
+class StockageCSV:
+    FILENAME_ARTICLES = "articles.csv"
+    FILENAME_VENTES = "ventes.csv"
+    FILENAME_ACHATS = "achats.csv"
+    FILENAME_CHECKPOINT = "stocks.checkpoint"
+    FILENAME_INSTANTANE = "stock.snapshot"
+    SEUIL_COMPACTION = 1000
+    MOTEUR_RAPPORT = "python"
+    # Une correction, un ajout peuvent-ils s'écrire sans l'historique complet en mémoire ?
+    CORRECTION_PONCTUELLE = False
+    AJOUT_PONCTUEL = False
+
+    def __init__(self, dossier=".", journal=False, fsync=False):
+        self.dossier = dossier
+        self.filename_articles = os.path.join(dossier, self.FILENAME_ARTICLES)
+        self.filenames = {"ventes": os.path.join(dossier, self.FILENAME_VENTES),
+                          "achats": os.path.join(dossier, self.FILENAME_ACHATS)}
+        self.filename_checkpoint = os.path.join(dossier, self.FILENAME_CHECKPOINT)
+        self.instantane = Instantane(os.path.join(dossier, self.FILENAME_INSTANTANE))
+        self._contenu_instantane = None
+        self._sources_instantane = None
+        self.journaux = {}
+        if journal:
+            self.journaux = {nature: Journal(os.path.join(dossier, f"{nature}.journal"), fsync) for nature in NATURES}
+            # Un ajout ne touche que le journal ; le repli relit alors le CSV en flux
+            self.AJOUT_PONCTUEL = True
+
+    def _sources(self):
+        # (taille, mtime) des CSV et des journaux : l'instantané n'est repris que s'ils n'ont pas bougé depuis
+        sources = []
+        for filename in (self.filename_articles, self.filenames["ventes"], self.filenames["achats"],
+                         *(os.path.join(self.dossier, f"{nature}.journal") for nature in NATURES)):
+            try:
+                etat = os.stat(filename)
+                sources += [etat.st_size, etat.st_mtime_ns]
+            except FileNotFoundError:
+                sources += [-1, 0]
+        return sources
+
+    def _depuis_instantane(self, partie):
+        # Chaque partie n'est rendue qu'une fois : la mémoire revient ensuite à GestionStock seul
+        sources = self._sources()
+        if self._contenu_instantane is None or self._contenu_instantane["sources"] != sources:
+            self._contenu_instantane = self.instantane.lire(sources) or {}
+            self._contenu_instantane["sources"] = sources
+            if len(self._contenu_instantane) > 1:
+                self._sources_instantane = sources
+        return self._contenu_instantane.pop(partie, None)
+
+    def lire_articles(self):
+        articles = self._depuis_instantane("articles")
+        if articles is not None:
+            yield from articles
+            return
+        try:
+            with open(self.filename_articles, "r", newline='') as csvfile:
                 reader = csv.DictReader(csvfile)
                 for row in reader:
+                    yield Article(int(row["id_article"]), row["nom"], float(
+                        row["prix_vente"]), float(row["prix_achat"]), int(row["stock"]), row["date"])
+        except FileNotFoundError:
+            pass
+
+    def ecrire_articles(self, articles):
+        self._sauvegarder(self.filename_articles, ["id_article", "nom", "prix_vente", "prix_achat", "stock", "date"],
+                          ([article.id_article, article.nom, article.prix_vente, article.prix_achat,
+                            article.stock_initial, article.date] for article in articles))
+
+    def lire_transactions(self, nature):
+        return [transaction for _, transaction in self.iterer_transactions(nature)]
+
+    def lire_table(self, nature):
+        table = self._depuis_instantane(nature)
+        if table is None:
+            table = TableTransactions(transaction for _, transaction in self.iterer_transactions(nature))
+        return table
+
+    def ecrire_instantane(self, articles, tables):
+        # Réécrit seulement si l'instantané relu au démarrage ne correspond plus aux fichiers
+        sources = self._sources()
+        if self._sources_instantane != sources:
+            self.instantane.ecrire(articles, tables, sources)
+            self._sources_instantane = sources
+
+    def iterer_transactions(self, nature, date_debut=None, date_fin=None, id_article=None, depuis=0):
+        # Lecture en flux de (rang, transaction) ; les filtres sur la date comparent d'abord le texte
+        corrections, ajouts = self._lire_journal(nature)
+        texte_debut = date_debut.strftime(FORMAT_DATE) if date_debut is not None else None
+        texte_fin = date_fin.strftime(FORMAT_DATE) if date_fin is not None else None
+        rang = -1
+        try:
+            with open(self.filenames[nature], "r", newline='', buffering=1 << 20) as csvfile:
+                reader = csv.reader(csvfile)
+                next(reader, None)
+                for rang, row in enumerate(reader):
+                    if rang < depuis:
+                        continue
+                    if rang in corrections:
+                        yield from self._filtrer([(rang, corrections[rang])], date_debut, date_fin, id_article)
+                        continue
+                    if id_article is not None and int(row[0]) != id_article:
+                        continue
+                    if (texte_debut is not None and row[2] < texte_debut) or (texte_fin is not None and row[2] > texte_fin):
+                        continue
                     transaction = {
-                        "id_article": int(row["id_article"]),
-                        "quantite":float(row["quantite"]),
-                        "date": datetime.strptime(row["date"], "%Y-%m-%d %H:%M:%S")
+                        "id_article": int(row[0]),
+                        "quantite": float(row[1]),
+                        "date": datetime.strptime(row[2], FORMAT_DATE)
                     }
-                    transaction_list.append(transaction)
+                    if row[2] == texte_debut or row[2] == texte_fin:
+                        # Seconde d'une borne : le texte ignore ses microsecondes, la date lue tranche
+                        yield from self._filtrer([(rang, transaction)], date_debut, date_fin, None)
+                        continue
+                    yield rang, transaction
+        except FileNotFoundError:
+            pass
+        nb_lignes = rang + 1
+        ajouts = [(rang, transaction) for rang, transaction in ajouts if rang >= max(nb_lignes, depuis)]
+        yield from self._filtrer(ajouts, date_debut, date_fin, id_article)
+
+    def _lire_journal(self, nature):
+        # Le journal est borné par SEUIL_COMPACTION : il tient en mémoire
+        corrections = {}
+        ajouts = {}
+        journal = self.journaux.get(nature)
+        if journal is not None:
+            for operation, rang, transaction in journal.rejouer():
+                if operation == "+":
+                    ajouts.setdefault(rang, transaction)
+                else:
+                    corrections[rang] = transaction
+                    if rang in ajouts:
+                        ajouts[rang] = transaction
+        return corrections, sorted(ajouts.items())
+
+    @staticmethod
+    def _filtrer(transactions, date_debut, date_fin, id_article):
+        for rang, transaction in transactions:
+            if id_article is not None and transaction["id_article"] != id_article:
+                continue
+            if (date_debut is not None and transaction["date"] < date_debut) or \
+                    (date_fin is not None and transaction["date"] > date_fin):
+                continue
+            yield rang, transaction
+
+    def ecrire_transactions(self, nature, transaction_list):
+        self._sauvegarder(self.filenames[nature], ["id_article", "quantite", "date"],
+                          ([transaction["id_article"], transaction["quantite"], transaction["date"].strftime(FORMAT_DATE)]
+                           for transaction in transaction_list))
+
+    def _sauvegarder(self, filename, fieldnames, rows):
+        # Écriture dans un fichier temporaire puis remplacement atomique
+        filename_tmp = filename + ".tmp"
+        with open(filename_tmp, "w", newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
+        os.replace(filename_tmp, filename)
+
+    def ajouter_transaction(self, nature, rang, transaction_list):
+        self._journaliser(nature, "+", [rang], transaction_list)
+
+    def ajouter_transactions(self, nature, rangs, transaction_list):
+        self._journaliser(nature, "+", rangs, transaction_list)
+
+    def corriger_transaction(self, nature, rang, transaction_list):
+        self._journaliser(nature, "~", [rang], transaction_list)
+
+    def _journaliser(self, nature, operation, rangs, transaction_list):
+        journal = self.journaux.get(nature)
+        if journal is None:
+            self.ecrire_transactions(nature, transaction_list)
+            return
+        journal.ecrire_lot([(operation, rang, transaction_list[rang]) for rang in rangs])
+        if journal.nb_entrees >= self.SEUIL_COMPACTION:
+            self.compacter(nature, transaction_list if isinstance(transaction_list, Sequence) else None)
+
+    def compacter(self, nature, transaction_list=None):
+        # Replie le journal dans le fichier CSV complet ; sans historique en mémoire, il est relu en flux
+        journal = self.journaux.get(nature)
+        if journal is not None and not journal.est_vide():
+            if transaction_list is None:
+                transaction_list = (transaction for _, transaction in self.iterer_transactions(nature))
+            self.ecrire_transactions(nature, transaction_list)
+            journal.vider()
+
+    def lire_checkpoint(self):
+        try:
+            with open(self.filename_checkpoint, "r") as fichier:
+                return json.load(fichier)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def ecrire_checkpoint(self, checkpoint):
+        filename_tmp = self.filename_checkpoint + ".tmp"
+        with open(filename_tmp, "w") as fichier:
+            json.dump(checkpoint, fichier)
+        os.replace(filename_tmp, self.filename_checkpoint)
+
+    def supprimer_checkpoint(self):
+        try:
+            os.remove(self.filename_checkpoint)
         except FileNotFoundError:
             pass
 
+    def fermer(self):
+        for journal in self.journaux.values():
+            journal.fermer()
+
+
+class StockageSQLite:
+    FILENAME = "stock.db"
+    MOTEUR_RAPPORT = "sql"
+    CORRECTION_PONCTUELLE = True
+    AJOUT_PONCTUEL = True
+
+    def __init__(self, filename=None):
+        self.filename = filename or self.FILENAME
+        self.dossier = os.path.dirname(os.path.abspath(self.filename))
+        # La connexion est ouverte ici puis utilisée par le travailleur de StockApp
+        self.connexion = sqlite3.connect(self.filename, check_same_thread=False)
+        self.connexion.execute("PRAGMA journal_mode=WAL")
+        self.connexion.execute("PRAGMA synchronous=NORMAL")
+        self.connexion.create_aggregate("somme_exacte", 1, SommeExacte)
+        with self.connexion:
+            self.connexion.execute("CREATE TABLE IF NOT EXISTS articles (id_article INTEGER PRIMARY KEY, nom TEXT, "
+                                   "prix_vente REAL, prix_achat REAL, stock INTEGER, date TEXT)")
+            for nature in NATURES:
+                self.connexion.execute(f"CREATE TABLE IF NOT EXISTS {nature} (rang INTEGER PRIMARY KEY, "
+                                       "id_article INTEGER, quantite REAL, date TEXT)")
+                self.connexion.execute(f"CREATE INDEX IF NOT EXISTS {nature}_id_article ON {nature} (id_article)")
+                self.connexion.execute(f"CREATE INDEX IF NOT EXISTS {nature}_date ON {nature} (date)")
+            self.connexion.execute("CREATE TABLE IF NOT EXISTS checkpoint (cle TEXT PRIMARY KEY, valeur TEXT)")
+
+    @staticmethod
+    def _date_vers_texte(date):
+        # Format ISO : l'ordre alphabétique du texte suit l'ordre chronologique
+        return date.isoformat(" ")
+
+    def lire_articles(self):
+        for row in self.connexion.execute("SELECT id_article, nom, prix_vente, prix_achat, stock, date FROM articles "
+                                          "ORDER BY rowid"):
+            yield Article(*row)
+
+    def ecrire_articles(self, articles):
+        with self.connexion:
+            self.connexion.execute("DELETE FROM articles")
+            self.connexion.executemany("INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+                                       ((article.id_article, article.nom, article.prix_vente, article.prix_achat,
+                                         article.stock_initial, article.date) for article in articles))
+
+    def lire_transactions(self, nature):
+        return [transaction for _, transaction in self.iterer_transactions(nature)]
+
+    def lire_table(self, nature):
+        return TableTransactions(transaction for _, transaction in self.iterer_transactions(nature))
+
+    def ecrire_instantane(self, articles, tables):
+        # La base se relit déjà sans analyse de texte : pas d'instantané
+        pass
+
+    def iterer_transactions(self, nature, date_debut=None, date_fin=None, id_article=None, depuis=0,
+                            taille_bloc=10000):
+        conditions = []
+        parametres = []
+        if depuis:
+            conditions.append("rang >= ?")
+            parametres.append(depuis)
+        if date_debut is not None:
+            conditions.append("date >= ?")
+            parametres.append(self._date_vers_texte(date_debut))
+        if date_fin is not None:
+            conditions.append("date <= ?")
+            parametres.append(self._date_vers_texte(date_fin))
+        if id_article is not None:
+            conditions.append("id_article = ?")
+            parametres.append(id_article)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        curseur = self.connexion.execute(f"SELECT rang, id_article, quantite, date FROM {nature} {where}ORDER BY rang",
+                                         parametres)
+        while True:
+            rows = curseur.fetchmany(taille_bloc)
+            if not rows:
+                break
+            for rang, id_article_row, quantite, date in rows:
+                yield rang, {"id_article": id_article_row, "quantite": quantite, "date": datetime.fromisoformat(date)}
+
+    def ecrire_transactions(self, nature, transaction_list):
+        with self.connexion:
+            self.connexion.execute(f"DELETE FROM {nature}")
+            self.connexion.executemany(f"INSERT INTO {nature} VALUES (?, ?, ?, ?)",
+                                       ((rang, transaction["id_article"], transaction["quantite"],
+                                         self._date_vers_texte(transaction["date"]))
+                                        for rang, transaction in enumerate(transaction_list)))
+
+    def ajouter_transaction(self, nature, rang, transaction_list):
+        self.ajouter_transactions(nature, [rang], transaction_list)
+
+    def ajouter_transactions(self, nature, rangs, transaction_list):
+        with self.connexion:
+            self.connexion.executemany(f"INSERT OR REPLACE INTO {nature} VALUES (?, ?, ?, ?)",
+                                       ((rang, transaction["id_article"], transaction["quantite"],
+                                         self._date_vers_texte(transaction["date"]))
+                                        for rang, transaction in ((rang, transaction_list[rang]) for rang in rangs)))
+
+    def corriger_transaction(self, nature, rang, transaction_list):
+        self.ajouter_transaction(nature, rang, transaction_list)
+
+    def quantites_par_article(self, nature, date_debut, date_fin):
+        # Filtre et regroupement faits par SQLite, dans l'ordre de première apparition
+        return self.connexion.execute(
+            f"SELECT id_article, somme_exacte(quantite) FROM {nature} WHERE date BETWEEN ? AND ? "
+            "GROUP BY id_article ORDER BY MIN(date), MIN(rang)",
+            (self._date_vers_texte(date_debut), self._date_vers_texte(date_fin))).fetchall()
+
+    def lire_checkpoint(self):
+        row = self.connexion.execute("SELECT valeur FROM checkpoint WHERE cle = 'stocks'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def ecrire_checkpoint(self, checkpoint):
+        with self.connexion:
+            self.connexion.execute("INSERT OR REPLACE INTO checkpoint VALUES ('stocks', ?)", (json.dumps(checkpoint),))
+
+    def supprimer_checkpoint(self):
+        with self.connexion:
+            self.connexion.execute("DELETE FROM checkpoint WHERE cle = 'stocks'")
+
+    def compacter(self, nature, transaction_list):
+        self.connexion.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def fermer(self):
+        self.connexion.close()
+
+
+class StockageColonnes(StockageCSV):
+    # Articles et point de contrôle en CSV/JSON comme StockageCSV, transactions en colonnes mmap (TableMappee)
+    MOTEUR_RAPPORT = "numpy" if np is not None else "python"
+    CORRECTION_PONCTUELLE = True
+    AJOUT_PONCTUEL = True
+
+    def __init__(self, dossier=".", fsync=False):
+        super().__init__(dossier)
+        self.fsync = fsync
+        self._tables = {nature: None for nature in NATURES}
+
+    def _table(self, nature):
+        if self._tables[nature] is None:
+            self._tables[nature] = TableMappee(os.path.join(self.dossier, nature), self.fsync)
+        return self._tables[nature]
+
+    def lire_table(self, nature):
+        if self._tables[nature] is not None:
+            # Relecture : un autre processus a pu allonger ou remplacer les fichiers
+            self._tables[nature].ouvrir()
+        return self._table(nature)
+
+    def ecrire_instantane(self, articles, tables):
+        # Les colonnes se relisent déjà sans analyse : pas d'instantané
+        pass
+
+    def iterer_transactions(self, nature, date_debut=None, date_fin=None, id_article=None, depuis=0):
+        # Filtres appliqués aux valeurs brutes, le dict n'est construit que pour les lignes retenues
+        table = self._table(nature)
+        debut = horodatage(date_debut) if date_debut is not None else None
+        fin = horodatage(date_fin) if date_fin is not None else None
+        ids, quantites, dates = table.ids, table.quantites, table.dates
+        for rang in range(depuis, len(ids)):
+            if id_article is not None and ids[rang] != id_article:
+                continue
+            valeur = dates[rang]
+            if (debut is not None and valeur < debut) or (fin is not None and valeur > fin):
+                continue
+            yield rang, {"id_article": ids[rang], "quantite": quantites[rang], "date": date_depuis_horodatage(valeur)}
+
+    def ecrire_transactions(self, nature, transaction_list):
+        table = self._table(nature)
+        if transaction_list is table:
+            table.vider_tampon()
+            return
+        # Réécriture complète : fichiers temporaires puis remplacement, la table est ensuite rouverte
+        table.fermer()
+        colonnes = [array(code) for _, code in TableMappee.COLONNES]
+        for transaction in transaction_list:
+            colonnes[0].append(transaction["id_article"])
+            colonnes[1].append(transaction["quantite"])
+            colonnes[2].append(horodatage(transaction["date"]))
+        for filename, colonne in zip(table.filenames, colonnes):
+            with open(filename + ".tmp", "wb") as fichier:
+                colonne.tofile(fichier)
+            os.replace(filename + ".tmp", filename)
+        table.ouvrir()
+
+    def ajouter_transaction(self, nature, rang, transaction_list):
+        self.ajouter_transactions(nature, [rang], transaction_list)
+
+    def ajouter_transactions(self, nature, rangs, transaction_list):
+        # Les lignes de la table mmap sont déjà en fin de fichier : il ne reste qu'à vider le tampon
+        table = self._table(nature)
+        if transaction_list is not table:
+            for rang in rangs:
+                table.append(transaction_list[rang])
+        table.vider_tampon()
+
+    def corriger_transaction(self, nature, rang, transaction_list):
+        table = self._table(nature)
+        if transaction_list is not table:
+            table.modifier(rang, transaction_list[rang])
+        table.vider_tampon()
+
+    def compacter(self, nature, transaction_list):
+        self._table(nature).vider_tampon()
+
+    def fermer(self):
+        for table in self._tables.values():
+            if table is not None:
+                table.fermer()
+        super().fermer()
+
+
+class StockageSegments(StockageCSV):
+    # Transactions d'une nature dans {dossier}/{nature}/ : un CSV par période (mois par défaut) et
+    # manifeste.json, qui donne pour chaque segment son fichier, son premier rang, son nombre de
+    # lignes et ses dates extrêmes. Seul le dernier segment, ouvert, reçoit des ajouts : les segments
+    # clos ne sont jamais réécrits et les corrections vont dans corrections.csv, appliqué par-dessus à
+    # la lecture. Une lecture filtrée par date ou par rang n'ouvre que les segments concernés ; un
+    # segment clos peut être compressé (gzip) sans toucher aux autres.
+    FILENAME_MANIFESTE = "manifeste.json"
+    FILENAME_CORRECTIONS = "corrections.csv"
+    PERIODES = {"jour": "%Y-%m-%d", "mois": "%Y-%m", "annee": "%Y"}
+    CORRECTION_PONCTUELLE = True
+    AJOUT_PONCTUEL = True
+
+    def __init__(self, dossier=".", periode="mois", fsync=False):
+        if periode not in self.PERIODES:
+            raise ValueError(f"Période de segment inconnue : {periode}")
+        super().__init__(dossier)
+        self.periode = periode
+        self.fsync = fsync
+        self.dossiers = {nature: os.path.join(dossier, nature) for nature in NATURES}
+        # Manifeste relu seulement si le fichier a changé (un autre processus a pu clore un segment)
+        self._manifestes = {nature: (None, []) for nature in NATURES}
+        self._ouverts = {nature: None for nature in NATURES}
+
+    def _filename(self, nature, nom):
+        return os.path.join(self.dossiers[nature], nom)
+
+    def _manifeste(self, nature):
+        filename = self._filename(nature, self.FILENAME_MANIFESTE)
+        try:
+            etat = os.stat(filename)
+            signature = (etat.st_size, etat.st_mtime_ns)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._manifestes[nature][0]:
+            segments = []
+            if signature is not None:
+                with open(filename, "r") as fichier:
+                    segments = json.load(fichier)["segments"]
+            self._manifestes[nature] = (signature, segments)
+        return self._manifestes[nature][1]
+
+    def _ecrire_manifeste(self, nature, segments):
+        filename = self._filename(nature, self.FILENAME_MANIFESTE)
+        with open(filename + ".tmp", "w") as fichier:
+            json.dump({"periode": self.periode, "segments": segments}, fichier, indent=1)
+        os.replace(filename + ".tmp", filename)
+        self._manifestes[nature] = (None, segments)
+
+    def _sources(self):
+        # Pour l'instantané : par nature, tailles cumulées et dernier mtime du manifeste, des
+        # corrections et du segment ouvert ; les emplacements des journaux restent vides
+        sources = []
+        groupes = [[self.filename_articles]]
+        for nature in NATURES:
+            segments = self._manifeste(nature)
+            groupes.append([self._filename(nature, self.FILENAME_MANIFESTE),
+                            self._filename(nature, self.FILENAME_CORRECTIONS)]
+                           + ([self._filename(nature, segments[-1]["fichier"])] if segments else []))
+        for filenames in groupes:
+            taille, mtime, present = 0, 0, False
+            for filename in filenames:
+                try:
+                    etat = os.stat(filename)
+                except FileNotFoundError:
+                    continue
+                taille, mtime, present = taille + etat.st_size, max(mtime, etat.st_mtime_ns), True
+            sources += [taille, mtime] if present else [-1, 0]
+        return sources + [-1, 0] * len(NATURES)
+
+    def _lire_corrections(self, nature):
+        corrections = {}
+        try:
+            with open(self._filename(nature, self.FILENAME_CORRECTIONS), "r", newline='') as csvfile:
+                for row in csv.reader(csvfile):
+                    try:
+                        rang, id_article, quantite, date = row
+                        corrections[int(rang)] = {"id_article": int(id_article), "quantite": float(quantite),
+                                                  "date": datetime.strptime(date, FORMAT_DATE)}
+                    except ValueError:
+                        # Ligne tronquée par un arrêt brutal
+                        continue
+        except FileNotFoundError:
+            pass
+        return corrections
+
+    def _ouvrir_segment(self, nature, segment):
+        filename = self._filename(nature, segment["fichier"])
+        if filename.endswith(".gz"):
+            return gzip.open(filename, "rt", newline='')
+        return open(filename, "r", newline='', buffering=1 << 20)
+
+    @staticmethod
+    def _lignes_confirmees(fichier):
+        # Une dernière ligne sans fin de ligne n'a jamais été confirmée (arrêt pendant un ajout) :
+        # elle est ignorée à la lecture et retirée à la prochaine ouverture en écriture
+        for ligne in fichier:
+            if ligne.endswith("\n"):
+                yield ligne
+
+    def iterer_transactions(self, nature, date_debut=None, date_fin=None, id_article=None, depuis=0):
+        corrections = self._lire_corrections(nature)
+        rangs_corriges = sorted(corrections)
+        texte_debut = date_debut.strftime(FORMAT_DATE) if date_debut is not None else None
+        texte_fin = date_fin.strftime(FORMAT_DATE) if date_fin is not None else None
+        segments = self._manifeste(nature)
+        self._vider_segment(nature)
+        for numero, segment in enumerate(segments):
+            premier = segment["premier_rang"]
+            if numero < len(segments) - 1:
+                fin_rangs = premier + segment["nb"]
+                if fin_rangs <= depuis or (texte_debut is not None and segment["fin"] < texte_debut) or \
+                        (texte_fin is not None and segment["debut"] > texte_fin):
+                    # Segment laissé fermé : seules ses lignes corrigées peuvent encore être retenues
+                    i = bisect.bisect_left(rangs_corriges, max(premier, depuis))
+                    j = bisect.bisect_left(rangs_corriges, fin_rangs)
+                    yield from self._filtrer([(rang, corrections[rang]) for rang in rangs_corriges[i:j]],
+                                             date_debut, date_fin, id_article)
+                    continue
+            with self._ouvrir_segment(nature, segment) as fichier:
+                reader = csv.reader(fichier if numero < len(segments) - 1 else self._lignes_confirmees(fichier))
+                next(reader, None)
+                for rang, row in enumerate(reader, premier):
+                    if rang < depuis:
+                        continue
+                    if rang in corrections:
+                        yield from self._filtrer([(rang, corrections[rang])], date_debut, date_fin, id_article)
+                        continue
+                    if id_article is not None and int(row[0]) != id_article:
+                        continue
+                    if (texte_debut is not None and row[2] < texte_debut) or (texte_fin is not None and row[2] > texte_fin):
+                        continue
+                    transaction = {"id_article": int(row[0]), "quantite": float(row[1]),
+                                   "date": datetime.strptime(row[2], FORMAT_DATE)}
+                    if row[2] == texte_debut or row[2] == texte_fin:
+                        yield from self._filtrer([(rang, transaction)], date_debut, date_fin, None)
+                        continue
+                    yield rang, transaction
+
+    def _nouveau_nom(self, nature, cle, pris):
+        nom = f"{cle}.csv"
+        numero = 1
+        while nom in pris or nom + ".gz" in pris:
+            numero += 1
+            nom = f"{cle}-{numero}.csv"
+        return nom
+
+    def _bornes(self, nature, segment):
+        # Dates extrêmes d'un segment, relues une fois à sa clôture
+        debut = fin = None
+        with self._ouvrir_segment(nature, segment) as fichier:
+            reader = csv.reader(self._lignes_confirmees(fichier))
+            next(reader, None)
+            for row in reader:
+                if debut is None or row[2] < debut:
+                    debut = row[2]
+                if fin is None or row[2] > fin:
+                    fin = row[2]
+        return debut or segment["debut"], fin or segment["debut"]
+
+    def _segment_ouvert(self, nature, rang, date):
+        # Writer du segment qui reçoit la ligne `rang`. Une période postérieure clôt le segment courant ;
+        # une ligne antidatée y reste, ses dates extrêmes étant relevées à la clôture.
+        cle = date.strftime(self.PERIODES[self.periode])
+        segments = self._manifeste(nature)
+        if not segments or segments[-1]["cle"] < cle:
+            os.makedirs(self.dossiers[nature], exist_ok=True)
+            self._fermer_segment(nature)
+            segments = [dict(segment) for segment in segments]
+            if segments:
+                dernier = segments[-1]
+                dernier["nb"] = rang - dernier["premier_rang"]
+                self._retirer_ligne_incomplete(self._filename(nature, dernier["fichier"]))
+                dernier["debut"], dernier["fin"] = self._bornes(nature, dernier)
+            segment = {"cle": cle, "fichier": self._nouveau_nom(nature, cle, {s["fichier"] for s in segments}),
+                       "premier_rang": rang, "debut": date.strftime(FORMAT_DATE)}
+            with open(self._filename(nature, segment["fichier"]), "w", newline='') as fichier:
+                fichier.write("id_article,quantite,date\r\n")
+            segments.append(segment)
+            self._ecrire_manifeste(nature, segments)
+        filename = self._filename(nature, segments[-1]["fichier"])
+        ouvert = self._ouverts[nature]
+        if ouvert is None or ouvert[0] != filename:
+            self._fermer_segment(nature)
+            self._retirer_ligne_incomplete(filename)
+            fichier = open(filename, "a", newline='')
+            ouvert = self._ouverts[nature] = (filename, fichier, csv.writer(fichier))
+        return ouvert[2]
+
+    @staticmethod
+    def _retirer_ligne_incomplete(filename):
+        # Une dernière ligne incomplète n'a jamais été confirmée : elle est retirée avant d'écrire
+        # à la suite ou de clore le segment, qui ne serait plus relu avec ce filtre
+        with open(filename, "r+b") as fichier:
+            # Seule la fin du fichier est relue : l'en-tête ou une ligne complète y est toujours
+            debut = max(fichier.seek(0, os.SEEK_END) - 4096, 0)
+            fichier.seek(debut)
+            fin = fichier.read()
+            if not fin.endswith(b"\n"):
+                fichier.truncate(debut + fin.rfind(b"\n") + 1)
+
+    def _vider_segment(self, nature):
+        ouvert = self._ouverts[nature]
+        if ouvert is not None:
+            ouvert[1].flush()
+            if self.fsync:
+                os.fsync(ouvert[1].fileno())
+
+    def _fermer_segment(self, nature):
+        ouvert = self._ouverts[nature]
+        if ouvert is not None:
+            self._vider_segment(nature)
+            ouvert[1].close()
+            self._ouverts[nature] = None
+
+    def ajouter_transaction(self, nature, rang, transaction_list):
+        self.ajouter_transactions(nature, [rang], transaction_list)
+
+    def ajouter_transactions(self, nature, rangs, transaction_list):
+        for rang in rangs:
+            transaction = transaction_list[rang]
+            self._segment_ouvert(nature, rang, transaction["date"]).writerow(
+                [transaction["id_article"], transaction["quantite"], transaction["date"].strftime(FORMAT_DATE)])
+        self._vider_segment(nature)
+
+    def corriger_transaction(self, nature, rang, transaction_list):
+        transaction = transaction_list[rang]
+        os.makedirs(self.dossiers[nature], exist_ok=True)
+        with open(self._filename(nature, self.FILENAME_CORRECTIONS), "a", newline='') as fichier:
+            csv.writer(fichier).writerow([rang, transaction["id_article"], transaction["quantite"],
+                                          transaction["date"].strftime(FORMAT_DATE)])
+            fichier.flush()
+            if self.fsync:
+                os.fsync(fichier.fileno())
+
+    def ecrire_transactions(self, nature, transaction_list):
+        # Réécriture complète (migration, sauvegarde explicite) : les corrections sont intégrées. Un segment
+        # clos dont la clé, les rangs et les dates extrêmes sont ceux du manifeste et qu'aucune correction ne
+        # touche a déjà ce contenu : il est gardé sous son nom, compressé ou non, sans être relu.
+        os.makedirs(self.dossiers[nature], exist_ok=True)
+        self._fermer_segment(nature)
+        manifeste = self._manifeste(nature)
+        anciens = {(segment["cle"], segment["premier_rang"]): segment for segment in manifeste[:-1]}
+        rangs_corriges = sorted(self._lire_corrections(nature))
+        segments = []
+        # Segment en cours (transaction_list peut être un générateur) : clé, premier rang, lignes
+        courant = None
+        for rang, transaction in enumerate(transaction_list):
+            cle = transaction["date"].strftime(self.PERIODES[self.periode])
+            if courant is not None and cle <= courant[0]:
+                courant[2].append(transaction)
+                continue
+            if courant is not None:
+                segments.append(self._placer_segment(nature, segments, *courant, True, anciens, rangs_corriges))
+            courant = (cle, rang, [transaction])
+        if courant is not None:
+            segments.append(self._placer_segment(nature, segments, *courant, False, anciens, rangs_corriges))
+        self._ecrire_manifeste(nature, segments)
+        filename_corrections = self._filename(nature, self.FILENAME_CORRECTIONS)
+        if os.path.exists(filename_corrections):
+            os.remove(filename_corrections)
+        for nom in {segment["fichier"] for segment in manifeste} - {segment["fichier"] for segment in segments}:
+            os.remove(self._filename(nature, nom))
+
+    def _placer_segment(self, nature, places, cle, premier, transactions, clos, anciens, rangs_corriges):
+        # Garde l'ancien fichier du segment s'il a déjà ce contenu, sinon l'écrit
+        dates = [transaction["date"] for transaction in transactions]
+        segment = {"cle": cle, "fichier": None, "premier_rang": premier}
+        if clos:
+            segment["nb"] = len(transactions)
+        segment["debut"] = min(dates).strftime(FORMAT_DATE)
+        if clos:
+            segment["fin"] = max(dates).strftime(FORMAT_DATE)
+            ancien = anciens.get((cle, premier))
+            i = bisect.bisect_left(rangs_corriges, premier)
+            if ancien is not None and (ancien["nb"], ancien["debut"], ancien["fin"]) == \
+                    (segment["nb"], segment["debut"], segment["fin"]) and \
+                    (i == len(rangs_corriges) or rangs_corriges[i] >= premier + len(transactions)):
+                segment["fichier"] = ancien["fichier"]
+                return segment
+        segment["fichier"] = self._nouveau_nom(nature, cle, {place["fichier"] for place in places})
+        filename = self._filename(nature, segment["fichier"])
+        with open(filename + ".tmp", "w", newline='', buffering=1 << 20) as fichier:
+            writer = csv.writer(fichier)
+            writer.writerow(["id_article", "quantite", "date"])
+            for transaction in transactions:
+                writer.writerow([transaction["id_article"], transaction["quantite"],
+                                 transaction["date"].strftime(FORMAT_DATE)])
+        os.replace(filename + ".tmp", filename)
+        return segment
+
+    def compresser_segments(self, nature, avant):
+        # Compresse les segments clos dont la dernière date précède `avant` ; renvoie leur nombre
+        segments = [dict(segment) for segment in self._manifeste(nature)]
+        texte = avant.strftime(FORMAT_DATE)
+        anciens = []
+        for segment in segments[:-1]:
+            if segment["fichier"].endswith(".gz") or segment["fin"] >= texte:
+                continue
+            filename = self._filename(nature, segment["fichier"])
+            with open(filename, "rb") as source, gzip.open(filename + ".gz.tmp", "wb") as cible:
+                cible.write(source.read())
+            os.replace(filename + ".gz.tmp", filename + ".gz")
+            segment["fichier"] += ".gz"
+            anciens.append(filename)
+        if anciens:
+            self._ecrire_manifeste(nature, segments)
+            for filename in anciens:
+                os.remove(filename)
+        return len(anciens)
+
+    def compacter(self, nature, transaction_list):
+        self._vider_segment(nature)
+
+    def fermer(self):
+        for nature in NATURES:
+            self._fermer_segment(nature)
+        super().fermer()
+
+
+def migrer_csv_vers_segments(dossier=".", periode="mois"):
+    # Copie unique des transactions CSV (journaux compris) vers les segments ; articles.csv reste partagé
+    source = StockageCSV(dossier, journal=True)
+    cible = StockageSegments(dossier, periode)
+    try:
+        for nature in NATURES:
+            cible.ecrire_transactions(nature, (transaction for _, transaction in source.iterer_transactions(nature)))
+    finally:
+        cible.fermer()
+        source.fermer()
+
+
+def migrer_csv_vers_colonnes(dossier="."):
+    # Copie unique des transactions CSV (journaux compris) vers les colonnes ; articles.csv reste partagé
+    source = StockageCSV(dossier, journal=True)
+    cible = StockageColonnes(dossier)
+    try:
+        for nature in NATURES:
+            cible.ecrire_transactions(nature, (transaction for _, transaction in source.iterer_transactions(nature)))
+    finally:
+        cible.fermer()
+        source.fermer()
+
+
+def migrer_csv_vers_sqlite(dossier=".", filename=None):
+    # Copie unique des CSV (journaux compris) vers une base SQLite
+    source = StockageCSV(dossier, journal=True)
+    cible = StockageSQLite(filename or os.path.join(dossier, StockageSQLite.FILENAME))
+    try:
+        cible.ecrire_articles(list(source.lire_articles()))
+        for nature in NATURES:
+            cible.ecrire_transactions(nature, source.lire_transactions(nature))
+    finally:
+        cible.fermer()
+        source.fermer()
+
+
+def lire_classeur(filename, feuille=None):
+    # Lecture en flux (read_only) : une ligne à la fois, la première donne les noms de colonnes
+    if openpyxl is None:
+        raise ValueError("La lecture des fichiers Excel nécessite openpyxl.")
+    classeur = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        lignes = (classeur[feuille] if feuille else classeur.active).iter_rows(values_only=True)
+        entetes = [str(entete).strip() if entete is not None else "" for entete in next(lignes, ())]
+        for valeurs in lignes:
+            if any(valeur is not None for valeur in valeurs):
+                yield dict(zip(entetes, valeurs))
+    finally:
+        classeur.close()
+
+
+def ecrire_classeur(filename, feuilles):
+    # feuilles : (titre, entêtes, lignes) ; écriture en flux (write_only) puis remplacement atomique
+    if openpyxl is None:
+        raise ValueError("L'écriture des fichiers Excel nécessite openpyxl.")
+    classeur = openpyxl.Workbook(write_only=True)
+    for titre, entetes, lignes in feuilles:
+        lignes = iter(lignes)
+        for _ in _remplir_feuilles(classeur, titre, entetes,
+                                   iter(lambda: list(itertools.islice(lignes, TAILLE_BLOC_EXPORT)), [])):
+            pass
+    filename_tmp = filename + ".tmp"
+    classeur.save(filename_tmp)
+    os.replace(filename_tmp, filename)
+
+
+def _remplir_feuilles(classeur, titre, entetes, blocs):
+    # Au-delà de la limite d'Excel, la suite continue dans une nouvelle feuille : titre, titre 2, titre 3...
+    # Rend le nombre de lignes écrites après chaque bloc.
+    feuille = None
+    numero = ecrites = 0
+    for bloc in blocs:
+        for ligne in bloc:
+            if feuille is None or lignes_feuille == LIGNES_MAX_FEUILLE:
+                numero += 1
+                feuille = classeur.create_sheet(titre if numero == 1 else f"{titre} {numero}")
+                feuille.append(entetes)
+                lignes_feuille = 0
+            feuille.append(ligne)
+            lignes_feuille += 1
+        ecrites += len(bloc)
+        yield ecrites
+    if feuille is None:
+        classeur.create_sheet(titre).append(entetes)
+
+
+def ecrire_export(filename, entetes, types, lignes, progression=None, total=None):
+    # Écriture par blocs de TAILLE_BLOC_EXPORT lignes, format choisi par l'extension :
+    # .csv, .csv.gz, .xlsx ou .colz (colonnes compressées). progression(lignes écrites, total ou None)
+    # est appelée après chaque bloc, depuis le fil appelant.
+    nom = filename.lower()
+    filename_tmp = filename + ".tmp"
+    lignes = iter(lignes)
+    blocs = iter(lambda: list(itertools.islice(lignes, TAILLE_BLOC_EXPORT)), [])
+    ecrites = 0
+    if nom.endswith(".xlsx"):
+        if openpyxl is None:
+            raise ValueError("L'écriture des fichiers Excel nécessite openpyxl.")
+        classeur = openpyxl.Workbook(write_only=True)
+        for ecrites in _remplir_feuilles(classeur, "export", entetes, blocs):
+            if progression:
+                progression(ecrites, total)
+        classeur.save(filename_tmp)
+    elif nom.endswith(".colz"):
+        with open(filename_tmp, "wb") as fichier:
+            description = json.dumps({"colonnes": list(entetes), "types": types}).encode("utf-8")
+            fichier.write(ENTETE_COLONNES_COMPRESSEES + struct.pack("<I", len(description)) + description)
+            for bloc in blocs:
+                fichier.write(struct.pack("<I", len(bloc)))
+                for type_colonne, valeurs in zip(types, zip(*bloc)):
+                    brut = zlib.compress(_encoder_colonne(type_colonne, valeurs), 6)
+                    fichier.write(struct.pack("<I", len(brut)) + brut)
+                ecrites += len(bloc)
+                if progression:
+                    progression(ecrites, total)
+    elif nom.endswith((".csv", ".csv.gz")):
+        ouvrir = gzip.open if nom.endswith(".gz") else open
+        with ouvrir(filename_tmp, "wt", newline='', encoding="utf-8") as fichier:
+            writer = csv.writer(fichier)
+            writer.writerow(entetes)
+            for bloc in blocs:
+                writer.writerows(bloc)
+                ecrites += len(bloc)
+                if progression:
+                    progression(ecrites, total)
+    else:
+        raise ValueError(f"Format d'export inconnu : {filename}")
+    os.replace(filename_tmp, filename)
+    return ecrites
+
+
+def _encoder_colonne(type_colonne, valeurs):
+    # q : entiers, d : réels, t : dates (horodatages en microsecondes), s : texte (JSON)
+    if type_colonne == "t":
+        return array("q", map(horodatage, valeurs)).tobytes()
+    if type_colonne == "s":
+        return json.dumps(valeurs, ensure_ascii=False).encode("utf-8")
+    return array(type_colonne, valeurs).tobytes()
+
+
+def _decoder_colonne(type_colonne, brut):
+    if type_colonne == "t":
+        return [date_depuis_horodatage(valeur) for valeur in array("q", brut)]
+    if type_colonne == "s":
+        return json.loads(brut)
+    valeurs = array(type_colonne)
+    valeurs.frombytes(brut)
+    return valeurs
+
+
+def lire_colonnes_compressees(filename):
+    # Relecture en flux d'un export .colz, un bloc décompressé à la fois
+    with open(filename, "rb") as fichier:
+        if fichier.read(len(ENTETE_COLONNES_COMPRESSEES)) != ENTETE_COLONNES_COMPRESSEES:
+            raise ValueError(f"{filename} n'est pas un export en colonnes compressées.")
+        description = json.loads(fichier.read(struct.unpack("<I", fichier.read(4))[0]))
+        entetes, types = description["colonnes"], description["types"]
+        while True:
+            brut = fichier.read(4)
+            if len(brut) < 4:
+                return
+            colonnes = []
+            for type_colonne in types:
+                taille = struct.unpack("<I", fichier.read(4))[0]
+                colonnes.append(_decoder_colonne(type_colonne, zlib.decompress(fichier.read(taille))))
+            for valeurs in zip(*colonnes):
+                yield dict(zip(entetes, valeurs))
+
+
+class IndexNoms:
+    # Noms normalisés (minuscules, sans accents) triés, pour les recherches par préfixe
+
+    def __init__(self):
+        self._cles = []
+
+    @staticmethod
+    def normaliser(nom):
+        nom = unicodedata.normalize("NFKD", nom)
+        return "".join(c for c in nom if not unicodedata.combining(c)).casefold()
+
+    def reconstruire(self, articles):
+        self._cles = sorted((self.normaliser(article.nom), article.id_article) for article in articles)
+
+    def ajouter(self, nom, id_article):
+        bisect.insort(self._cles, (self.normaliser(nom), id_article))
+
+    def retirer(self, nom, id_article):
+        cle = (self.normaliser(nom), id_article)
+        i = bisect.bisect_left(self._cles, cle)
+        if i < len(self._cles) and self._cles[i] == cle:
+            del self._cles[i]
+
+    def rechercher(self, prefixe, limite=None):
+        prefixe = self.normaliser(prefixe)
+        resultats = []
+        i = bisect.bisect_left(self._cles, (prefixe,))
+        while i < len(self._cles) and self._cles[i][0].startswith(prefixe):
+            if limite is not None and len(resultats) >= limite:
+                break
+            resultats.append(self._cles[i][1])
+            i += 1
+        return resultats
+
+
+class IndexChronologique:
+    # Horodatages triés et rangs correspondants : localise une plage de dates par recherche dichotomique.
+    # Table ajoutée dans l'ordre chronologique (cas courant) : sa colonne de dates sert elle-même d'index
+    # pour ses _nb_base premières lignes, sans copie (une TableMappee reste sur disque). Seules les lignes
+    # hors de cet ordre (ajouts antidatés, corrections) vont dans _dates et _rangs ; une ligne corrigée de
+    # la base y garde sa place grâce à son horodatage d'origine, noté dans _anciennes.
+
+    def __init__(self):
+        self._dates = array("q")
+        self._rangs = array("q")
+        self._base = None
+        self._nb_base = 0
+        self._anciennes = {}
+
+    def reconstruire(self, table):
+        self._dates = array("q")
+        self._rangs = array("q")
+        self._base = None
+        self._nb_base = 0
+        self._anciennes = {}
+        dates = table.dates
+        if all(map(operator.le, dates, dates[1:])):
+            self._base = table
+            self._nb_base = len(dates)
+            return
+        ordre = sorted(range(len(dates)), key=dates.__getitem__)
+        self._dates = array("q", (dates[rang] for rang in ordre))
+        self._rangs = array("q", ordre)
+
+    def ajouter(self, date, rang):
+        valeur = horodatage(date)
+        if self._base is not None and rang == self._nb_base and \
+                (not rang or valeur >= self._cle(self._base.dates, rang - 1)):
+            # La ligne est déjà dans la colonne de la table, à sa place
+            self._nb_base += 1
+            return
+        if not self._dates or (self._dates[-1], self._rangs[-1]) <= (valeur, rang):
+            self._dates.append(valeur)
+            self._rangs.append(rang)
+            return
+        i = self._position(valeur, rang)
+        self._dates.insert(i, valeur)
+        self._rangs.insert(i, rang)
+
+    def retirer(self, date, rang):
+        valeur = horodatage(date)
+        if rang < self._nb_base and rang not in self._anciennes:
+            self._anciennes[rang] = valeur
+            return
+        i = self._position(valeur, rang)
+        if i < len(self._dates) and self._dates[i] == valeur and self._rangs[i] == rang:
+            del self._dates[i]
+            del self._rangs[i]
+
+    def _position(self, valeur, rang):
+        debut = bisect.bisect_left(self._dates, valeur)
+        fin = bisect.bisect_right(self._dates, valeur, debut)
+        return bisect.bisect_left(self._rangs, rang, debut, fin)
+
+    def _cle(self, dates, rang):
+        return self._anciennes.get(rang, dates[rang])
+
+    def _chercher(self, dates, valeur, apres):
+        # Position dans la base du premier horodatage d'origine >= valeur (> valeur si apres)
+        if not self._anciennes:
+            recherche = bisect.bisect_right if apres else bisect.bisect_left
+            return recherche(dates, valeur, 0, self._nb_base)
+        debut, fin = 0, self._nb_base
+        while debut < fin:
+            milieu = (debut + fin) // 2
+            cle = self._cle(dates, milieu)
+            if cle < valeur or (apres and cle == valeur):
+                debut = milieu + 1
+            else:
+                fin = milieu
+        return debut
+
+    def ordre(self):
+        return self.plage_horodatages(-1 << 63, (1 << 63) - 1)
+
+    def bornes(self):
+        # Premier et dernier horodatage (au plus large), None si l'index est vide
+        bornes = [self._dates[0], self._dates[-1]] if self._dates else None
+        if self._nb_base:
+            dates = self._base.dates
+            premiere, derniere = self._cle(dates, 0), self._cle(dates, self._nb_base - 1)
+            bornes = [min(bornes[0], premiere), max(bornes[1], derniere)] if bornes else [premiere, derniere]
+        return tuple(bornes) if bornes else None
+
+    def plage(self, date_debut, date_fin):
+        return self.plage_horodatages(horodatage(date_debut), horodatage(date_fin))
+
+    def plage_horodatages(self, debut, fin):
+        i = bisect.bisect_left(self._dates, debut)
+        j = bisect.bisect_right(self._dates, fin)
+        if not self._nb_base:
+            return self._rangs[i:j]
+        dates = self._base.dates
+        k, l = self._chercher(dates, debut, False), self._chercher(dates, fin, True)
+        retirees = [rang for rang in self._anciennes if k <= rang < l]
+        if i == j and not retirees:
+            return range(k, l)
+        base = ((dates[rang], rang) for rang in range(k, l) if rang not in self._anciennes)
+        hors_base = zip(self._dates[i:j], self._rangs[i:j])
+        return array("q", (rang for _, rang in heapq.merge(base, hors_base)))
+
+
+class MoteurRapportNumpy:
+    # Calcule rapport_inventaire sur des colonnes NumPy (article, quantité, horodatage)
+
+    def __init__(self, gestion_stock):
+        if np is None:
+            raise ValueError("Le moteur de rapport 'numpy' nécessite NumPy.")
+        self.gestion_stock = gestion_stock
+        # (version, articles, ids du catalogue, colonnes des ventes, colonnes des achats)
+        self._etat = None
+        self._verrou = threading.Lock()
+
+    def _actualiser(self):
+        # Plusieurs rapports peuvent tourner en même temps (lecteurs de serveur.py) pendant les écritures :
+        # un seul fil reconstruit, dans des variables locales, et l'état complet est publié en une affectation.
+        # Un rapport garde l'état qu'il a obtenu ; la version est lue avant les colonnes, si bien qu'une
+        # écriture concurrente fait reconstruire au rapport suivant.
+        gestion_stock = self.gestion_stock
+        with self._verrou:
+            etat = self._etat
+            if etat is not None and etat[0] == gestion_stock._version:
+                return etat
+            version = gestion_stock._version
+            articles = sorted(gestion_stock.lister_articles(), key=lambda article: article.id_article)
+            ids = np.array([article.id_article for article in articles], dtype=np.int64)
+            etat = (version, articles, ids, self._colonnes(gestion_stock.ventes, ids),
+                    self._colonnes(gestion_stock.achats, ids))
+            self._etat = etat
+            return etat
+
+    @staticmethod
+    def _colonnes(table, ids_catalogue):
+        colonnes = [(table.ids, np.int64), (table.quantites, np.float64), (table.dates, np.int64)]
+        if isinstance(table.ids, array):
+            # tobytes() copie d'un coup : une vue exportée empêcherait le fil d'écriture d'agrandir l'array
+            colonnes = [np.frombuffer(colonne.tobytes(), dtype=dtype) for colonne, dtype in colonnes]
+        else:
+            # Colonnes mmap lues sans copie
+            colonnes = [np.frombuffer(colonne, dtype=dtype) for colonne, dtype in colonnes]
+        # Une ligne ajoutée entre deux copies n'est gardée que si toutes ses colonnes ont été lues
+        nb_lignes = min(len(colonne) for colonne in colonnes)
+        ids, quantites, dates = (colonne[:nb_lignes] for colonne in colonnes)
+        # Position de chaque transaction dans le catalogue, -1 si l'article n'existe plus
+        positions = np.searchsorted(ids_catalogue, ids)
+        positions[positions >= len(ids_catalogue)] = 0
+        trouve = len(ids_catalogue) > 0 and ids_catalogue[positions] == ids
+        positions = np.where(trouve, positions, -1)
+        return positions, quantites, dates
+
+    @staticmethod
+    def _quantites_par_article(articles, ids_catalogue, colonnes, date_debut, date_fin):
+        positions, quantites, dates = colonnes
+        masque = (dates >= horodatage(date_debut)) & (dates <= horodatage(date_fin)) & (positions >= 0)
+        rangs = np.flatnonzero(masque)
+        if not len(rangs):
+            return []
+        positions_periode, quantites_periode = positions[rangs], quantites[rangs]
+        if np.all(np.trunc(quantites_periode) == quantites_periode) and \
+                np.abs(quantites_periode).sum() < 2 ** 52:
+            # Quantités entières : toutes les sommes partielles sont exactes, bincount donne le même total
+            totaux = np.bincount(positions_periode, weights=quantites_periode, minlength=len(ids_catalogue)).tolist()
+        else:
+            # Sinon une somme exacte par article (math.fsum), comme le moteur Python, regroupée par un tri stable
+            tri = np.argsort(positions_periode, kind="stable")
+            valeurs = quantites_periode[tri].tolist()
+            groupes, debuts = np.unique(positions_periode[tri], return_index=True)
+            fins = debuts.tolist()[1:] + [len(valeurs)]
+            totaux = dict(zip(groupes.tolist(), (math.fsum(valeurs[debut:fin])
+                                                 for debut, fin in zip(debuts.tolist(), fins))))
+        # Ordre de première apparition dans le temps, comme le moteur Python
+        ordre = rangs[np.lexsort((rangs, dates[rangs]))]
+        presents, premieres = np.unique(positions[ordre], return_index=True)
+        presents = presents[np.argsort(premieres, kind="stable")]
+        return [(articles[position], totaux[position]) for position in presents.tolist()]
+
+    def rapport_inventaire(self, date_debut, date_fin):
+        _, articles, ids_catalogue, ventes, achats = self._actualiser()
+        return self.gestion_stock._construire_rapport(
+            self._quantites_par_article(articles, ids_catalogue, ventes, date_debut, date_fin),
+            self._quantites_par_article(articles, ids_catalogue, achats, date_debut, date_fin))
+
+
+def _agreger_partition(colonnes, reference_rangs, debut, fin, decalage):
+    # Exécutée dans un processus de calcul : agrège les lignes debut:fin de l'ordre chronologique.
+    # colonnes : (sorte, référence, code) pour ids, quantités et horodatages, lus en mémoire partagée
+    # ("memoire", fenêtre commençant au rang decalage) ou directement dans les fichiers d'une TableMappee
+    # ("fichier", decalage nul). Sans reference_rangs, l'ordre chronologique est celui des rangs : debut:fin.
+    ressources = []
+    vues = []
+    sources = colonnes if reference_rangs is None else (*colonnes, ("memoire", reference_rangs, "q"))
+    try:
+        for sorte, reference, code in sources:
+            if sorte == "fichier":
+                with open(reference, "rb") as fichier:
+                    ressource = mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ)
+                tampon = ressource
+            else:
+                ressource = shared_memory.SharedMemory(reference)
+                tampon = ressource.buf
+            ressources.append(ressource)
+            vues.append(memoryview(tampon).cast(code))
+        if reference_rangs is None:
+            rangs = range(debut - decalage, fin - decalage)
+        else:
+            rangs = (rang - decalage for rang in vues.pop()[debut:fin])
+        agregat = {}
+        CacheRapports._balayer(TableTransactions.depuis_colonnes(*vues), rangs, agregat)
+        for cellule in agregat.values():
+            cellule[2] += decalage
+        return agregat
+    finally:
+        # Les vues doivent être relâchées avant de fermer ce qu'elles exposent
+        for vue in vues:
+            vue.release()
+        for ressource in ressources:
+            ressource.close()
+
+
+class CacheRapports:
+    # Rapports du moteur Python déjà calculés. Deux sortes d'entrées, dans un même LRU :
+    # ("jour", nature, jour) agrège une journée complète, ("rapport", debut, fin) fusionne les journées
+    # d'une période et balaie directement ses journées incomplètes. Une agrégation est un dict
+    # {id_article: [quantite, horodatage, rang]}, la quantité étant une somme exacte (quantite_exacte) :
+    # fusions, ajouts et corrections ne changent pas le total arrondi, quel que soit l'historique du cache.
+    # Les deux derniers champs repèrent la première ligne de l'article, qui fixe l'ordre du rapport. Noms et prix sont lus dans le catalogue à chaque appel :
+    # modifier un article n'invalide rien. Un ajout met à jour les entrées qui couvrent sa date ;
+    # une correction aussi, sauf si elle touche la première ligne d'un article : l'entrée est alors
+    # seulement retirée.
+    # Avec processus > 1, une période absente du cache qui compte au moins SEUIL_PARALLELE lignes est
+    # découpée en tranches chronologiques contiguës, agrégées chacune par un processus de calcul.
+    MEMOIRE_MAX = 64 << 20
+    TAILLE_CELLULE = 250
+    SEUIL_PARALLELE = 100000
+
+    def __init__(self, gestion_stock, memoire_max=None, processus=0):
+        self.gestion_stock = gestion_stock
+        self.memoire_max = memoire_max or self.MEMOIRE_MAX
+        self.processus = processus
+        self._executeur = None
+        self._entrees = OrderedDict()
+        self._memoire = 0
+        # Incrémenté à chaque modification : un calcul concurrent n'est alors pas gardé
+        self._modifications = 0
+        self._verrou = threading.Lock()
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self._memoire = 0
+            self._modifications += 1
+
+    def _taille(self, entree):
+        if entree[0] == "jour":
+            return (len(self._entrees[entree]) + 1) * self.TAILLE_CELLULE
+        contenu = self._entrees[entree]
+        return (len(contenu["ventes"]) + len(contenu["achats"]) + 1) * self.TAILLE_CELLULE
+
+    def _inserer(self, cle, contenu):
+        if cle in self._entrees:
+            # Déjà insérée par un calcul concurrent : remplacée, sans compter sa taille deux fois
+            self._retirer_entree(cle)
+        self._entrees[cle] = contenu
+        self._memoire += self._taille(cle)
+        while self._memoire > self.memoire_max and self._entrees:
+            ancienne = next(iter(self._entrees))
+            self._memoire -= self._taille(ancienne)
+            del self._entrees[ancienne]
+
+    def _retirer_entree(self, cle):
+        self._memoire -= self._taille(cle)
+        del self._entrees[cle]
+
+    @staticmethod
+    def _balayer(table, rangs, agregat):
+        # rangs dans l'ordre chronologique : la première ligne vue d'un article est sa première ligne
+        ids, quantites, dates = table.ids, table.quantites, table.dates
+        for rang in rangs:
+            id_article = ids[rang]
+            numerateur, denominateur = quantites[rang].as_integer_ratio()
+            quantite = numerateur << (ECHELLE_SOMME + 1 - denominateur.bit_length())
+            cellule = agregat.get(id_article)
+            if cellule is None:
+                agregat[id_article] = [quantite, dates[rang], rang]
+            else:
+                cellule[0] += quantite
+
+    @staticmethod
+    def _fusionner(agregat, jour):
+        # Les journées sont fusionnées dans l'ordre : la première ligne déjà connue reste la bonne
+        for id_article, (quantite, valeur, rang) in jour.items():
+            cellule = agregat.get(id_article)
+            if cellule is None:
+                agregat[id_article] = [quantite, valeur, rang]
+            else:
+                cellule[0] += quantite
+
+    def _agreger(self, nature, debut, fin, journees):
+        table = self.gestion_stock._transactions[nature]
+        chrono = self.gestion_stock._chronos[nature]
+        agregat = {}
+        bornes = chrono.bornes()
+        if bornes is None:
+            return agregat
+        debut, fin = max(debut, bornes[0]), min(fin, bornes[1])
+        if debut > fin:
+            return agregat
+        premier_jour, dernier_jour = debut // UN_JOUR, fin // UN_JOUR
+        for jour in range(premier_jour, dernier_jour + 1):
+            debut_jour, fin_jour = jour * UN_JOUR, (jour + 1) * UN_JOUR - 1
+            if debut > debut_jour or fin < fin_jour:
+                self._balayer(table, chrono.plage_horodatages(max(debut, debut_jour), min(fin, fin_jour)), agregat)
+                continue
+            cle = ("jour", nature, jour)
+            with self._verrou:
+                # Fusion sous le verrou : ajouter() peut modifier la journée en même temps
+                contenu = self._entrees.get(cle)
+                if contenu is not None:
+                    self._entrees.move_to_end(cle)
+                    self._fusionner(agregat, contenu)
+                    continue
+            contenu = journees.get(cle)
+            if contenu is None:
+                contenu = {}
+                self._balayer(table, chrono.plage_horodatages(debut_jour, fin_jour), contenu)
+                journees[cle] = contenu
+            self._fusionner(agregat, contenu)
+        return agregat
+
+    def _agreger_en_parallele(self, nature, debut, fin):
+        # None si la période est trop courte pour valoir le démarrage des tranches
+        if self.processus < 2:
+            return None
+        table = self.gestion_stock._transactions[nature]
+        # Rangs relevés avant les colonnes : une ligne ajoutée entre-temps y est déjà
+        rangs = self.gestion_stock._chronos[nature].plage_horodatages(debut, fin)
+        if len(rangs) < self.SEUIL_PARALLELE:
+            return None
+        blocs = []
+        try:
+            # Historique dans l'ordre : l'index rend un range, les tranches se déduisent des rangs
+            if isinstance(rangs, range):
+                premier, dernier = rangs.start, rangs.stop
+                bornes = [premier + len(rangs) * i // self.processus for i in range(self.processus + 1)]
+                reference_rangs = None
+            else:
+                premier, dernier = min(rangs), max(rangs) + 1
+                bornes = [len(rangs) * i // self.processus for i in range(self.processus + 1)]
+                reference_rangs = self._bloc(rangs, blocs)
+            if isinstance(table, TableMappee):
+                table.vider_tampon()
+                colonnes = [("fichier", filename, code) for filename, (_, code) in zip(table.filenames,
+                                                                                     TableMappee.COLONNES)]
+                premier = 0
+            else:
+                # Seule la fenêtre des rangs demandés est copiée en mémoire partagée
+                colonnes = [("memoire", self._bloc(colonne[premier:dernier], blocs), code)
+                            for colonne, (_, code) in zip((table.ids, table.quantites, table.dates),
+                                                          TableMappee.COLONNES)]
+            if self._executeur is None:
+                # spawn : un fork de StockApp copierait ses fils Tk et ses verrous
+                self._executeur = ProcessPoolExecutor(self.processus, mp_context=get_context("spawn"))
+            parties = [self._executeur.submit(_agreger_partition, colonnes, reference_rangs, bornes[i], bornes[i + 1],
+                                              premier)
+                       for i in range(self.processus)]
+            # Les tranches renvoient des sommes exactes : leur fusion donne les totaux du calcul en série
+            agregat = {}
+            for partie in parties:
+                self._fusionner(agregat, partie.result())
+            return agregat
+        finally:
+            for bloc in blocs:
+                bloc.close()
+                bloc.unlink()
+
+    @staticmethod
+    def _bloc(colonne, blocs):
+        # tobytes() copie d'un coup : une vue sur l'array empêcherait un autre fil d'y ajouter des lignes
+        donnees = colonne.tobytes()
+        bloc = shared_memory.SharedMemory(create=True, size=max(len(donnees), 1))
+        blocs.append(bloc)
+        bloc.buf[:len(donnees)] = donnees
+        return bloc.name
+
+    def rapport_inventaire(self, date_debut, date_fin):
+        debut, fin = horodatage(date_debut), horodatage(date_fin)
+        cle = ("rapport", debut, fin)
+        with self._verrou:
+            contenu = self._entrees.get(cle)
+            if contenu is not None:
+                self._entrees.move_to_end(cle)
+            modifications = self._modifications
+        if contenu is None:
+            journees = {}
+            contenu = {}
+            for nature in NATURES:
+                contenu[nature] = self._agreger_en_parallele(nature, debut, fin)
+                if contenu[nature] is None:
+                    contenu[nature] = self._agreger(nature, debut, fin, journees)
+            with self._verrou:
+                if modifications == self._modifications:
+                    for cle_jour, jour in journees.items():
+                        if cle_jour not in self._entrees:
+                            self._inserer(cle_jour, jour)
+                    self._inserer(cle, contenu)
+        gestion_stock = self.gestion_stock
+        return gestion_stock._construire_rapport(
+            *(gestion_stock._articles_et_quantites(
+                (id_article, arrondir_somme(cellule[0])) for id_article, cellule in sorted(
+                    contenu[nature].items(), key=lambda element: (element[1][1], element[1][2])))
+              for nature in NATURES))
+
+    def _entrees_couvrant(self, nature, valeur):
+        jour = ("jour", nature, valeur // UN_JOUR)
+        if jour in self._entrees:
+            yield jour, self._entrees[jour]
+        for cle, contenu in list(self._entrees.items()):
+            if cle[0] == "rapport" and cle[1] <= valeur <= cle[2]:
+                yield cle, contenu[nature]
+
+    def ajouter(self, nature, rang, transaction):
+        valeur = horodatage(transaction["date"])
+        with self._verrou:
+            self._modifications += 1
+            for cle, agregat in self._entrees_couvrant(nature, valeur):
+                cellule = agregat.get(transaction["id_article"])
+                if cellule is None:
+                    agregat[transaction["id_article"]] = [quantite_exacte(transaction["quantite"]), valeur, rang]
+                    self._memoire += self.TAILLE_CELLULE
+                else:
+                    cellule[0] += quantite_exacte(transaction["quantite"])
+                    if (valeur, rang) < (cellule[1], cellule[2]):
+                        cellule[1], cellule[2] = valeur, rang
+
+    def corriger(self, nature, rang, ancienne, transaction):
+        valeur = horodatage(ancienne["date"])
+        with self._verrou:
+            self._modifications += 1
+            for cle, agregat in list(self._entrees_couvrant(nature, valeur)):
+                cellule = agregat.get(ancienne["id_article"])
+                if cellule is None or (cellule[1], cellule[2]) == (valeur, rang):
+                    self._retirer_entree(cle)
+                else:
+                    cellule[0] -= quantite_exacte(ancienne["quantite"])
+        self.ajouter(nature, rang, transaction)
+
+    def fermer(self):
+        if self._executeur is not None:
+            self._executeur.shutdown()
+            self._executeur = None
+
+
+class Instrumentation:
+    # Appels, durées et lignes traitées par opération. Seules les méthodes passées à envelopper()
+    # sont mesurées : tant que rien n'est enveloppé, le code appelé est le code d'origine.
+    TAILLE_ECHANTILLON = 10000
+
+    def __init__(self):
+        self._mesures = {}
+        self._enveloppes = []
+        self._verrou = threading.Lock()
+
+    def envelopper(self, objet, nom_methode, nom=None, lignes=None):
+        # lignes(objet, args, resultat) donne le nombre de lignes traitées par l'appel
+        methode = getattr(objet, nom_methode)
+        nom = nom or f"{type(objet).__name__}.{nom_methode}"
+
+        @functools.wraps(methode)
+        def mesuree(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                resultat = methode(*args, **kwargs)
+            except Exception:
+                self.enregistrer(nom, time.perf_counter() - debut, erreur=True)
+                raise
+            self.enregistrer(nom, time.perf_counter() - debut, lignes(objet, args, resultat) if lignes else None)
+            return resultat
+
+        setattr(objet, nom_methode, mesuree)
+        self._enveloppes.append((objet, nom_methode))
+
+    def retirer(self):
+        for objet, nom_methode in reversed(self._enveloppes):
+            vars(objet).pop(nom_methode, None)
+        self._enveloppes = []
+
+    def enregistrer(self, nom, duree, lignes=None, erreur=False):
+        with self._verrou:
+            mesure = self._mesures.get(nom)
+            if mesure is None:
+                mesure = self._mesures[nom] = {"appels": 0, "erreurs": 0, "cumul_s": 0.0, "lignes": 0,
+                                               "durees": deque(maxlen=self.TAILLE_ECHANTILLON)}
+            mesure["appels"] += 1
+            mesure["erreurs"] += erreur
+            mesure["cumul_s"] += duree
+            mesure["lignes"] += lignes or 0
+            mesure["durees"].append(duree)
+
+    @staticmethod
+    def _centile(durees, centile):
+        return durees[min(len(durees) - 1, int(len(durees) * centile / 100))]
+
+    def statistiques(self):
+        # Les centiles portent sur les TAILLE_ECHANTILLON derniers appels
+        with self._verrou:
+            mesures = {nom: dict(mesure, durees=sorted(mesure["durees"])) for nom, mesure in self._mesures.items()}
+        statistiques = {}
+        for nom, mesure in sorted(mesures.items(), key=lambda element: -element[1]["cumul_s"]):
+            durees = mesure.pop("durees")
+            mesure["moyenne_s"] = mesure["cumul_s"] / mesure["appels"]
+            for centile in (50, 95, 99):
+                mesure[f"p{centile}_s"] = self._centile(durees, centile)
+            statistiques[nom] = mesure
+        return statistiques
+
+    def reinitialiser(self):
+        with self._verrou:
+            self._mesures = {}
+
+    def exporter_json(self, filename):
+        with open(filename, "w") as fichier:
+            json.dump({"date": datetime.now().strftime(FORMAT_DATE), "operations": self.statistiques()}, fichier,
+                      indent=2)
+        return filename
+
+
+def _partage(methode):
+    # En mode partagé, la méthode s'exécute sous le verrou inter-processus, après avoir rattrapé
+    # les écritures des autres processus
+    @functools.wraps(methode)
+    def exclusive(self, *args, **kwargs):
+        if self._coordination is None:
+            return methode(self, *args, **kwargs)
+        with self._coordination:
+            self._rattraper()
+            return methode(self, *args, **kwargs)
+    return exclusive
+
+
+class GestionStock:
+    INTERVALLE_CHECKPOINT = 1000
+    # "immediate" : chaque transaction est écrite avant de rendre la main ;
+    # "groupee" : écriture par lots de taille_lot ou toutes les intervalle_lot secondes ;
+    # "fermeture" : écriture à flush() ou à fermer() seulement.
+    POLITIQUES_ECRITURE = ("immediate", "groupee", "fermeture")
+
+    def __init__(self, journal=False, fsync=False, moteur_rapport=None, stockage=None, paresseux=False,
+                 instrumentation=None, politique_ecriture="immediate", taille_lot=100, intervalle_lot=0.2,
+                 partage=False, processus_rapport=0):
+        if politique_ecriture not in self.POLITIQUES_ECRITURE:
+            raise ValueError(f"Politique d'écriture inconnue : {politique_ecriture}")
+        if partage and politique_ecriture != "immediate":
+            # Un rang attribué en mémoire pourrait être pris entre-temps par un autre processus
+            raise ValueError("Le mode partagé exige la politique d'écriture immediate.")
+        self.stockage = stockage or StockageCSV(journal=journal, fsync=fsync)
+        # Plusieurs processus sur le même dossier : voir Coordination
+        self._coordination = Coordination(self.stockage.dossier) if partage else None
+        if self._coordination is not None:
+            with self._coordination:
+                self._coordination.rattacher()
+        self.politique_ecriture = politique_ecriture
+        self.taille_lot = taille_lot
+        self.intervalle_lot = intervalle_lot
+        # Rangs ajoutés en mémoire mais pas encore écrits ; le verrou protège aussi le minuteur
+        self._en_attente = {nature: [] for nature in NATURES}
+        # Lignes en attente d'une nature dont l'historique n'est pas chargé, par rang
+        self._ajouts_hors_memoire = {nature: {} for nature in NATURES}
+        self._minuteur = None
+        self._verrou_ecritures = threading.RLock()
+        self._articles = None
+        self._index_articles = {}
+        self._index_composite = {}
+        self._index_noms = IndexNoms()
+        self._prochain_id = 1
+        self._transactions = {nature: None for nature in NATURES}
+        self._chronos = {nature: IndexChronologique() for nature in NATURES}
+        self._version = 0
+        # Quantités cumulées par article et position jusqu'où elles ont été comptées
+        self._cumuls = {nature: {} for nature in NATURES}
+        self._rangs_stocks = {nature: 0 for nature in NATURES}
+        self._dernieres_dates = {nature: None for nature in NATURES}
+        self._rangs_checkpoint = {nature: 0 for nature in NATURES}
+        self._depuis_checkpoint = 0
+        self.moteur_rapport = moteur_rapport or self.stockage.MOTEUR_RAPPORT
+        self._moteur_numpy = MoteurRapportNumpy(self) if self.moteur_rapport == "numpy" else None
+        # processus_rapport > 1 : les longues périodes du moteur Python sont agrégées en parallèle
+        self._cache_rapports = CacheRapports(self, processus=processus_rapport)
+        self.instrumentation = None
+        if instrumentation is not None:
+            self.activer_instrumentation(instrumentation)
+        # En mode paresseux, le catalogue et l'historique ne sont lus qu'au premier accès
+        if not paresseux:
+            self.charger_ventes()
+            self.charger_achats()
+            self.charger_articles()
+
+    def activer_instrumentation(self, instrumentation=None):
+        self.desactiver_instrumentation()
+        self.instrumentation = instrumentation or Instrumentation()
+        nb_transactions = lambda nature: lambda gestion_stock, args, resultat: len(gestion_stock._transactions[nature])
+        taille = lambda objet, args, resultat: len(resultat)
+        for nom_methode, lignes in (
+                ("charger_articles", lambda gestion_stock, args, resultat: len(gestion_stock._articles)),
+                ("charger_ventes", nb_transactions("ventes")),
+                ("charger_achats", nb_transactions("achats")),
+                ("_initialiser_stocks", None),
+                ("sauvegarder_articles", None),
+                ("ajouter_article", None),
+                ("importer_articles", lambda gestion_stock, args, resultat: sum(resultat.values())),
+                ("supprimer_article", None),
+                ("modifier_article", None),
+                ("enregistrer_vente", None),
+                ("enregistrer_achat", None),
+                ("modifier_vente", None),
+                ("modifier_achat", None),
+                ("rechercher_article", None),
+                ("rechercher_article_par_nom", taille),
+                ("_transactions_periode", taille),
+                ("rapport_inventaire", taille),
+                ("verifier_stocks", None),
+                ("flush", lambda gestion_stock, args, resultat: resultat),
+                ("compacter", None)):
+            self.instrumentation.envelopper(self, nom_methode, f"GestionStock.{nom_methode}", lignes)
+        nom_stockage = type(self.stockage).__name__
+        for nom_methode, lignes in (("ecrire_articles", lambda stockage, args, resultat: len(args[0])),
+                                    ("ecrire_transactions", lambda stockage, args, resultat: len(args[1])),
+                                    ("ajouter_transaction", None),
+                                    ("corriger_transaction", None),
+                                    ("ecrire_checkpoint", None),
+                                    ("ecrire_instantane", None)):
+            self.instrumentation.envelopper(self.stockage, nom_methode, f"{nom_stockage}.{nom_methode}", lignes)
+        return self.instrumentation
+
+    def desactiver_instrumentation(self):
+        if self.instrumentation is not None:
+            self.instrumentation.retirer()
+            self.instrumentation = None
+
+    @property
+    def articles(self):
+        if self._articles is None:
+            self.charger_articles()
+        return self._articles
+
+    @property
+    def ventes(self):
+        return self._liste("ventes")
+
+    @property
+    def achats(self):
+        return self._liste("achats")
+
+    def _liste(self, nature):
+        if self._transactions[nature] is None:
+            self._charger_transactions(nature)
+        return self._transactions[nature]
+
+    def _assurer_catalogue(self):
+        if self._articles is None:
+            self.charger_articles()
+
+    @_partage
+    def charger_articles(self):
+        self._articles = list(self.stockage.lire_articles())
+        self._reconstruire_index()
+        self._initialiser_stocks()
+
+    def _initialiser_stocks(self):
+        # Stock = stock initial + achats - ventes, rejoués depuis le dernier point de contrôle
+        checkpoint = self.stockage.lire_checkpoint() or {}
+        for nature in NATURES:
+            self._rejouer_stocks(nature, checkpoint.get(nature))
+        for article in self._articles:
+            article.stock = self._niveau_stock(article)
+
+    def _rejouer_stocks(self, nature, point):
+        cumuls = {}
+        rang = -1
+        date = None
+        transactions = None
+        if point and point["rang"] > 0:
+            # Le point de contrôle n'est repris que si sa dernière ligne est toujours en place
+            suite = self._transactions_depuis(nature, point["rang"] - 1)
+            rang, derniere = next(suite, (None, None))
+            if rang == point["rang"] - 1 and derniere["date"].strftime(FORMAT_DATE) == point["date"]:
+                cumuls = {int(id_article): quantite for id_article, quantite in point["cumuls"].items()}
+                date = point["date"]
+                transactions = suite
+            else:
+                suite.close()
+                rang = -1
+        self._rangs_checkpoint[nature] = rang + 1
+        transaction_list = self._transactions[nature]
+        if transaction_list is not None:
+            # Historique en mémoire : cumul directement sur les colonnes, sans construire de dict
+            if transactions is not None:
+                transactions.close()
+            depart = rang + 1
+            for id_article, quantite in zip(transaction_list.ids[depart:], transaction_list.quantites[depart:]):
+                cumuls[id_article] = cumuls.get(id_article, 0) + quantite
+            if len(transaction_list) > depart:
+                rang = len(transaction_list) - 1
+                date = date_depuis_horodatage(transaction_list.dates[rang]).strftime(FORMAT_DATE)
+        else:
+            if transactions is None:
+                transactions = self._transactions_depuis(nature, 0)
+            for rang, transaction in transactions:
+                cumuls[transaction["id_article"]] = cumuls.get(transaction["id_article"], 0) + transaction["quantite"]
+                date = transaction["date"].strftime(FORMAT_DATE)
+        self._cumuls[nature] = cumuls
+        self._rangs_stocks[nature] = rang + 1
+        self._dernieres_dates[nature] = date
+
+    def _transactions_depuis(self, nature, depuis):
+        transaction_list = self._transactions[nature]
+        if transaction_list is None:
+            self.flush()
+            return self.stockage.iterer_transactions(nature, depuis=depuis)
+        return ((rang, transaction_list[rang]) for rang in range(depuis, len(transaction_list)))
+
+    def _niveau_stock(self, article):
+        return (article.stock_initial + self._cumuls["achats"].get(article.id_article, 0)
+                - self._cumuls["ventes"].get(article.id_article, 0))
+
+    def _mouvement_stock(self, nature, transaction, signe):
+        id_article = transaction["id_article"]
+        quantite = signe * transaction["quantite"]
+        cumuls = self._cumuls[nature]
+        cumuls[id_article] = cumuls.get(id_article, 0) + quantite
+        article = self._index_articles.get(id_article)
+        if article is not None:
+            article.stock += quantite if nature == "achats" else -quantite
+
+    @_partage
+    def ecrire_checkpoint(self):
+        if self._articles is None:
+            return
+        # Le point de contrôle ne doit jamais compter une ligne absente du stockage
+        self.flush()
+        self.stockage.ecrire_checkpoint({nature: {"rang": self._rangs_stocks[nature],
+                                                  "date": self._dernieres_dates[nature],
+                                                  "cumuls": self._cumuls[nature]} for nature in NATURES})
+        self._rangs_checkpoint = dict(self._rangs_stocks)
+        self._depuis_checkpoint = 0
+
+    def verifier_stocks(self, corriger=False):
+        # Recalcule tout l'historique et renvoie les écarts {id_article: (attendu, actuel)}
+        self._assurer_catalogue()
+        cumuls = {nature: {} for nature in NATURES}
+        for nature in NATURES:
+            for _, transaction in self._transactions_depuis(nature, 0):
+                cumuls[nature][transaction["id_article"]] = \
+                    cumuls[nature].get(transaction["id_article"], 0) + transaction["quantite"]
+        ecarts = {}
+        for article in self._articles:
+            attendu = (article.stock_initial + cumuls["achats"].get(article.id_article, 0)
+                       - cumuls["ventes"].get(article.id_article, 0))
+            if abs(attendu - article.stock) > 1e-9:
+                ecarts[article.id_article] = (attendu, article.stock)
+        if corriger:
+            self._cumuls = cumuls
+            for article in self._articles:
+                article.stock = self._niveau_stock(article)
+            self.ecrire_checkpoint()
+        return ecarts
+
+    def _reconstruire_index(self):
+        self._version += 1
+        self._index_articles = {}
+        self._index_composite = {}
+        for article in self.articles:
+            self._index_articles[article.id_article] = article
+            self._index_composite.setdefault((article.nom, article.prix_vente, article.prix_achat), []).append(article)
+        self._index_noms.reconstruire(self.articles)
+        self._prochain_id = max(self._index_articles, default=0) + 1
+
+    def _indexer_article(self, article):
+        self._version += 1
+        article.stock = self._niveau_stock(article)
+        self._index_articles[article.id_article] = article
+        self._index_composite.setdefault((article.nom, article.prix_vente, article.prix_achat), []).append(article)
+        self._index_noms.ajouter(article.nom, article.id_article)
+
+    def _desindexer_article(self, article):
+        self._version += 1
+        cle = (article.nom, article.prix_vente, article.prix_achat)
+        homonymes = self._index_composite[cle]
+        homonymes.remove(article)
+        if not homonymes:
+            del self._index_composite[cle]
+        if self._index_articles.get(article.id_article) is article:
+            del self._index_articles[article.id_article]
+        self._index_noms.retirer(article.nom, article.id_article)
+
+    def _resoudre_article(self, nom, prix_vente, prix_achat):
+        self._assurer_catalogue()
+        homonymes = self._index_composite.get((nom, prix_vente, prix_achat))
+        return homonymes[0] if homonymes else None
+
+    def charger_ventes(self):
+        self._charger_transactions("ventes")
+
+    def charger_achats(self):
+        self._charger_transactions("achats")
+
+    @_partage
+    def _charger_transactions(self, nature):
+        self.flush()
+        table = self.stockage.lire_table(nature)
+        self._transactions[nature] = table
+        self._chronos[nature].reconstruire(table)
+        self._cache_rapports.vider()
+        self._version += 1
+
+    def iterer_ventes(self, date_debut=None, date_fin=None, id_article=None):
+        return self.iterer_transactions("ventes", date_debut, date_fin, id_article)
+
+    def iterer_achats(self, date_debut=None, date_fin=None, id_article=None):
+        return self.iterer_transactions("achats", date_debut, date_fin, id_article)
+
+    def iterer_transactions(self, nature, date_debut=None, date_fin=None, id_article=None, avec_rang=False):
+        # Depuis la mémoire si l'historique est chargé, sinon en flux depuis le stockage ;
+        # avec_rang : couples (rang, transaction), le rang servant d'identifiant à modifier_transaction
+        transaction_list = self._transactions[nature]
+        if transaction_list is None:
+            self.flush()
+            for rang, transaction in self.stockage.iterer_transactions(nature, date_debut, date_fin, id_article):
+                yield (rang, transaction) if avec_rang else transaction
+            return
+        if date_debut is None and date_fin is None:
+            rangs = range(len(transaction_list))
+        else:
+            rangs = self._chronos[nature].plage(date_debut or datetime.min, date_fin or datetime.max)
+        for rang in rangs:
+            transaction = transaction_list[rang]
+            if id_article is None or transaction["id_article"] == id_article:
+                yield (rang, transaction) if avec_rang else transaction
+
+    def ordre_chronologique(self, nature):
+        self._liste(nature)
+        return self._chronos[nature].ordre()
+
+    def _transactions_periode(self, nature, date_debut, date_fin):
+        transaction_list = self._transactions[nature]
+        if transaction_list is not None:
+            return [transaction_list[rang] for rang in self._chronos[nature].plage(date_debut, date_fin)]
+        # Seules les lignes de la période sont gardées, puis remises dans l'ordre chronologique
+        self.flush()
+        periode = list(self.stockage.iterer_transactions(nature, date_debut, date_fin))
+        periode.sort(key=lambda element: (element[1]["date"], element[0]))
+        return [transaction for _, transaction in periode]
+
+    @_partage
     def sauvegarder_articles(self):
-        self._sauvegarder(self.FILENAME_ARTICLES, self.articles, ["id_article", "nom", "prix_vente", "prix_achat", "stock", "date"])
+        self.stockage.ecrire_articles(self.articles)
 
+    @_partage
     def sauvegarder_ventes(self):
-        print(self.ventes[0])
-        self._sauvegarder(self.FILENAME_VENTES, self.ventes, ["id_article", "quantite", "date"])
+        self.flush()
+        self.stockage.ecrire_transactions("ventes", self.ventes)
+        self._publier("T", "ventes")
 
+    @_partage
     def sauvegarder_achats(self):
-        self._sauvegarder(self.FILENAME_ACHATS, self.achats, ["id_article", "quantite", "date"])
+        self.flush()
+        self.stockage.ecrire_transactions("achats", self.achats)
+        self._publier("T", "achats")
+
+    def _publier(self, *entree):
+        if self._coordination is not None:
+            self._coordination.publier([entree])
+
+    def a_synchroniser(self):
+        # Test rapide, sans verrou : un autre processus a-t-il écrit depuis le dernier rattrapage ?
+        return self._coordination is not None and self._coordination.modifie()
+
+    def synchroniser(self):
+        # Applique les écritures publiées par les autres processus ; renvoie True si l'état a changé
+        if not self.a_synchroniser():
+            return False
+        return self._rattraper()
+
+    def _rattraper(self):
+        # Sans le test de taille : après un renouvellement, le registre peut avoir la taille de la position
+        with self._coordination:
+            entrees = self._coordination.nouveautes()
+            if entrees is not None and all(self._appliquer(entree) for entree in entrees):
+                return bool(entrees)
+            # Registre renouvelé, ou ligne manquante : les fichiers font foi, on relit ce qui est chargé
+            self._coordination.rattacher()
+            for nature in NATURES:
+                if self._transactions[nature] is not None:
+                    self._charger_transactions(nature)
+            if self._articles is not None:
+                self.charger_articles()
+            return True
 
-    def _sauvegarder(self, filename, data_list, fieldnames):
-        with open(filename, "w", newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for item in data_list:
-                row = {field: getattr(item, field) if hasattr(item, field) else item[field] for field in fieldnames}
-                row["date"] = row["date"].strftime("%Y-%m-%d %H:%M:%S") if isinstance(row["date"], datetime) else row["date"]
-                writer.writerow(row)
+    def _appliquer(self, entree):
+        # Rejoue une entrée du registre sur ce qui est chargé ; False si elle ne suit pas l'état connu
+        operation = entree[0]
+        if operation == "+":
+            _, nature, rang, id_article, quantite, valeur = entree
+            transaction = {"id_article": id_article, "quantite": quantite, "date": date_depuis_horodatage(valeur)}
+            transaction_list = self._transactions[nature]
+            if transaction_list is not None:
+                if rang != len(transaction_list):
+                    return False
+                transaction_list.integrer_ajout(transaction)
+                self._chronos[nature].ajouter(transaction["date"], rang)
+                self._cache_rapports.ajouter(nature, rang, transaction)
+            if self._articles is not None:
+                if rang != self._rangs_stocks[nature]:
+                    return False
+                self._mouvement_stock(nature, transaction, 1)
+                self._rangs_stocks[nature] = rang + 1
+                self._dernieres_dates[nature] = transaction["date"].strftime(FORMAT_DATE)
+        elif operation == "~":
+            _, nature, rang, ancien_id, ancienne_quantite, ancienne_valeur, id_article, quantite, valeur = entree
+            ancienne = {"id_article": ancien_id, "quantite": ancienne_quantite,
+                        "date": date_depuis_horodatage(ancienne_valeur)}
+            transaction = {"id_article": id_article, "quantite": quantite, "date": date_depuis_horodatage(valeur)}
+            transaction_list = self._transactions[nature]
+            if transaction_list is not None:
+                if rang >= len(transaction_list):
+                    return False
+                self._chronos[nature].retirer(ancienne["date"], rang)
+                transaction_list.integrer_correction(rang, transaction)
+                self._chronos[nature].ajouter(transaction["date"], rang)
+                self._cache_rapports.corriger(nature, rang, ancienne, transaction)
+            if self._articles is not None:
+                if rang >= self._rangs_stocks[nature]:
+                    return False
+                self._mouvement_stock(nature, ancienne, -1)
+                self._mouvement_stock(nature, transaction, 1)
+                if rang == self._rangs_stocks[nature] - 1:
+                    self._dernieres_dates[nature] = transaction["date"].strftime(FORMAT_DATE)
+        elif operation == "A":
+            if self._articles is not None:
+                _, id_article, nom, prix_vente, prix_achat, stock_initial, date = entree
+                article = self._index_articles.get(id_article)
+                if article is None:
+                    article = Article(id_article, nom, prix_vente, prix_achat, stock_initial, date)
+                    self._articles.append(article)
+                else:
+                    self._desindexer_article(article)
+                    article.nom, article.prix_vente, article.prix_achat = nom, prix_vente, prix_achat
+                self._indexer_article(article)
+                self._prochain_id = max(self._prochain_id, id_article + 1)
+        elif operation == "S":
+            article = self._index_articles.get(entree[1]) if self._articles is not None else None
+            if article is not None:
+                self._desindexer_article(article)
+                self._articles.remove(article)
+        else:
+            # "I" (import d'articles) et "T" (historique réécrit) : relecture complète
+            return False
+        self._version += 1
+        return True
 
+    @_partage
+    def _ajouter_transaction(self, nature, transaction):
+        with self._verrou_ecritures:
+            transaction_list = self._transactions[nature]
+            if transaction_list is None and not self.stockage.AJOUT_PONCTUEL:
+                transaction_list = self._liste(nature)
+            if transaction_list is None:
+                # Historique non chargé : le rang est le nombre de lignes déjà comptées par les stocks
+                self._assurer_catalogue()
+                rang = self._rangs_stocks[nature]
+                transaction_list = self._ajouts_hors_memoire[nature]
+                transaction_list[rang] = transaction
+            else:
+                transaction_list.append(transaction)
+                rang = len(transaction_list) - 1
+                self._chronos[nature].ajouter(transaction["date"], rang)
+                self._cache_rapports.ajouter(nature, rang, transaction)
+            self._version += 1
+            if self.politique_ecriture == "immediate":
+                self.stockage.ajouter_transaction(nature, rang, transaction_list)
+                self._ajouts_hors_memoire[nature].clear()
+                self._publier("+", nature, rang, transaction["id_article"], transaction["quantite"],
+                              horodatage(transaction["date"]))
+            else:
+                self._differer(nature, rang)
+            if self._articles is not None:
+                # Sinon la ligne sera rejouée au chargement du catalogue ; sous le verrou, car le rang
+                # d'un ajout sans historique chargé en dépend
+                self._mouvement_stock(nature, transaction, 1)
+                self._rangs_stocks[nature] = rang + 1
+                self._dernieres_dates[nature] = transaction["date"].strftime(FORMAT_DATE)
+                self._depuis_checkpoint += 1
+                if self._depuis_checkpoint >= self.INTERVALLE_CHECKPOINT:
+                    self.ecrire_checkpoint()
+
+    def _differer(self, nature, rang):
+        self._en_attente[nature].append(rang)
+        if self.politique_ecriture != "groupee":
+            return
+        if sum(len(rangs) for rangs in self._en_attente.values()) >= self.taille_lot:
+            self.flush()
+        elif self._minuteur is None:
+            self._minuteur = threading.Timer(self.intervalle_lot, self.flush)
+            self._minuteur.daemon = True
+            self._minuteur.start()
+
+    def flush(self):
+        # Écrit en un lot par nature les transactions en attente ; renvoie leur nombre
+        with self._verrou_ecritures:
+            if self._minuteur is not None:
+                self._minuteur.cancel()
+                self._minuteur = None
+            nb_lignes = 0
+            for nature in NATURES:
+                rangs = self._en_attente[nature]
+                if rangs:
+                    self._en_attente[nature] = []
+                    transaction_list = self._transactions[nature]
+                    if transaction_list is None:
+                        transaction_list = self._ajouts_hors_memoire[nature]
+                        self._ajouts_hors_memoire[nature] = {}
+                    self.stockage.ajouter_transactions(nature, rangs, transaction_list)
+                    nb_lignes += len(rangs)
+            return nb_lignes
+
+    @_partage
+    def _corriger_transaction(self, nature, rang, transaction):
+        with self._verrou_ecritures:
+            self._assurer_catalogue()
+            # La correction passe après les ajouts en attente, qu'elle peut viser
+            self.flush()
+            transaction_list = self._transactions[nature]
+            if transaction_list is None and not self.stockage.CORRECTION_PONCTUELLE:
+                transaction_list = self._liste(nature)
+            if transaction_list is None:
+                # Historique non chargé : seule la ligne visée est lue (StockageSegments : dans son segment)
+                suite = self.stockage.iterer_transactions(nature, depuis=rang)
+                _, ancienne = next(suite)
+                suite.close()
+            else:
+                ancienne = transaction_list[rang]
+            # Une ligne déjà couverte par le point de contrôle le rend faux jusqu'à sa réécriture ;
+            # en mode partagé, un autre processus a pu l'étendre sans que ce processus le sache
+            couverte = self._coordination is not None or rang < self._rangs_checkpoint[nature]
+            if couverte:
+                self.stockage.supprimer_checkpoint()
+            if transaction_list is None:
+                self.stockage.corriger_transaction(nature, rang, {rang: transaction})
+            else:
+                self._chronos[nature].retirer(ancienne["date"], rang)
+                transaction_list.modifier(rang, transaction)
+                self._chronos[nature].ajouter(transaction["date"], rang)
+                self._cache_rapports.corriger(nature, rang, ancienne, transaction)
+                self.stockage.corriger_transaction(nature, rang, transaction_list)
+            self._version += 1
+            self._publier("~", nature, rang, ancienne["id_article"], ancienne["quantite"],
+                          horodatage(ancienne["date"]), transaction["id_article"], transaction["quantite"],
+                          horodatage(transaction["date"]))
+            self._mouvement_stock(nature, ancienne, -1)
+            self._mouvement_stock(nature, transaction, 1)
+            if rang == self._rangs_stocks[nature] - 1:
+                self._dernieres_dates[nature] = transaction["date"].strftime(FORMAT_DATE)
+            if couverte:
+                self.ecrire_checkpoint()
+
+    @_partage
+    def compacter(self):
+        self.flush()
+        for nature in NATURES:
+            if self._transactions[nature] is not None:
+                self.stockage.compacter(nature, self._transactions[nature])
+
+    @_partage
+    def ecrire_instantane(self):
+        if self._articles is None or any(self._transactions[nature] is None for nature in NATURES):
+            return
+        self.stockage.ecrire_instantane(self._articles, self._transactions)
+
+    def fermer(self):
+        self.compacter()
+        self.ecrire_checkpoint()
+        self.ecrire_instantane()
+        self.stockage.fermer()
+        self._cache_rapports.fermer()
+        if self._coordination is not None:
+            self._coordination.fermer()
+
+    @_partage
     def ajouter_article(self, nom, prix_vente, prix_achat):
-        id_article = len(self.articles) + 1
-        article = Article(id_article, nom, prix_vente, prix_achat)
+        self._assurer_catalogue()
+        article = Article(self._prochain_id, nom, prix_vente, prix_achat)
 
-        if article in self.articles:
+        if (nom, prix_vente, prix_achat) in self._index_composite:
             return False
 
         self.articles.append(article)
+        self._indexer_article(article)
+        self._prochain_id += 1
         self.sauvegarder_articles()
+        self._publier_article(article)
         return True
 
+    def _publier_article(self, article):
+        self._publier("A", article.id_article, article.nom, article.prix_vente, article.prix_achat,
+                      article.stock_initial, article.date)
+
+    @_partage
+    def importer_articles(self, lignes):
+        # Import en masse : dédoublonnage par la clé composite et une seule sauvegarde à la fin
+        self._assurer_catalogue()
+        bilan = {"inseres": 0, "ignores": 0, "rejetes": 0}
+        date = datetime.now().strftime(FORMAT_DATE)
+        for ligne in lignes:
+            try:
+                nom = ligne["nom"].strip()
+                prix_vente = float(ligne["prix_vente"])
+                prix_achat = float(ligne["prix_achat"])
+                if not nom or not (math.isfinite(prix_vente) and math.isfinite(prix_achat)):
+                    raise ValueError(nom)
+                article = Article(self._prochain_id, nom, prix_vente, prix_achat, 0, date)
+            except (KeyError, TypeError, AttributeError, ValueError):
+                bilan["rejetes"] += 1
+                continue
+            cle = (nom, prix_vente, prix_achat)
+            if cle in self._index_composite:
+                bilan["ignores"] += 1
+                continue
+            article.stock = self._niveau_stock(article)
+            self._articles.append(article)
+            self._index_articles[article.id_article] = article
+            self._index_composite[cle] = [article]
+            self._prochain_id += 1
+            bilan["inseres"] += 1
+        if bilan["inseres"]:
+            self._version += 1
+            self._index_noms.reconstruire(self._articles)
+            self.sauvegarder_articles()
+            self._publier("I")
+        return bilan
+
+    def importer_fichier_articles(self, filename):
+        # Liste de prix fournisseur (colonnes nom, prix_vente, prix_achat), séparateur détecté
+        if filename.lower().endswith(".xlsx"):
+            return self.importer_articles(lire_classeur(filename))
+        with open(filename, "r", newline='', encoding="utf-8-sig") as fichier:
+            debut = fichier.read(4096)
+            fichier.seek(0)
+            try:
+                dialecte = csv.Sniffer().sniff(debut, delimiters=",;\t")
+            except csv.Error:
+                dialecte = csv.excel
+            return self.importer_articles(csv.DictReader(fichier, dialect=dialecte))
+
+    def exporter_classeur(self, filename):
+        # Articles, ventes et achats, chacun dans sa feuille, sans copie intermédiaire de l'historique
+        def transactions(nature):
+            for transaction in self.iterer_transactions(nature):
+                yield transaction["id_article"], transaction["quantite"], transaction["date"]
+        ecrire_classeur(filename, [
+            ("articles", ["id_article", "nom", "prix_vente", "prix_achat", "stock", "date"],
+             ((article.id_article, article.nom, article.prix_vente, article.prix_achat, article.stock, article.date)
+              for article in self.lister_articles())),
+            ("ventes", ["id_article", "quantite", "date"], transactions("ventes")),
+            ("achats", ["id_article", "quantite", "date"], transactions("achats"))])
+        return filename
+
+    def exporter_rapport(self, filename, date_debut, date_fin, progression=None):
+        # Le rapport tient en mémoire (une ligne par article), seul le fichier est écrit par blocs
+        rapport = self.rapport_inventaire(date_debut, date_fin)
+        lignes = ((nom, details["prix_vente"], details["prix_achat"], details["valeur_achat"],
+                   details["valeur_vente"], details["valeur_vente"] - details["valeur_achat"])
+                  for nom, details in rapport.items())
+        ecrire_export(filename, *COLONNES_RAPPORT, lignes, progression, len(rapport))
+        return filename
+
+    def exporter_transactions(self, nature, filename, date_debut=None, date_fin=None, progression=None):
+        # Détail des ventes ou achats d'une période, valorisé au prix de l'article, en flux depuis la mémoire
+        # ou le stockage : rien n'est copié avant l'écriture
+        self.flush()
+        self._assurer_catalogue()
+        total = None
+        if self._transactions[nature] is not None:
+            total = len(self._chronos[nature].plage(date_debut or datetime.min, date_fin or datetime.max)
+                        ) if date_debut or date_fin else len(self._transactions[nature])
+        colonne_prix = "prix_vente" if nature == "ventes" else "prix_achat"
+
+        def lignes():
+            for transaction in self.iterer_transactions(nature, date_debut, date_fin):
+                article = self._index_articles.get(transaction["id_article"])
+                prix = getattr(article, colonne_prix) if article else 0.0
+                yield (transaction["id_article"], article.nom if article else "", transaction["quantite"], prix,
+                       transaction["quantite"] * prix, transaction["date"])
+        ecrire_export(filename, *COLONNES_TRANSACTIONS, lignes(), progression, total)
+        return filename
+
+    @_partage
     def supprimer_article(self, id_article):
-        article_to_remove = next((article for article in self.articles if article.id_article == id_article), None)
+        self._assurer_catalogue()
+        article_to_remove = self._index_articles.get(id_article)
         if article_to_remove:
+            self._desindexer_article(article_to_remove)
             self.articles.remove(article_to_remove)
             self.sauvegarder_articles()
+            self._publier("S", id_article)
             return True
         return False
 
+    @_partage
     def modifier_article(self, id_article, nom=None, prix_vente=None, prix_achat=None):
-        article = next((article for article in self.articles if article.id_article == id_article), None)
+        self._assurer_catalogue()
+        article = self._index_articles.get(id_article)
         if article:
+            self._desindexer_article(article)
             if nom:
                 article.nom = nom
             if prix_vente:
                 article.prix_vente = prix_vente
             if prix_achat:
                 article.prix_achat = prix_achat
+            self._indexer_article(article)
             self.sauvegarder_articles()
+            self._publier_article(article)
             return True
         return False
 
+    def lire_transaction(self, nature, rang):
+        # Accès direct par rang : les lignes ne sont jamais supprimées ni déplacées, le rang est donc
+        # un identifiant stable d'une session et d'un processus à l'autre
+        if rang < 0:
+            return None
+        transaction_list = self._transactions[nature]
+        if transaction_list is not None or not self.stockage.CORRECTION_PONCTUELLE:
+            transaction_list = self._liste(nature)
+            return transaction_list[rang] if rang < len(transaction_list) else None
+        self.flush()
+        suite = self.stockage.iterer_transactions(nature, depuis=rang)
+        rang_lu, transaction = next(suite, (None, None))
+        suite.close()
+        return transaction if rang_lu == rang else None
+
+    def rechercher_rang(self, nature, id_article, date):
+        # Première transaction de l'article dans la seconde de `date`
+        transaction_list = self._transactions[nature]
+        if transaction_list is not None or not self.stockage.CORRECTION_PONCTUELLE:
+            ids = self._liste(nature).ids
+            debut = horodatage(date.replace(microsecond=0))
+            return min((rang for rang in self._chronos[nature].plage_horodatages(debut, debut + 999999)
+                        if ids[rang] == id_article), default=None)
+        # Historique non chargé : seules les lignes de cette seconde sont lues
+        self.flush()
+        debut = date.replace(microsecond=0)
+        suite = self.stockage.iterer_transactions(nature, debut, debut + timedelta(seconds=1) - UNE_MICROSECONDE,
+                                                  id_article)
+        rang = next((rang for rang, _ in suite), None)
+        suite.close()
+        return rang
+
+    @_partage
+    def modifier_transaction(self, nature, rang, quantite):
+        # Correction d'une ligne désignée par son rang, sans recherche par date
+        ancienne = self.lire_transaction(nature, rang)
+        if ancienne is None:
+            return False
+        transaction = {"id_article": ancienne["id_article"], "quantite": quantite, "date": datetime.now()}
+        self._corriger_transaction(nature, rang, transaction)
+        return True
+
+    @_partage
     def modifier_vente(self, id_article, quantite, date):
-        print(date)
-        # date=datetime.strptime(date,"%Y-%m-%d %H:%M:%S")
-        date_obj = datetime.strptime(date, "%Y-%m-%d %H:%M:%S.%f")
-        date= date_obj.strftime("%Y-%m-%d %H:%M:%S")
-
-        vente = next((vente for vente in self.ventes if vente["id_article"] == id_article and vente["date"].strftime("%Y-%m-%d %H:%M:%S")==date), None)
-        # print(vente)
-        if vente:
-            vente["id_article"]=id_article
-            vente["quantite"]=quantite
-            vente["date"]=datetime.now()
-            self.sauvegarder_ventes()
-            print(vente)
-            return True
-        return False
-    def modifier_achat(self, id_article, quantite, date):
-        # Trouver l'achat correspondant
-        date_obj = datetime.strptime(date, "%Y-%m-%d %H:%M:%S.%f")
-        date= date_obj.strftime("%Y-%m-%d %H:%M:%S")
-        achat = next((achat for achat in self.achats if achat["id_article"] == id_article and achat["date"].strftime("%Y-%m-%d %H:%M:%S") == date), None)
-        print(achat)
-
-        if achat and quantite:
-            # Mettre à jour les champs de l'achat
-            achat["id_article"] = id_article
-            achat["quantite"] = quantite
-            achat["date"] = datetime.now()
-            self.sauvegarder_achats()
-            print(achat)
-            return True
+        return self._modifier_par_date("ventes", id_article, quantite, date)
 
-        return False
+    @_partage
+    def modifier_achat(self, id_article, quantite, date):
+        return self._modifier_par_date("achats", id_article, quantite, date)
 
+    def _modifier_par_date(self, nature, id_article, quantite, date):
+        # Ancienne désignation par (article, date) : une quantité nulle est acceptée, comme par rang
+        rang = self.rechercher_rang(nature, id_article, datetime.strptime(date, "%Y-%m-%d %H:%M:%S.%f"))
+        if rang is None:
+            return False
+        transaction = {"id_article": id_article, "quantite": quantite, "date": datetime.now()}
+        self._corriger_transaction(nature, rang, transaction)
+        return True
 
     def rechercher_article(self, id_article):
-        return next((article for article in self.articles if article.id_article == id_article), None)
+        if self._articles is None:
+            self.charger_articles()
+        return self._index_articles.get(id_article)
 
-    def rechercher_article_par_nom(self, nom):
-        # return [article for article in self.articles if nom.lower() in article.nom.lower()]
-        resultats = []
-        # for nom in liste_noms:
-        #     if nom.startswith(noms_recherche):
-        #         resultats.append(nom)
-        # return resultats
-        for article in self.articles:
-            if article.nom.lower().startswith(nom):
-                resultats.append(article)
-        return resultats
+    def rechercher_article_par_nom(self, nom, limite=None):
+        self._assurer_catalogue()
+        return [self._index_articles[id_article] for id_article in self._index_noms.rechercher(nom, limite)]
 
     def lister_articles(self):
         return self.articles
@@ -183,60 +2807,400 @@ class GestionStock:
     def lister_achats(self):
         return self.achats
 
+    def nb_transactions(self, nature):
+        # Sans charger l'historique : les stocks comptent déjà les lignes écrites
+        if self._transactions[nature] is not None:
+            return len(self._transactions[nature])
+        self._assurer_catalogue()
+        return self._rangs_stocks[nature]
+
+    def page_transactions(self, nature, debut, fin):
+        # (rang, transaction) des rangs debut à fin - 1 ; historique non chargé : seule la page est lue
+        with self._verrou_ecritures:
+            transaction_list = self._transactions[nature]
+            if transaction_list is not None:
+                return [(rang, transaction_list[rang]) for rang in range(debut, min(fin, len(transaction_list)))]
+            self.flush()
+            suite = self.stockage.iterer_transactions(nature, depuis=debut)
+            page = list(itertools.islice(suite, max(0, fin - debut)))
+            suite.close()
+            return page
+
+    @_partage
     def enregistrer_vente(self, nom, prix_vente, prix_achat, quantite):
-        article = next((article for article in self.articles if article.nom == nom and article.prix_vente == prix_vente and article.prix_achat == prix_achat), None)
+        article = self._resoudre_article(nom, prix_vente, prix_achat)
         if article:
             vente = {"id_article": article.id_article, "quantite": quantite, "date": datetime.now()}
-            self.ventes.append(vente)
-            self.sauvegarder_ventes()
+            self._ajouter_transaction("ventes", vente)
             return True
         return False
 
+    @_partage
     def enregistrer_achat(self, nom, prix_vente, prix_achat, quantite):
-        article = next((article for article in self.articles if article.nom == nom and article.prix_vente == prix_vente and article.prix_achat == prix_achat), None)
+        article = self._resoudre_article(nom, prix_vente, prix_achat)
         if article:
             achat = {"id_article": article.id_article, "quantite": quantite, "date": datetime.now()}
-            self.achats.append(achat)
-            self.sauvegarder_achats()
+            self._ajouter_transaction("achats", achat)
             return True
         return False
 
-    def rapport_inventaire(self, date_debut, date_fin):
-        ventes = [vente for vente in self.ventes if date_debut <= vente["date"] <= date_fin]
-        achats = [achat for achat in self.achats if date_debut <= achat["date"] <= date_fin]
+    def rapport_inventaire(self, date_debut, date_fin, moteur=None):
+        self.synchroniser()
+        moteur = moteur or self.moteur_rapport
+        if moteur == "numpy":
+            if self._moteur_numpy is None:
+                self._moteur_numpy = MoteurRapportNumpy(self)
+            return self._moteur_numpy.rapport_inventaire(date_debut, date_fin)
+        if moteur == "sql":
+            self.flush()
+            return self._construire_rapport(
+                self._articles_et_quantites(self.stockage.quantites_par_article("ventes", date_debut, date_fin)),
+                self._articles_et_quantites(self.stockage.quantites_par_article("achats", date_debut, date_fin)))
+        if all(self._transactions[nature] is not None for nature in NATURES):
+            return self._cache_rapports.rapport_inventaire(date_debut, date_fin)
+
+        ventes = self._transactions_periode("ventes", date_debut, date_fin)
+        achats = self._transactions_periode("achats", date_debut, date_fin)
+        return self._construire_rapport(self._articles_et_quantites(self._totaux_par_article(ventes)),
+                                        self._articles_et_quantites(self._totaux_par_article(achats)))
+
+    @staticmethod
+    def _totaux_par_article(transactions):
+        # Somme exacte des quantités de chaque article, dans l'ordre de première apparition
+        totaux = {}
+        for transaction in transactions:
+            id_article = transaction["id_article"]
+            totaux[id_article] = totaux.get(id_article, 0) + quantite_exacte(transaction["quantite"])
+        return [(id_article, arrondir_somme(total)) for id_article, total in totaux.items()]
+
+    def _articles_et_quantites(self, quantites):
+        for id_article, quantite in quantites:
+            article = self.rechercher_article(id_article)
+            if article:
+                yield article, quantite
 
+    def _construire_rapport(self, ventes, achats):
+        # ventes et achats : couples (article, quantité totale) dans l'ordre de première apparition.
+        # Les valeurs sont quantité totale × prix : tous les moteurs qui donnent le même total (somme exacte
+        # arrondie une fois) donnent le même rapport. Le moteur "sql" garde la somme de SQLite, approchée.
         rapport = {}
+        for article, quantite in ventes:
+            if article.nom not in rapport:
+                rapport[article.nom] = {"vente": 0, "achat": 0, "valeur_vente": 0, "valeur_achat": 0,
+                                        "prix_vente": article.prix_vente, "prix_achat": article.prix_achat}
+            rapport[article.nom]["vente"] += quantite
+            rapport[article.nom]["valeur_vente"] += quantite * article.prix_vente
+        for article, quantite in achats:
+            if article.nom not in rapport:
+                rapport[article.nom] = {"vente": 0, "achat": 0, "valeur_vente": 0, "valeur_achat": 0,
+                                        "prix_vente": article.prix_vente, "prix_achat": article.prix_achat}
+            rapport[article.nom]["achat"] += quantite
+            rapport[article.nom]["valeur_achat"] += quantite * article.prix_achat
+        return rapport
 
-        for vente in ventes:
-            article = self.rechercher_article(vente["id_article"])
-            if article:
-                if article.nom not in rapport:
-                    rapport[article.nom] = {"vente": 0, "achat": 0, "valeur_vente": 0, "valeur_achat": 0,
-                                            "prix_vente": article.prix_vente, "prix_achat": article.prix_achat}
-                rapport[article.nom]["vente"] += vente["quantite"]
-                rapport[article.nom]["valeur_vente"] += vente["quantite"] * article.prix_vente
-
-        for achat in achats:
-            article = self.rechercher_article(achat["id_article"])
+
+class SourceArticles:
+    # Articles affichés par une TableVirtuelle : tout le catalogue ou un résultat de recherche
+
+    CLES = (lambda a: a.id_article, lambda a: a.nom, lambda a: a.prix_vente, lambda a: a.prix_achat,
+            lambda a: a.stock, lambda a: a.date)
+
+    def __init__(self, gestion_stock):
+        self.gestion_stock = gestion_stock
+        self.articles = None
+        self.tri = None
+        self._ordre = None
+
+    def definir(self, articles=None):
+        self.articles = articles
+        self._ordre = None
+
+    def _liste(self):
+        articles = self.articles if self.articles is not None else self.gestion_stock.lister_articles()
+        if self.tri is None:
+            return articles
+        if self._ordre is None or len(self._ordre) != len(articles):
+            colonne, decroissant = self.tri
+            self._ordre = sorted(articles, key=self.CLES[colonne], reverse=decroissant)
+        return self._ordre
+
+    def __len__(self):
+        return len(self._liste())
+
+    def lignes(self, debut, fin):
+        return [(None, (article.id_article, article.nom, article.prix_vente, article.prix_achat, article.stock,
+                        article.date)) for article in self._liste()[debut:fin]]
+
+    def trier(self, colonne, decroissant):
+        self.tri = (colonne, decroissant)
+        self._ordre = None
+
+    def invalider(self):
+        self._ordre = None
+
+
+class SourceTransactions:
+    # Ventes ou achats affichés par une TableVirtuelle ; seules les lignes demandées sont construites
+
+    def __init__(self, gestion_stock, nature):
+        self.gestion_stock = gestion_stock
+        self.nature = nature
+        self.tri = None
+        self._ordre = None
+
+    def _table(self):
+        return self.gestion_stock.lister_ventes() if self.nature == "ventes" else self.gestion_stock.lister_achats()
+
+    def __len__(self):
+        if self.tri is None:
+            return self.gestion_stock.nb_transactions(self.nature)
+        return len(self._table())
+
+    def _rangs(self, debut, fin):
+        table = self._table()
+        if self._ordre is None or len(self._ordre) != len(table):
+            colonne, decroissant = self.tri
+            if colonne == 5:
+                ordre = list(self.gestion_stock.ordre_chronologique(self.nature))
+            elif colonne == 0:
+                ordre = sorted(range(len(table)), key=table.ids.__getitem__)
+            elif colonne == 2:
+                ordre = sorted(range(len(table)), key=table.quantites.__getitem__)
+            else:
+                attribut = {1: "nom", 3: "prix_vente", 4: "prix_achat"}[colonne]
+                valeurs = {}
+                for article in self.gestion_stock.lister_articles():
+                    valeurs[article.id_article] = getattr(article, attribut)
+                defaut = "" if attribut == "nom" else 0
+                ordre = sorted(range(len(table)), key=lambda rang: valeurs.get(table.ids[rang], defaut))
+            if decroissant:
+                ordre.reverse()
+            self._ordre = ordre
+        return self._ordre[debut:fin]
+
+    def lignes(self, debut, fin):
+        if self.tri is None:
+            # Ordre des rangs : la page est lue sans charger l'historique (GestionStock paresseux)
+            page = self.gestion_stock.page_transactions(self.nature, debut, fin)
+        else:
+            table = self._table()
+            page = ((rang, table[rang]) for rang in self._rangs(debut, fin))
+        lignes = []
+        for rang, transaction in page:
+            article = self.gestion_stock.rechercher_article(transaction["id_article"])
             if article:
-                if article.nom not in rapport:
-                    rapport[article.nom] = {"vente": 0, "achat": 0, "valeur_vente": 0, "valeur_achat": 0,
-                                            "prix_vente": article.prix_vente, "prix_achat": article.prix_achat}
-                rapport[article.nom]["achat"] += achat["quantite"]
-                rapport[article.nom]["valeur_achat"] += achat["quantite"] * article.prix_achat
+                valeurs = (article.id_article, article.nom, transaction['quantite'], article.prix_vente,
+                           article.prix_achat, transaction['date'])
+            else:
+                valeurs = (transaction["id_article"], "", transaction['quantite'], "", "", transaction['date'])
+            lignes.append((str(rang), valeurs))
+        return lignes
+
+    def trier(self, colonne, decroissant):
+        self.tri = (colonne, decroissant)
+        self._ordre = None
+
+    def invalider(self):
+        self._ordre = None
+
+
+class TableVirtuelle(ttk.Frame):
+    # Treeview qui ne contient que les lignes visibles (plus un petit tampon),
+    # avec défilement, pagination et tri par colonne délégués à la source.
+    TAMPON = 5
+
+    def __init__(self, parent, colonnes, source):
+        super().__init__(parent)
+        self.source = source
+        self.colonnes = colonnes
+        self.debut = 0
+        self.nb_visibles = 20
+        self.tri = None
+
+        self.tree = ttk.Treeview(self, columns=colonnes, show="headings", height=self.nb_visibles)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        for i, colonne in enumerate(colonnes):
+            self.tree.heading(colonne, text=colonne, command=lambda i=i: self.trier(i))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._defiler)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        frame_pages = ttk.Frame(self)
+        frame_pages.grid(row=1, column=0, columnspan=2, sticky="ew")
+        ttk.Button(frame_pages, text="<<", width=3, command=lambda: self._aller(0)).pack(side=tk.LEFT)
+        ttk.Button(frame_pages, text="<", width=3, command=lambda: self._defiler("scroll", -1, "pages")).pack(side=tk.LEFT)
+        self.lbl_page = ttk.Label(frame_pages, text="")
+        self.lbl_page.pack(side=tk.LEFT, padx=10)
+        ttk.Button(frame_pages, text=">", width=3, command=lambda: self._defiler("scroll", 1, "pages")).pack(side=tk.LEFT)
+        ttk.Button(frame_pages, text=">>", width=3, command=lambda: self._aller(len(self.source))).pack(side=tk.LEFT)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.tree.bind("<Configure>", self._redimensionner)
+        self.tree.bind("<MouseWheel>", lambda event: self._defiler("scroll", -1 if event.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda event: self._defiler("scroll", -1, "units"))
+        self.tree.bind("<Button-5>", lambda event: self._defiler("scroll", 1, "units"))
+
+    def _redimensionner(self, event):
+        hauteur_ligne = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        nb_visibles = max(1, (event.height - hauteur_ligne) // hauteur_ligne)
+        if nb_visibles != self.nb_visibles:
+            self.nb_visibles = nb_visibles
+            self.afficher()
+
+    def _defiler(self, action, valeur, unite=None):
+        if action == "moveto":
+            self._aller(int(float(valeur) * len(self.source)))
+        elif action == "scroll":
+            pas = self.nb_visibles if unite == "pages" else 1
+            self._aller(self.debut + int(valeur) * pas)
+
+    def _aller(self, debut):
+        self.debut = max(0, min(debut, len(self.source) - self.nb_visibles))
+        self.afficher()
+
+    def trier(self, colonne):
+        decroissant = self.tri == (colonne, False)
+        self.tri = (colonne, decroissant)
+        self.source.trier(colonne, decroissant)
+        self._aller(0)
+
+    def rafraichir(self):
+        self.source.invalider()
+        self._aller(self.debut)
+
+    def afficher(self):
+        total = len(self.source)
+        self.tree.delete(*self.tree.get_children())
+        for iid, valeurs in self.source.lignes(self.debut, self.debut + self.nb_visibles + self.TAMPON):
+            self.tree.insert("", tk.END, iid=iid, values=valeurs)
+        if total:
+            self.scrollbar.set(self.debut / total, min(1.0, (self.debut + self.nb_visibles) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        nb_pages = max(1, -(-total // self.nb_visibles))
+        self.lbl_page.config(text=f"Page {self.debut // self.nb_visibles + 1} / {nb_pages} ({total} lignes)")
+
+
+class Travailleur:
+    # Exécute les écritures et les rapports hors de la boucle Tk, un seul à la fois
+    # pour que deux clics ne puissent pas entrelacer leurs sauvegardes.
+    # Les résultats reviennent au fil Tk par after().
+    INTERVALLE_MS = 50
+
+    def __init__(self, fenetre, sur_occupation=None):
+        self.fenetre = fenetre
+        self.sur_occupation = sur_occupation
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._resultats = queue.Queue()
+        self._en_cours = 0
+        self.fenetre.after(self.INTERVALLE_MS, self._sonder)
+
+    def soumettre(self, fonction, *args, succes=None, erreur=None):
+        self._en_cours += 1
+        if self._en_cours == 1 and self.sur_occupation:
+            self.sur_occupation(True)
+        future = self._pool.submit(fonction, *args)
+        future.add_done_callback(lambda future: self._resultats.put((future, succes, erreur)))
+        return future
+
+    def _sonder(self):
+        while True:
+            try:
+                future, succes, erreur = self._resultats.get_nowait()
+            except queue.Empty:
+                break
+            self._en_cours -= 1
+            if self._en_cours == 0 and self.sur_occupation:
+                self.sur_occupation(False)
+            exception = future.exception()
+            if exception is not None:
+                if erreur:
+                    erreur(exception)
+                else:
+                    messagebox.showerror("Erreur", str(exception))
+            elif succes:
+                succes(future.result())
+        self.fenetre.after(self.INTERVALLE_MS, self._sonder)
 
-        return rapport
+    def arreter(self):
+        self._pool.shutdown(wait=True)
 
 
 class StockApp(tk.Tk):
+    INTERVALLE_SYNCHRONISATION_MS = 2000
+
     def __init__(self):
         super().__init__()
         self.title("Gestion de Stock")
         self.geometry("800x600")
-        self.gestion_stock = GestionStock()
+        if os.path.exists(StockageSQLite.FILENAME):
+            stockage = StockageSQLite()
+        elif os.path.exists("ventes.dates"):
+            stockage = StockageColonnes()
+        elif os.path.exists(os.path.join("ventes", StockageSegments.FILENAME_MANIFESTE)):
+            stockage = StockageSegments()
+        else:
+            stockage = StockageCSV(journal=True)
+        # STOCK_INSTRUMENTATION=1 mesure GestionStock, le stockage, les gestionnaires et les tables
+        self.instrumentation = Instrumentation() if os.environ.get("STOCK_INSTRUMENTATION") else None
+        # STOCK_POLITIQUE_ECRITURE=groupee regroupe les écritures des ventes aux heures de pointe ;
+        # en écriture immédiate, plusieurs instances (caisses, bureau) peuvent partager le dossier
+        politique = os.environ.get("STOCK_POLITIQUE_ECRITURE", "immediate")
+        # STOCK_PROCESSUS_RAPPORT=4 répartit les rapports pluriannuels sur quatre processus
+        # Catalogue et historique sont lus au premier besoin : une vente n'attend pas l'historique complet
+        self.gestion_stock = GestionStock(stockage=stockage, instrumentation=self.instrumentation, paresseux=True,
+                                          politique_ecriture=politique, partage=politique == "immediate",
+                                          processus_rapport=int(os.environ.get("STOCK_PROCESSUS_RAPPORT", "0")))
+        if self.instrumentation is not None:
+            for nom_methode in ("add_article", "modify_article", "modify_vente", "modify_achat", "delete_article",
+                                "enregistrer_vente1", "enregistrer_achat1", "fct_rechercher", "charger_vue_excel",
+                                "generer_rapport", "exporter_periode", "_afficher_rapport", "update_articles_listbox",
+                                "update_ventes_listbox", "update_achats_listbox"):
+                self.instrumentation.envelopper(self, nom_methode, f"StockApp.{nom_methode}")
         self.create_widgets()
+        if self.instrumentation is not None:
+            for nom, table in (("articles", self.table_articles), ("ventes", self.table_ventes),
+                               ("achats", self.table_achats)):
+                self.instrumentation.envelopper(table, "afficher", f"TableVirtuelle.afficher[{nom}]",
+                                                lambda table, args, resultat: len(table.tree.get_children()))
+        self.travailleur = Travailleur(self, self.afficher_occupation)
+        self.protocol("WM_DELETE_WINDOW", self.fermer)
+        self.after(self.INTERVALLE_SYNCHRONISATION_MS, self.synchroniser)
+
+    def synchroniser(self):
+        # Reprend les écritures des autres instances ; le test est fait ici pour ne pas occuper le travailleur
+        if self.gestion_stock.a_synchroniser():
+            def termine(change):
+                if change:
+                    # Le filtre de recherche affiché est gardé
+                    for table in (self.table_articles, self.table_ventes, self.table_achats):
+                        table.rafraichir()
+            self.travailleur.soumettre(self.gestion_stock.synchroniser, succes=termine)
+        self.after(self.INTERVALLE_SYNCHRONISATION_MS, self.synchroniser)
+
+    def fermer(self):
+        self.travailleur.arreter()
+        self.gestion_stock.fermer()
+        self.destroy()
+
+    def afficher_occupation(self, occupe):
+        if occupe:
+            self.lbl_occupation.config(text="Traitement en cours...")
+            self.barre_occupation.start(10)
+            self.config(cursor="watch")
+        else:
+            self.lbl_occupation.config(text="")
+            self.barre_occupation.stop()
+            self.config(cursor="")
 
     def create_widgets(self):
+        frame_statut = ttk.Frame(self)
+        frame_statut.pack(side=tk.BOTTOM, fill=tk.X)
+        self.barre_occupation = ttk.Progressbar(frame_statut, mode="indeterminate", length=120)
+        self.barre_occupation.pack(side=tk.RIGHT, padx=5, pady=2)
+        self.lbl_occupation = ttk.Label(frame_statut, text="")
+        self.lbl_occupation.pack(side=tk.RIGHT)
+
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(expand=True, fill=tk.BOTH)
 
@@ -245,16 +3209,19 @@ class StockApp(tk.Tk):
         self.frame_ajout_vente = ttk.Frame(self.notebook)
         self.frame_ajout_achat = ttk.Frame(self.notebook)
         self.frame_inventaire = ttk.Frame(self.notebook)
+        self.frame_diagnostic = ttk.Frame(self.notebook)
 
         self.notebook.add(self.frame_articles, text="Articles")
         self.notebook.add(self.frame_ajout_vente, text="Ajouter Vente")
         self.notebook.add(self.frame_ajout_achat, text="Ajouter Achat")
         self.notebook.add(self.frame_inventaire, text="Inventaire")
+        self.notebook.add(self.frame_diagnostic, text="Diagnostic")
 
         self.create_articles_widgets()
         self.create_ajout_vente_widgets()
         self.create_ajout_achat_widgets()
         self.create_inventaire_widgets()
+        self.create_diagnostic_widgets()
 
     def create_articles_widgets(self):
         # self.frame_articles.grid(row=0, column=0, padx=50, pady=50)
@@ -295,19 +3262,21 @@ class StockApp(tk.Tk):
         btn_enregistrer_achat1.grid(row=3, column=6)
 
 
+        btn_importer = ttk.Button(self.frame_articles, text="Importer", command=self.importer_articles)
+        btn_importer.grid(row=0, column=5)
+
+        btn_exporter = ttk.Button(self.frame_articles, text="Exporter Excel", command=self.exporter_classeur)
+        btn_exporter.grid(row=1, column=5)
+
         btn_rechercher = ttk.Button(self.frame_articles, text="rechercher", command=self.fct_rechercher)
         btn_rechercher.grid(row=0, column=3)
         self.ent_rechercher = ttk.Entry(self.frame_articles)
         self.ent_rechercher.grid(row=1, column=3, sticky=tk.W)
 
-        self.tree_articles = ttk.Treeview(self.frame_articles, columns=("ID", "Nom", "Prix de Vente", "Prix d'Achat", "Stock", "Date d'Ajout"), show="headings")
-        self.tree_articles.grid(row=5, column=0, columnspan=8, sticky="nsew")
-        self.tree_articles.heading("ID", text="ID")
-        self.tree_articles.heading("Nom", text="Nom")
-        self.tree_articles.heading("Prix de Vente", text="Prix de Vente")
-        self.tree_articles.heading("Prix d'Achat", text="Prix d'Achat")
-        self.tree_articles.heading("Stock", text="Stock")
-        self.tree_articles.heading("Date d'Ajout", text="Date d'Ajout")
+        self.source_articles = SourceArticles(self.gestion_stock)
+        self.table_articles = TableVirtuelle(self.frame_articles, ("ID", "Nom", "Prix de Vente", "Prix d'Achat", "Stock", "Date d'Ajout"), self.source_articles)
+        self.table_articles.grid(row=5, column=0, columnspan=8, sticky="nsew")
+        self.tree_articles = self.table_articles.tree
 
         self.frame_articles.grid_columnconfigure(7, weight=1)
         self.frame_articles.grid_rowconfigure(5, weight=1)
@@ -364,14 +3333,9 @@ class StockApp(tk.Tk):
         # self.ent_rechercher = ttk.Entry(self.frame_ajout_vente)
         # self.ent_rechercher.grid(row=1, column=3, sticky=tk.W)
 
-        self.tree_ventes = ttk.Treeview(self.frame_ajout_vente, columns=("ID", "Nom", "Quantité", "Prix de Vente", "Prix d'Achat", "Date"), show="headings")
-        self.tree_ventes.grid(row=5, column=0, columnspan=5, sticky="nsew")
-        self.tree_ventes.heading("ID", text="ID")
-        self.tree_ventes.heading("Nom", text="Nom")
-        self.tree_ventes.heading("Quantité", text="Quantité")
-        self.tree_ventes.heading("Prix de Vente", text="Prix de Vente")
-        self.tree_ventes.heading("Prix d'Achat", text="Prix d'Achat")
-        self.tree_ventes.heading("Date", text="Date")
+        self.table_ventes = TableVirtuelle(self.frame_ajout_vente, ("ID", "Nom", "Quantité", "Prix de Vente", "Prix d'Achat", "Date"), SourceTransactions(self.gestion_stock, "ventes"))
+        self.table_ventes.grid(row=5, column=0, columnspan=5, sticky="nsew")
+        self.tree_ventes = self.table_ventes.tree
 
         self.frame_ajout_vente.grid_columnconfigure(4, weight=1)
         self.frame_ajout_vente.grid_rowconfigure(5, weight=1)
@@ -405,14 +3369,9 @@ class StockApp(tk.Tk):
         btn_modifier_achat = ttk.Button(self.frame_ajout_achat, text="Modifier", command=self.modify_achat)
         btn_modifier_achat.grid(row=4, column=1)
 
-        self.tree_achats = ttk.Treeview(self.frame_ajout_achat, columns=("ID", "Nom", "Quantité", "Prix de Vente", "Prix d'Achat", "Date"), show="headings")
-        self.tree_achats.grid(row=5, column=0, columnspan=5, sticky="nsew")
-        self.tree_achats.heading("ID", text="ID")
-        self.tree_achats.heading("Nom", text="Nom")
-        self.tree_achats.heading("Quantité", text="Quantité")
-        self.tree_achats.heading("Prix de Vente", text="Prix de Vente")
-        self.tree_achats.heading("Prix d'Achat", text="Prix d'Achat")
-        self.tree_achats.heading("Date", text="Date")
+        self.table_achats = TableVirtuelle(self.frame_ajout_achat, ("ID", "Nom", "Quantité", "Prix de Vente", "Prix d'Achat", "Date"), SourceTransactions(self.gestion_stock, "achats"))
+        self.table_achats.grid(row=5, column=0, columnspan=5, sticky="nsew")
+        self.tree_achats = self.table_achats.tree
         self.frame_ajout_achat.grid_columnconfigure(4, weight=1)
         self.frame_ajout_achat.grid_rowconfigure(5, weight=1)
 
@@ -446,34 +3405,67 @@ class StockApp(tk.Tk):
         self.lbl_totaux = ttk.Label(self.frame_inventaire, text="")
         self.lbl_totaux.grid(row=4, column=0, columnspan=2)
 
-    def update_articles_listbox(self,articles=None):
-        if articles:
-            self.tree_articles.delete(*self.tree_articles.get_children())
-            for article in articles:
-                self.tree_articles.insert("", tk.END, values=(
-                article.id_article, article.nom, article.prix_vente, article.prix_achat, article.stock, article.date))
-
+        frame_export = ttk.Frame(self.frame_inventaire)
+        frame_export.grid(row=5, column=0, columnspan=2, sticky=tk.W)
+        self.cmb_export = ttk.Combobox(frame_export, values=("rapport", "ventes", "achats"), state="readonly", width=10)
+        self.cmb_export.current(0)
+        self.cmb_export.grid(row=0, column=0)
+        btn_exporter = ttk.Button(frame_export, text="Exporter...", command=self.exporter_periode)
+        btn_exporter.grid(row=0, column=1)
+        self.barre_export = ttk.Progressbar(frame_export, length=200)
+        self.barre_export.grid(row=0, column=2, padx=5)
+        self.lbl_export = ttk.Label(frame_export, text="")
+        self.lbl_export.grid(row=0, column=3)
+        self._avancement_export = None
+
+    def create_diagnostic_widgets(self):
+        if self.instrumentation is None:
+            ttk.Label(self.frame_diagnostic, text="Mesures désactivées : relancer avec STOCK_INSTRUMENTATION=1."
+                      ).grid(row=0, column=0, padx=10, pady=10)
             return
-        self.tree_articles.delete(*self.tree_articles.get_children())
-        for article in self.gestion_stock.lister_articles():
-            self.tree_articles.insert("", tk.END, values=(
-                article.id_article, article.nom, article.prix_vente, article.prix_achat, article.stock, article.date))
+        btn_rafraichir = ttk.Button(self.frame_diagnostic, text="Rafraîchir", command=self.afficher_diagnostic)
+        btn_rafraichir.grid(row=0, column=0)
+        btn_reinitialiser = ttk.Button(self.frame_diagnostic, text="Réinitialiser", command=self.reinitialiser_diagnostic)
+        btn_reinitialiser.grid(row=0, column=1)
+        btn_exporter = ttk.Button(self.frame_diagnostic, text="Exporter JSON", command=self.exporter_diagnostic)
+        btn_exporter.grid(row=0, column=2)
+
+        columns = ["operation", "appels", "cumul_ms", "moyenne_ms", "p50_ms", "p95_ms", "p99_ms", "lignes", "erreurs"]
+        self.tree_diagnostic = ttk.Treeview(self.frame_diagnostic, columns=columns, show="headings")
+        self.tree_diagnostic.grid(row=1, column=0, columnspan=4, sticky="nsew")
+        for col in columns:
+            self.tree_diagnostic.heading(col, text=col)
+            self.tree_diagnostic.column(col, width=250 if col == "operation" else 80, anchor=tk.W if col == "operation" else tk.E)
+        self.frame_diagnostic.grid_columnconfigure(3, weight=1)
+        self.frame_diagnostic.grid_rowconfigure(1, weight=1)
+
+    def afficher_diagnostic(self):
+        self.tree_diagnostic.delete(*self.tree_diagnostic.get_children())
+        for nom, mesure in self.instrumentation.statistiques().items():
+            self.tree_diagnostic.insert("", tk.END, values=(
+                nom, mesure["appels"], f"{mesure['cumul_s'] * 1e3:.1f}", f"{mesure['moyenne_s'] * 1e3:.3f}",
+                f"{mesure['p50_s'] * 1e3:.3f}", f"{mesure['p95_s'] * 1e3:.3f}", f"{mesure['p99_s'] * 1e3:.3f}",
+                mesure["lignes"], mesure["erreurs"]))
+
+    def reinitialiser_diagnostic(self):
+        self.instrumentation.reinitialiser()
+        self.afficher_diagnostic()
+
+    def exporter_diagnostic(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if filename:
+            self.instrumentation.exporter_json(filename)
+            messagebox.showinfo("Succès", f"Mesures enregistrées dans le fichier '{filename}'.")
+
+    def update_articles_listbox(self,articles=None):
+        self.source_articles.definir(articles or None)
+        self.table_articles.rafraichir()
 
     def update_ventes_listbox(self):
-        self.tree_ventes.delete(*self.tree_ventes.get_children())
-        for vente in self.gestion_stock.lister_ventes():
-            article = self.gestion_stock.rechercher_article(vente["id_article"])
-            if article:
-                self.tree_ventes.insert("", tk.END, values=(
-                    article.id_article, article.nom, vente['quantite'], article.prix_vente, article.prix_achat, vente['date']))
+        self.table_ventes.rafraichir()
 
     def update_achats_listbox(self):
-        self.tree_achats.delete(*self.tree_achats.get_children())
-        for achat in self.gestion_stock.lister_achats():
-            article = self.gestion_stock.rechercher_article(achat["id_article"])
-            if article:
-                self.tree_achats.insert("", tk.END, values=(
-                    article.id_article, article.nom, achat['quantite'], article.prix_vente, article.prix_achat, achat['date']))
+        self.table_achats.rafraichir()
 
     def add_article(self):
         try:
@@ -481,20 +3473,49 @@ class StockApp(tk.Tk):
             prix_vente = float(self.ent_prix_vente.get())
             prix_achat = float(self.ent_prix_achat.get())
             if nom and prix_vente >= 0 and prix_achat >= 0:
-                result = self.gestion_stock.ajouter_article(nom, prix_vente, prix_achat)
-                if result:
-                    self.update_articles_listbox()
-                    self.ent_nom_article.delete(0, tk.END)
-                    self.ent_prix_vente.delete(0, tk.END)
-                    self.ent_prix_achat.delete(0, tk.END)
-                    messagebox.showinfo("Succès", "Article ajouté avec succès.")
-                else:
-                    messagebox.showerror("Erreur", "L'article existe déjà.")
+                def termine(result):
+                    if result:
+                        self.update_articles_listbox()
+                        self.ent_nom_article.delete(0, tk.END)
+                        self.ent_prix_vente.delete(0, tk.END)
+                        self.ent_prix_achat.delete(0, tk.END)
+                        messagebox.showinfo("Succès", "Article ajouté avec succès.")
+                    else:
+                        messagebox.showerror("Erreur", "L'article existe déjà.")
+                self.travailleur.soumettre(self.gestion_stock.ajouter_article, nom, prix_vente, prix_achat,
+                                           succes=termine, erreur=self._erreur_prix)
             else:
                 messagebox.showerror("Erreur", "Veuillez remplir tous les champs correctement.")
         except ValueError:
             messagebox.showerror("Erreur", "Veuillez entrer des prix valides.")
 
+    def importer_articles(self):
+        filename = filedialog.askopenfilename(filetypes=[("CSV ou Excel", "*.csv *.xlsx"), ("Tous les fichiers", "*.*")])
+        if not filename:
+            return
+
+        def termine(bilan):
+            self.update_articles_listbox()
+            messagebox.showinfo("Import", f"{bilan['inseres']} article(s) ajouté(s), {bilan['ignores']} déjà "
+                                          f"présent(s), {bilan['rejetes']} ligne(s) rejetée(s).")
+
+        def echec(exception):
+            messagebox.showerror("Erreur", f"Import impossible : {exception}")
+        self.travailleur.soumettre(self.gestion_stock.importer_fichier_articles, filename, succes=termine, erreur=echec)
+
+    def exporter_classeur(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel", "*.xlsx")])
+        if not filename:
+            return
+        self.travailleur.soumettre(self.gestion_stock.exporter_classeur, filename,
+                                   succes=lambda filename: messagebox.showinfo(
+                                       "Succès", f"Données exportées dans le fichier '{filename}'."),
+                                   erreur=lambda exception: messagebox.showerror(
+                                       "Erreur", f"Export impossible : {exception}"))
+
+    def _erreur_prix(self, exception):
+        messagebox.showerror("Erreur", "Veuillez entrer des prix valides.")
+
     def modify_article(self):
         selected_item = self.tree_articles.selection()
         if not selected_item:
@@ -506,12 +3527,14 @@ class StockApp(tk.Tk):
             prix_vente = float(self.ent_prix_vente.get())
             prix_achat = float(self.ent_prix_achat.get())
             if nom and prix_vente >= 0 and prix_achat >= 0:
-                self.gestion_stock.modifier_article(article_id, nom, prix_vente, prix_achat)
-                self.update_articles_listbox()
-                self.ent_nom_article.delete(0, tk.END)
-                self.ent_prix_vente.delete(0, tk.END)
-                self.ent_prix_achat.delete(0, tk.END)
-                messagebox.showinfo("Succès", "Article modifié avec succès.")
+                def termine(result):
+                    self.update_articles_listbox()
+                    self.ent_nom_article.delete(0, tk.END)
+                    self.ent_prix_vente.delete(0, tk.END)
+                    self.ent_prix_achat.delete(0, tk.END)
+                    messagebox.showinfo("Succès", "Article modifié avec succès.")
+                self.travailleur.soumettre(self.gestion_stock.modifier_article, article_id, nom, prix_vente, prix_achat,
+                                           succes=termine, erreur=self._erreur_prix)
             else:
                 messagebox.showerror("Erreur", "Veuillez remplir tous les champs correctement.")
         except ValueError:
@@ -523,18 +3546,22 @@ class StockApp(tk.Tk):
             messagebox.showerror("Erreur", "Veuillez sélectionner une vente.")
             return
         try:
-            article_id = self.tree_ventes.item(selected_item)["values"][0]
-            date=self.tree_ventes.item(selected_item)["values"][-1]
-            quantite=float(self.ent_quantite_va.get())
-            if date and article_id:
-                self.gestion_stock.modifier_vente(article_id, quantite, date)
-                print('ok')
-                
+            # L'identifiant de la ligne du Treeview est le rang de la transaction
+            rang = int(selected_item[0])
+            quantite = float(self.ent_quantite_va.get())
+
+            def termine(result):
                 self.update_ventes_listbox()
+                if not result:
+                    # Rang inconnu : la ligne affichée n'existe plus dans l'historique
+                    messagebox.showerror("Erreur", "Cette vente est introuvable.")
+                    return
                 self.ent_quantite_va.delete(0, tk.END)
                 messagebox.showinfo("Succès", "Ventes modifié avec succès.")
-            else:
-                messagebox.showerror("Erreur", "Veuillez remplir tous les champs correctement.")
+            self.travailleur.soumettre(self.gestion_stock.modifier_transaction, "ventes", rang, quantite,
+                                       succes=termine,
+                                       erreur=lambda exception: messagebox.showerror(
+                                           "Erreur", f"Modification impossible : {exception}"))
         except ValueError:
             messagebox.showerror("Erreur", "Veuillez entrer des quantitées.")
 
@@ -544,16 +3571,22 @@ class StockApp(tk.Tk):
             messagebox.showerror("Erreur", "Veuillez sélectionner un achat.")
             return
         try:
-            article_id = self.tree_achats.item(selected_item)["values"][0]
-            date = self.tree_achats.item(selected_item)["values"][-1]
+            # L'identifiant de la ligne du Treeview est le rang de la transaction
+            rang = int(selected_item[0])
             quantite = float(self.ent_quantite_aa.get())
-            if date and article_id:
-                self.gestion_stock.modifier_achat(article_id, quantite, date)
+
+            def termine(result):
                 self.update_achats_listbox()
+                if not result:
+                    # Rang inconnu : la ligne affichée n'existe plus dans l'historique
+                    messagebox.showerror("Erreur", "Cet achat est introuvable.")
+                    return
                 self.ent_quantite_aa.delete(0, tk.END)
                 messagebox.showinfo("Succès", "Achat modifié avec succès.")
-            else:
-                messagebox.showerror("Erreur", "Veuillez remplir tous les champs correctement.")
+            self.travailleur.soumettre(self.gestion_stock.modifier_transaction, "achats", rang, quantite,
+                                       succes=termine,
+                                       erreur=lambda exception: messagebox.showerror(
+                                           "Erreur", f"Modification impossible : {exception}"))
         except ValueError:
             messagebox.showerror("Erreur", "Veuillez entrer des quantités.")
 
@@ -563,11 +3596,14 @@ class StockApp(tk.Tk):
             messagebox.showerror("Erreur", "Veuillez sélectionner un article.")
             return
         article_id = self.tree_articles.item(selected_item)["values"][0]
-        if self.gestion_stock.supprimer_article(article_id):
-            self.update_articles_listbox()
-            messagebox.showinfo("Succès", "Article supprimé avec succès.")
-        else:
-            messagebox.showerror("Erreur", "Erreur lors de la suppression de l'article.")
+
+        def termine(result):
+            if result:
+                self.update_articles_listbox()
+                messagebox.showinfo("Succès", "Article supprimé avec succès.")
+            else:
+                messagebox.showerror("Erreur", "Erreur lors de la suppression de l'article.")
+        self.travailleur.soumettre(self.gestion_stock.supprimer_article, article_id, succes=termine)
 
     def enregistrer_vente1(self):
         selected_item = self.tree_articles.selection()
@@ -580,13 +3616,16 @@ class StockApp(tk.Tk):
             quantite = float(self.ent_quantite_aa1.get())
             prix_vente = float(article[2])
             prix_achat = float(article[3])
-            result = self.gestion_stock.enregistrer_vente(nom_article, prix_vente, prix_achat, quantite)
-            if result:
-                self.update_ventes_listbox()
-                self.ent_quantite_aa1.delete(0, tk.END)
-                messagebox.showinfo("Succès", "Vente enregistrée avec succès.")
-            else:
-                messagebox.showerror("Erreur", "Erreur lors de l'enregistrement de la vente.")
+
+            def termine(result):
+                if result:
+                    self.update_ventes_listbox()
+                    self.ent_quantite_aa1.delete(0, tk.END)
+                    messagebox.showinfo("Succès", "Vente enregistrée avec succès.")
+                else:
+                    messagebox.showerror("Erreur", "Erreur lors de l'enregistrement de la vente.")
+            self.travailleur.soumettre(self.gestion_stock.enregistrer_vente, nom_article, prix_vente, prix_achat,
+                                       quantite, succes=termine)
         except (ValueError, IndexError):
             messagebox.showerror("Erreur", "Veuillez entrer des données valides.")
 
@@ -601,13 +3640,16 @@ class StockApp(tk.Tk):
             quantite =float(self.ent_quantite_aa1.get())
             prix_vente = float(article[2])
             prix_achat = float(article[3])
-            result = self.gestion_stock.enregistrer_achat(nom_article, prix_vente, prix_achat, quantite)
-            if result:
-                self.update_achats_listbox()
-                self.ent_quantite_aa1.delete(0, tk.END)
-                messagebox.showinfo("Succès", "Achat enregistré avec succès.")
-            else:
-                messagebox.showerror("Erreur", "Erreur lors de l'enregistrement de l'achat.")
+
+            def termine(result):
+                if result:
+                    self.update_achats_listbox()
+                    self.ent_quantite_aa1.delete(0, tk.END)
+                    messagebox.showinfo("Succès", "Achat enregistré avec succès.")
+                else:
+                    messagebox.showerror("Erreur", "Erreur lors de l'enregistrement de l'achat.")
+            self.travailleur.soumettre(self.gestion_stock.enregistrer_achat, nom_article, prix_vente, prix_achat,
+                                       quantite, succes=termine)
         except (ValueError, IndexError):
             messagebox.showerror("Erreur", "Veuillez entrer des données valides.")
 
@@ -653,52 +3695,106 @@ class StockApp(tk.Tk):
         try:
             date_debut = datetime.strptime(self.ent_date_debut.get(), "%Y-%m-%d")
             date_fin = datetime.strptime(self.ent_date_fin.get(), "%Y-%m-%d")
-            rapport = self.gestion_stock.rapport_inventaire(date_debut, date_fin)
-            self.tree_inventaire.delete(*self.tree_inventaire.get_children())
-
-            total_ventes = 0
-            total_achats = 0
-            total_benefice = 0
-            for id_article, details in rapport.items():
-                prix_vente = details["prix_vente"]
-                prix_achat = details["prix_achat"]
-                valeur_vente = details["valeur_vente"]
-                valeur_achat = details["valeur_achat"]
-                benefice = valeur_vente - valeur_achat
-
-                self.tree_inventaire.insert("", tk.END, values=(id_article, prix_vente, prix_achat, valeur_achat, valeur_vente, benefice))
-                total_ventes += valeur_vente
-                total_achats += valeur_achat
-                total_benefice += benefice
-
-            self.lbl_totaux.config(text=f"Total Ventes: {total_ventes}, Total Achats: {total_achats}, Total Bénéfice: {total_benefice}")
-
         except ValueError:
             messagebox.showerror("Erreur", "Veuillez entrer des dates valides.")
+            return
+        self.travailleur.soumettre(self.gestion_stock.rapport_inventaire, date_debut, date_fin,
+                                   succes=self._afficher_rapport)
+
+    def _afficher_rapport(self, rapport):
+        self.tree_inventaire.delete(*self.tree_inventaire.get_children())
+
+        total_ventes = 0
+        total_achats = 0
+        total_benefice = 0
+        for id_article, details in rapport.items():
+            prix_vente = details["prix_vente"]
+            prix_achat = details["prix_achat"]
+            valeur_vente = details["valeur_vente"]
+            valeur_achat = details["valeur_achat"]
+            benefice = valeur_vente - valeur_achat
+
+            self.tree_inventaire.insert("", tk.END, values=(id_article, prix_vente, prix_achat, valeur_achat, valeur_vente, benefice))
+            total_ventes += valeur_vente
+            total_achats += valeur_achat
+            total_benefice += benefice
+
+        self.lbl_totaux.config(text=f"Total Ventes: {total_ventes}, Total Achats: {total_achats}, Total Bénéfice: {total_benefice}")
 
     def generer_rapport(self):
         try:
             date_debut = datetime.strptime(self.ent_date_debut.get(), "%Y-%m-%d")
             date_fin = datetime.strptime(self.ent_date_fin.get(), "%Y-%m-%d")
-            rapport = self.gestion_stock.rapport_inventaire(date_debut, date_fin)
-
-            filename = f"inventaire_{date_debut.strftime('%Y-%m-%d')}_{date_fin.strftime('%Y-%m-%d')}.csv"
-
-            with open(filename, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["id_article", "prix_vente", "prix_achat", "valeur_achat", "valeur_vente", "benefice"])
-                for id_article, details in rapport.items():
-                    prix_vente = details["prix_vente"]
-                    prix_achat = details["prix_achat"]
-                    valeur_vente = details["valeur_vente"]
-                    valeur_achat = details["valeur_achat"]
-                    benefice = valeur_vente - valeur_achat
-                    writer.writerow([id_article, prix_vente, prix_achat, valeur_achat, valeur_vente, benefice])
+        except ValueError:
+            messagebox.showerror("Erreur", "Veuillez entrer des dates valides.")
+            return
+        self.travailleur.soumettre(self._ecrire_rapport, date_debut, date_fin,
+                                   succes=lambda filename: messagebox.showinfo(
+                                       "Succès", f"Rapport enregistré dans le fichier '{filename}'."))
 
-            messagebox.showinfo("Succès", f"Rapport enregistré dans le fichier '{filename}'.")
+    def _ecrire_rapport(self, date_debut, date_fin):
+        # Exécuté par le travailleur : aucun accès aux widgets ici
+        filename = f"inventaire_{date_debut.strftime('%Y-%m-%d')}_{date_fin.strftime('%Y-%m-%d')}.csv"
+        return self.gestion_stock.exporter_rapport(filename, date_debut, date_fin)
 
+    def exporter_periode(self):
+        try:
+            date_debut = datetime.strptime(self.ent_date_debut.get(), "%Y-%m-%d")
+            date_fin = datetime.strptime(self.ent_date_fin.get(), "%Y-%m-%d")
         except ValueError:
             messagebox.showerror("Erreur", "Veuillez entrer des dates valides.")
+            return
+        contenu = self.cmb_export.get()
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            initialfile=f"{contenu}_{date_debut.strftime('%Y-%m-%d')}_{date_fin.strftime('%Y-%m-%d')}.csv",
+            filetypes=[("CSV", "*.csv"), ("CSV compressé", "*.csv.gz"), ("Excel", "*.xlsx"),
+                       ("Colonnes compressées", "*.colz")])
+        if not filename:
+            return
+        if contenu == "rapport":
+            fonction, args = self.gestion_stock.exporter_rapport, (filename, date_debut, date_fin, self._noter_avancement)
+        else:
+            fonction, args = self.gestion_stock.exporter_transactions, (contenu, filename, date_debut, date_fin,
+                                                                         self._noter_avancement)
+        self._avancement_export = (0, None)
+        self.barre_export.config(mode="indeterminate", value=0)
+        self.barre_export.start(10)
+        self.lbl_export.config(text="Export en cours...")
+        self.after(Travailleur.INTERVALLE_MS, self._suivre_export)
+
+        def termine(filename):
+            self._avancement_export = None
+            self.barre_export.stop()
+            self.barre_export.config(mode="determinate", value=100)
+            self.lbl_export.config(text=f"Exporté dans '{filename}'")
+
+        def echec(exception):
+            self._avancement_export = None
+            self.barre_export.stop()
+            self.barre_export.config(mode="determinate", value=0)
+            self.lbl_export.config(text="")
+            messagebox.showerror("Erreur", f"Export impossible : {exception}")
+        self.travailleur.soumettre(fonction, *args, succes=termine, erreur=echec)
+
+    def _noter_avancement(self, ecrites, total):
+        # Appelé par le travailleur après chaque bloc : simple affectation, lue par _suivre_export
+        self._avancement_export = (ecrites, total)
+
+    def _suivre_export(self):
+        avancement = self._avancement_export
+        if avancement is None:
+            return
+        ecrites, total = avancement
+        if total:
+            if str(self.barre_export.cget("mode")) != "determinate":
+                self.barre_export.stop()
+                self.barre_export.config(mode="determinate")
+            self.barre_export.config(value=100 * ecrites / total)
+            self.lbl_export.config(text=f"{ecrites} / {total} lignes")
+        elif ecrites:
+            self.lbl_export.config(text=f"{ecrites} lignes")
+        self.after(Travailleur.INTERVALLE_MS, self._suivre_export)
 
 
 
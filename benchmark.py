@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from Article import FORMAT_DATE, GestionStock, StockageCSV, date_depuis_horodatage, np
+
+# Jeux de données synthétiques au format articles.csv / ventes.csv / achats.csv, et mesures de GestionStock
+#   python benchmark.py generer --dossier donnees_bench --articles 10000 --ventes 1000000 --achats 200000
+#   python benchmark.py mesurer --dossier donnees_bench --sortie resultats.json --reference reference.json
+
+MOTS = ("CAHIER", "BIC", "CRAYON", "GOMME", "REGLE", "SAC", "TROUSSE", "COLLE", "PAPIER", "CLASSEUR", "CHEMISE",
+        "MARQUEUR", "ENVELOPPE", "CHARGEUR", "CABLE", "ECOUTEUR", "PEINTURE", "SCOTCH", "AGRAFEUSE", "COMPAS")
+QUALIFICATIFS = ("PF", "GF", "PM", "GM", "100P", "200P", "300P", "COULEUR", "BLANC", "NOIR", "BLEU", "ROUGE", "TOUT")
+DEBUT = datetime(2021, 1, 1)
+OUVERTURE = timedelta(hours=8)
+DUREE_JOURNEE = 12 * 3600
+TAILLE_BLOC = 10000
+
+
+def generer_articles(filename, nb_articles, graine):
+    alea = random.Random(graine)
+    with open(filename, "w", newline='') as fichier:
+        fichier.write("id_article,nom,prix_vente,prix_achat,stock,date\n")
+        for id_article in range(1, nb_articles + 1):
+            nom = f"{alea.choice(MOTS)} {alea.choice(QUALIFICATIFS)} {id_article}"
+            prix_achat = alea.randint(1, 400) * 25
+            prix_vente = prix_achat + alea.randint(1, 200) * 25
+            fichier.write(f"{id_article},{nom},{prix_vente},{prix_achat},{alea.randint(0, 500)},"
+                          f"{DEBUT.strftime(FORMAT_DATE)}\n")
+
+
+def generer_transactions(filename, nb_transactions, nb_articles, nb_jours, quantite_max, graine):
+    # Dates croissantes pendant les heures d'ouverture, articles tirés selon une popularité de Zipf
+    alea = random.Random(graine)
+    poids = [1 / rang for rang in range(1, nb_articles + 1)]
+    cumuls = []
+    total = 0
+    for p in poids:
+        total += p
+        cumuls.append(total)
+    ids = list(range(1, nb_articles + 1))
+    alea.shuffle(ids)
+    intervalle_moyen = nb_jours * DUREE_JOURNEE / max(nb_transactions, 1)
+    secondes = 0.0
+    with open(filename, "w", newline='', buffering=1 << 20) as fichier:
+        fichier.write("id_article,quantite,date\n")
+        restant = nb_transactions
+        while restant:
+            bloc = min(restant, TAILLE_BLOC)
+            lignes = []
+            for id_article in alea.choices(ids, cum_weights=cumuls, k=bloc):
+                secondes += alea.expovariate(1 / intervalle_moyen)
+                jour, seconde = divmod(int(secondes), DUREE_JOURNEE)
+                date = DEBUT + timedelta(days=jour, seconds=seconde) + OUVERTURE
+                lignes.append(f"{id_article},{float(alea.randint(1, quantite_max))},{date.strftime(FORMAT_DATE)}\n")
+            fichier.writelines(lignes)
+            restant -= bloc
+
+
+def generer(dossier, nb_articles, nb_ventes, nb_achats, nb_jours, graine):
+    os.makedirs(dossier, exist_ok=True)
+    for nom in ("ventes.journal", "achats.journal", StockageCSV.FILENAME_CHECKPOINT):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(dossier, nom))
+    generer_articles(os.path.join(dossier, StockageCSV.FILENAME_ARTICLES), nb_articles, graine)
+    generer_transactions(os.path.join(dossier, StockageCSV.FILENAME_VENTES), nb_ventes, nb_articles, nb_jours, 5,
+                         graine + 1)
+    generer_transactions(os.path.join(dossier, StockageCSV.FILENAME_ACHATS), nb_achats, nb_articles, nb_jours, 200,
+                         graine + 2)
+
+
+def chronometrer(resultats, nom, fonction, arguments, preparation=None):
+    # arguments : un tuple d'arguments par appel ; preparation est appelée avant chaque appel, hors mesure
+    durees = []
+    for args in arguments:
+        if preparation is not None:
+            preparation()
+        debut = time.perf_counter()
+        fonction(*args)
+        durees.append(time.perf_counter() - debut)
+    resultats[nom] = {"repetitions": len(durees), "total_s": sum(durees), "moyenne_s": statistics.fmean(durees),
+                      "mediane_s": statistics.median(durees), "min_s": min(durees)}
+    print(f"  {nom:<40} {resultats[nom]['mediane_s'] * 1e3:12.3f} ms (médiane sur {len(durees)})")
+
+
+def mesurer(dossier, repetitions, repetitions_rapport, graine):
+    alea = random.Random(graine)
+    resultats = {}
+    # Les écritures se font sur une copie pour que le jeu de données reste identique d'une mesure à l'autre
+    copie = tempfile.mkdtemp(prefix="bench_stock_")
+    try:
+        for nom in (StockageCSV.FILENAME_ARTICLES, StockageCSV.FILENAME_VENTES, StockageCSV.FILENAME_ACHATS):
+            shutil.copy(os.path.join(dossier, nom), copie)
+        gestion_stock = GestionStock(stockage=StockageCSV(copie, journal=True), paresseux=True)
+        chronometrer(resultats, "charger_ventes", gestion_stock.charger_ventes, [()])
+        chronometrer(resultats, "charger_achats", gestion_stock.charger_achats, [()])
+        chronometrer(resultats, "charger_articles", gestion_stock.charger_articles, [()])
+
+        articles = gestion_stock.lister_articles()
+        ventes = gestion_stock.lister_ventes()
+        # Périodes fixées avant les écritures, qui datent leurs lignes de maintenant
+        dates = gestion_stock.ventes.dates
+        premiere, derniere = date_depuis_horodatage(min(dates)), date_depuis_horodatage(max(dates))
+        periodes = {"complet": (datetime.min, datetime.max), "mois": (premiere, premiere + timedelta(days=30)),
+                    "dernier_mois": (derniere - timedelta(days=30), derniere)}
+        chronometrer(resultats, "rechercher_article", gestion_stock.rechercher_article,
+                     [(alea.randint(1, len(articles) + 10),) for _ in range(repetitions * 10)])
+        chronometrer(resultats, "rechercher_article_par_nom", gestion_stock.rechercher_article_par_nom,
+                     [(alea.choice(articles).nom[:alea.randint(1, 6)], 50) for _ in range(repetitions)])
+
+        echantillon = [alea.choice(articles) for _ in range(repetitions)]
+        chronometrer(resultats, "enregistrer_vente", gestion_stock.enregistrer_vente,
+                     [(article.nom, article.prix_vente, article.prix_achat, 1.0) for article in echantillon])
+        modifications = []
+        for rang in (alea.randrange(len(ventes)) for _ in range(repetitions)):
+            vente = ventes[rang]
+            modifications.append((vente["id_article"], vente["quantite"] + 1,
+                                  vente["date"].strftime("%Y-%m-%d %H:%M:%S.%f")))
+        chronometrer(resultats, "modifier_vente", gestion_stock.modifier_vente, modifications)
+        chronometrer(resultats, "modifier_transaction", gestion_stock.modifier_transaction,
+                     [("ventes", alea.randrange(len(ventes)), 2.0) for _ in range(repetitions)])
+
+        # Le cache des rapports est vidé avant chaque appel : les moteurs sont mesurés à froid,
+        # sans quoi toutes les répétitions après la première ne mesureraient qu'une lecture du cache
+        moteurs = ["python"] + (["numpy"] if np is not None else [])
+        for moteur in moteurs:
+            for nom_periode, (date_debut, date_fin) in periodes.items():
+                chronometrer(resultats, f"rapport_inventaire[{moteur},{nom_periode}]", gestion_stock.rapport_inventaire,
+                             [(date_debut, date_fin, moteur)] * repetitions_rapport,
+                             gestion_stock._cache_rapports.vider)
+        # Cache seul : la même période redemandée, journées et rapport déjà agrégés
+        date_debut, date_fin = periodes["dernier_mois"]
+        gestion_stock.rapport_inventaire(date_debut, date_fin, "python")
+        chronometrer(resultats, "rapport_inventaire[python,dernier_mois,cache]", gestion_stock.rapport_inventaire,
+                     [(date_debut, date_fin, "python")] * repetitions_rapport)
+        gestion_stock.fermer()
+    finally:
+        shutil.rmtree(copie, ignore_errors=True)
+    return resultats
+
+
+def comparer(resultats, reference, tolerance):
+    # Renvoie les mesures dont la médiane dépasse celle de la référence de plus de tolerance
+    regressions = []
+    print(f"\n  {'mesure':<40} {'référence':>12} {'actuel':>12} {'écart':>8}")
+    for nom, mesure in resultats.items():
+        if nom not in reference:
+            continue
+        avant = reference[nom]["mediane_s"]
+        apres = mesure["mediane_s"]
+        ecart = (apres - avant) / avant if avant else 0.0
+        marque = " <-- régression" if ecart > tolerance else ""
+        print(f"  {nom:<40} {avant * 1e3:10.3f}ms {apres * 1e3:10.3f}ms {ecart:+8.1%}{marque}")
+        if ecart > tolerance:
+            regressions.append(nom)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de performance de GestionStock")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+    generation = commandes.add_parser("generer", help="génère un jeu de données synthétique")
+    generation.add_argument("--dossier", default="donnees_bench")
+    generation.add_argument("--articles", type=int, default=10000)
+    generation.add_argument("--ventes", type=int, default=1000000)
+    generation.add_argument("--achats", type=int, default=200000)
+    generation.add_argument("--jours", type=int, default=3 * 365)
+    generation.add_argument("--graine", type=int, default=0)
+    mesure = commandes.add_parser("mesurer", help="chronomètre GestionStock sur un jeu de données")
+    mesure.add_argument("--dossier", default="donnees_bench")
+    mesure.add_argument("--repetitions", type=int, default=200)
+    # Un rapport dure de l'ordre de la seconde : assez de répétitions pour une médiane stable, sans plus
+    mesure.add_argument("--repetitions-rapport", type=int, default=15)
+    mesure.add_argument("--graine", type=int, default=0)
+    mesure.add_argument("--sortie", default="resultats_bench.json")
+    mesure.add_argument("--reference", help="résultats JSON d'une mesure précédente")
+    mesure.add_argument("--tolerance", type=float, default=0.2, help="écart de médiane toléré (0.2 = +20 %%)")
+    args = parser.parse_args()
+
+    if args.commande == "generer":
+        debut = time.perf_counter()
+        generer(args.dossier, args.articles, args.ventes, args.achats, args.jours, args.graine)
+        print(f"Jeu de données généré dans {args.dossier} en {time.perf_counter() - debut:.1f} s")
+        return 0
+
+    resultats = mesurer(args.dossier, args.repetitions, args.repetitions_rapport, args.graine)
+    with open(os.path.join(args.dossier, StockageCSV.FILENAME_VENTES), "rb") as fichier:
+        nb_ventes = sum(1 for _ in fichier) - 1
+    with open(args.sortie, "w") as fichier:
+        json.dump({"date": datetime.now().strftime(FORMAT_DATE),
+                   "environnement": {"python": sys.version.split()[0], "plateforme": platform.platform(),
+                                     "numpy": np is not None},
+                   "parametres": {"dossier": args.dossier, "ventes": nb_ventes, "repetitions": args.repetitions,
+                                    "repetitions_rapport": args.repetitions_rapport},
+                   "resultats": resultats}, fichier, indent=2)
+    print(f"Résultats enregistrés dans {args.sortie}")
+    if args.reference:
+        with open(args.reference) as fichier:
+            regressions = comparer(resultats, json.load(fichier)["resultats"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+# Test de charge de serveur.py : plusieurs caisses simulées, chacune sur une connexion persistante.
+#   python serveur.py --port 8080 &
+#   python charge.py --port 8080 --clients 20 --duree 10 --ecritures 0.3
+
+
+class Client:
+
+    def __init__(self, hote, port):
+        self.hote = hote
+        self.port = port
+        self.lecteur = None
+        self.redacteur = None
+
+    async def ouvrir(self):
+        self.lecteur, self.redacteur = await asyncio.open_connection(self.hote, self.port)
+
+    async def requete(self, methode, chemin, corps=None):
+        brut = json.dumps(corps).encode("utf-8") if corps is not None else b""
+        self.redacteur.write(f"{methode} {chemin} HTTP/1.1\r\nHost: {self.hote}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(brut)}\r\n\r\n"
+                             .encode("latin-1") + brut)
+        await self.redacteur.drain()
+        statut = int((await self.lecteur.readline()).split()[1])
+        taille = 0
+        while True:
+            ligne = await self.lecteur.readline()
+            if ligne in (b"\r\n", b""):
+                break
+            nom, _, valeur = ligne.decode("latin-1").partition(":")
+            if nom.strip().lower() == "content-length":
+                taille = int(valeur)
+        return statut, json.loads(await self.lecteur.readexactly(taille)) if taille else None
+
+    def fermer(self):
+        if self.redacteur is not None:
+            self.redacteur.close()
+
+
+async def caisse(hote, port, fin, proportion_ecritures, articles, mesures, graine):
+    alea = random.Random(graine)
+    client = Client(hote, port)
+    await client.ouvrir()
+    try:
+        while time.perf_counter() < fin:
+            tirage = alea.random()
+            article = alea.choice(articles)
+            if tirage < proportion_ecritures:
+                nom = "vente"
+                requete = ("POST", "/ventes", {"nom": article["nom"], "prix_vente": article["prix_vente"],
+                                               "prix_achat": article["prix_achat"], "quantite": 1})
+            elif tirage < proportion_ecritures + (1 - proportion_ecritures) * 0.5:
+                nom = "article"
+                requete = ("GET", f"/articles/{article['id_article']}", None)
+            elif tirage < 0.99:
+                nom = "recherche"
+                requete = ("GET", f"/recherche?nom={article['nom'][:2].replace(' ', '%20')}&limite=20", None)
+            else:
+                nom = "rapport"
+                requete = ("GET", "/rapport?debut=2024-01-01&fin=2024-12-31", None)
+            debut = time.perf_counter()
+            statut, _ = await client.requete(*requete)
+            mesures.setdefault(nom, []).append((time.perf_counter() - debut, statut))
+    finally:
+        client.fermer()
+
+
+def centile(durees, valeur):
+    return durees[min(len(durees) - 1, int(len(durees) * valeur / 100))]
+
+
+async def lancer(args):
+    client = Client(args.hote, args.port)
+    await client.ouvrir()
+    statut, reponse = await client.requete("GET", "/articles?limite=1000")
+    client.fermer()
+    if statut != 200 or not reponse["articles"]:
+        print("Le serveur ne renvoie aucun article : rien à vendre.")
+        return 1
+    articles = reponse["articles"]
+    mesures = {}
+    debut = time.perf_counter()
+    fin = debut + args.duree
+    await asyncio.gather(*(caisse(args.hote, args.port, fin, args.ecritures, articles, mesures, graine)
+                           for graine in range(args.clients)))
+    duree = time.perf_counter() - debut
+
+    total = sum(len(resultats) for resultats in mesures.values())
+    print(f"{args.clients} caisses, {duree:.1f} s, {total} requêtes, {total / duree:.0f} requêtes/s")
+    print(f"  {'opération':<10} {'nombre':>8} {'erreurs':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'moy ms':>9}")
+    erreurs_total = 0
+    for nom, resultats in sorted(mesures.items()):
+        durees = sorted(duree for duree, _ in resultats)
+        erreurs = sum(1 for _, statut in resultats if statut >= 400)
+        erreurs_total += erreurs
+        print(f"  {nom:<10} {len(durees):8d} {erreurs:8d} {centile(durees, 50) * 1e3:9.2f} "
+              f"{centile(durees, 95) * 1e3:9.2f} {centile(durees, 99) * 1e3:9.2f} {statistics.fmean(durees) * 1e3:9.2f}")
+    return 1 if erreurs_total else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de serveur.py")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duree", type=float, default=10.0)
+    parser.add_argument("--ecritures", type=float, default=0.3, help="part des requêtes qui enregistrent une vente")
+    return asyncio.run(lancer(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import csv
 import io
-import pandas as pd
+
+from Article import ecrire_classeur
 # Texte des données
 data_text = """Document ID	nom	prix_achat	prix_vente
 02INTvGrgk9cirAlT8l0	"PORTE DOC 100 VUES"	"750"	"2500"
@@ -105,13 +106,18 @@ RfPNvq6gcZ3cHLHPCgJN	"LIVRE SUPER EFF 1 ere A "	"16800"	"21000"
 S1xatwvZO4dNRNmuOQeC	"BIC CLAYRO"	"100"	"200"
 """
 
-# Sauvegarder le texte dans un fichier CSV
-# Convertir le texte en un DataFrame pandas
-data_io = io.StringIO(data_text)
-df = pd.read_csv(data_io, delimiter='\t')
+# Lecture ligne à ligne du texte puis écriture en flux dans le classeur Excel
+def valeur(texte):
+    try:
+        return int(texte)
+    except ValueError:
+        return texte
+
+
+lignes = csv.reader(io.StringIO(data_text), delimiter='\t')
+entetes = next(lignes)
 
-# Sauvegarder le DataFrame dans un fichier Excel
 filename = "donnees.xlsx"
-df.to_excel(filename, index=False)
+ecrire_classeur(filename, [("Sheet1", entetes, ([valeur(champ) for champ in ligne] for ligne in lignes))])
 
 print(f"Données sauvegardées dans {filename}.")
@@ -0,0 +1,58 @@
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from Article import Article, TableTransactions
+
+# Octets par transaction : liste de dict (ancienne représentation) contre TableTransactions
+
+NB_TRANSACTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+
+def generer(nb):
+    debut = datetime(2020, 1, 1)
+    for _ in range(nb):
+        yield {"id_article": random.randint(1, 10000), "quantite": float(random.randint(1, 50)),
+               "date": debut + timedelta(seconds=random.randint(0, 5 * 365 * 86400))}
+
+
+def mesurer(construire):
+    random.seed(0)
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    resultat = construire(generer(NB_TRANSACTIONS))
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del resultat
+    return (apres - avant) / NB_TRANSACTIONS
+
+
+class ArticleSansSlots:
+
+    def __init__(self, id_article, nom, prix_vente, prix_achat, stock=0, date=None):
+        self.id_article = id_article
+        self.nom = nom
+        self.prix_vente = prix_vente
+        self.prix_achat = prix_achat
+        self.stock = stock
+        self.date = date
+
+
+def mesurer_articles(classe, nb=10000):
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    articles = [classe(i, "ARTICLE", 100.0, 50.0, 0, "2024-06-17 13:51:00") for i in range(nb)]
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del articles
+    return (apres - avant) / nb
+
+
+if __name__ == "__main__":
+    print(f"Transactions : {NB_TRANSACTIONS}")
+    print(f"  liste de dict     : {mesurer(list):.1f} octets/transaction")
+    print(f"  TableTransactions : {mesurer(TableTransactions):.1f} octets/transaction")
+    print("Articles (hors nom et date partagés) :")
+    print(f"  sans __slots__    : {mesurer_articles(ArticleSansSlots):.1f} octets/article")
+    print(f"  avec __slots__    : {mesurer_articles(Article):.1f} octets/article")
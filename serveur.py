@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from Article import GestionStock, StockageColonnes, StockageCSV, StockageSegments, StockageSQLite
+
+# Service HTTP/JSON sans interface autour d'un GestionStock partagé par plusieurs caisses :
+#   python serveur.py --dossier . --port 8080 --stockage csv --politique groupee
+# Les écritures passent par une file et un seul fil d'écriture ; les lectures sont servies depuis la mémoire.
+# Celles qui parcourent l'index des noms ou les tables sont faites par les lecteurs, ensemble, sous le
+# verrou des données en lecture ; le fil d'écriture le prend seul pendant chaque modification. Les rapports,
+# longs, s'en passent : le cache des rapports et le moteur numpy ont leurs propres verrous. Le moteur sql,
+# qui écrit d'abord les lignes en attente, passe par le fil d'écriture.
+#
+#   GET    /sante
+#   GET    /articles?debut=0&limite=100          GET /articles/<id>
+#   POST   /articles {nom, prix_vente, prix_achat}
+#   PUT    /articles/<id> {nom?, prix_vente?, prix_achat?}
+#   DELETE /articles/<id>
+#   GET    /recherche?nom=<préfixe>&limite=20
+#   GET    /ventes?debut=&fin=&id_article=&limite=100     (idem /achats)
+#   POST   /ventes {nom, prix_vente, prix_achat, quantite} (idem /achats)
+#   PUT    /ventes/<id_transaction> {quantite}             (idem /achats)
+#   PUT    /ventes {id_article, quantite, date}            obsolète : renvoie l'id_transaction à utiliser
+#   GET    /rapport?debut=YYYY-MM-DD&fin=YYYY-MM-DD&moteur=
+
+TAILLE_MAX_CORPS = 1 << 20
+
+
+class ErreurRequete(Exception):
+
+    def __init__(self, statut, message):
+        super().__init__(message)
+        self.statut = statut
+
+
+def article_en_json(article):
+    return {"id_article": article.id_article, "nom": article.nom, "prix_vente": article.prix_vente,
+            "prix_achat": article.prix_achat, "stock": article.stock, "date": article.date}
+
+
+def transaction_en_json(rang, transaction):
+    return {"id_transaction": rang, "id_article": transaction["id_article"], "quantite": transaction["quantite"],
+            "date": transaction["date"].isoformat(" ")}
+
+
+def lire_date(parametres, nom, defaut=None):
+    valeur = parametres.get(nom)
+    if not valeur:
+        return defaut
+    try:
+        return datetime.fromisoformat(valeur)
+    except ValueError:
+        raise ErreurRequete(HTTPStatus.BAD_REQUEST, f"Date invalide pour '{nom}' : {valeur}")
+
+
+def lire_entier(parametres, nom, defaut):
+    try:
+        return int(parametres.get(nom, defaut))
+    except ValueError:
+        raise ErreurRequete(HTTPStatus.BAD_REQUEST, f"Entier attendu pour '{nom}'")
+
+
+def champ(corps, nom, conversion=None, obligatoire=True):
+    if nom not in corps or corps[nom] in (None, ""):
+        if obligatoire:
+            raise ErreurRequete(HTTPStatus.BAD_REQUEST, f"Champ manquant : {nom}")
+        return None
+    try:
+        return conversion(corps[nom]) if conversion else corps[nom]
+    except (TypeError, ValueError):
+        raise ErreurRequete(HTTPStatus.BAD_REQUEST, f"Valeur invalide pour '{nom}'")
+
+
+class VerrouLectureEcriture:
+    # Plusieurs lecteurs ensemble ou un seul écrivain ; un écrivain en attente passe avant les nouveaux lecteurs
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._lecteurs = 0
+        self._ecrivain = False
+        self._ecrivains_en_attente = 0
+
+    @contextlib.contextmanager
+    def lecture(self):
+        with self._condition:
+            while self._ecrivain or self._ecrivains_en_attente:
+                self._condition.wait()
+            self._lecteurs += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._lecteurs -= 1
+                if not self._lecteurs:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def ecriture(self):
+        with self._condition:
+            self._ecrivains_en_attente += 1
+            while self._ecrivain or self._lecteurs:
+                self._condition.wait()
+            self._ecrivains_en_attente -= 1
+            self._ecrivain = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._ecrivain = False
+                self._condition.notify_all()
+
+
+class ServeurStock:
+
+    def __init__(self, gestion_stock):
+        self.gestion_stock = gestion_stock
+        self._file = asyncio.Queue()
+        # Un seul fil applique les modifications, dans l'ordre d'arrivée
+        self._ecrivain = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ecrivain")
+        # Les rapports, longs, sont calculés hors de la boucle
+        self._lecteurs = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lecteur")
+        self._tache_ecriture = None
+        self._verrou_donnees = VerrouLectureEcriture()
+
+    async def demarrer(self):
+        self._tache_ecriture = asyncio.create_task(self._ecrire())
+
+    async def arreter(self):
+        await self._file.join()
+        self._tache_ecriture.cancel()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._ecrivain, self.gestion_stock.fermer)
+        self._ecrivain.shutdown()
+        self._lecteurs.shutdown()
+
+    async def _ecrire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fonction, args, future = await self._file.get()
+            try:
+                resultat = await loop.run_in_executor(self._ecrivain, self._en_ecriture, fonction, *args)
+            except Exception as exception:
+                if not future.cancelled():
+                    future.set_exception(exception)
+            else:
+                if not future.cancelled():
+                    future.set_result(resultat)
+            finally:
+                self._file.task_done()
+
+    async def modifier(self, fonction, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._file.put((fonction, args, future))
+        return await future
+
+    def _en_ecriture(self, fonction, *args):
+        with self._verrou_donnees.ecriture():
+            return fonction(*args)
+
+    def _en_lecture(self, fonction, *args):
+        with self._verrou_donnees.lecture():
+            return fonction(*args)
+
+    async def lire(self, fonction, *args):
+        # Lecture cohérente, jamais au milieu d'une modification, sans bloquer la boucle en attendant le verrou
+        return await asyncio.get_running_loop().run_in_executor(self._lecteurs, self._en_lecture, fonction, *args)
+
+    async def traiter(self, methode, chemin, parametres, corps):
+        segments = [segment for segment in chemin.split("/") if segment]
+        gestion_stock = self.gestion_stock
+        if segments == ["sante"] and methode == "GET":
+            return HTTPStatus.OK, {"statut": "ok", "en_attente": self._file.qsize()}
+
+        if segments[:1] == ["articles"]:
+            if len(segments) == 1:
+                if methode == "GET":
+                    debut = lire_entier(parametres, "debut", 0)
+                    limite = lire_entier(parametres, "limite", 100)
+
+                    def page():
+                        articles = gestion_stock.lister_articles()
+                        return {"total": len(articles),
+                                "articles": [article_en_json(article) for article in articles[debut:debut + limite]]}
+                    return HTTPStatus.OK, await self.lire(page)
+                if methode == "POST":
+                    ajoute = await self.modifier(gestion_stock.ajouter_article, champ(corps, "nom", str),
+                                                 champ(corps, "prix_vente", float), champ(corps, "prix_achat", float))
+                    if not ajoute:
+                        raise ErreurRequete(HTTPStatus.CONFLICT, "L'article existe déjà.")
+                    return HTTPStatus.CREATED, {"ajoute": True}
+            elif len(segments) == 2:
+                try:
+                    id_article = int(segments[1])
+                except ValueError:
+                    raise ErreurRequete(HTTPStatus.NOT_FOUND, "Article inconnu")
+                if methode == "GET":
+                    article = await self.lire(gestion_stock.rechercher_article, id_article)
+                    if article is None:
+                        raise ErreurRequete(HTTPStatus.NOT_FOUND, "Article inconnu")
+                    return HTTPStatus.OK, article_en_json(article)
+                if methode == "PUT":
+                    modifie = await self.modifier(gestion_stock.modifier_article, id_article,
+                                                  champ(corps, "nom", str, False),
+                                                  champ(corps, "prix_vente", float, False),
+                                                  champ(corps, "prix_achat", float, False))
+                    if not modifie:
+                        raise ErreurRequete(HTTPStatus.NOT_FOUND, "Article inconnu")
+                    return HTTPStatus.OK, {"modifie": True}
+                if methode == "DELETE":
+                    if not await self.modifier(gestion_stock.supprimer_article, id_article):
+                        raise ErreurRequete(HTTPStatus.NOT_FOUND, "Article inconnu")
+                    return HTTPStatus.OK, {"supprime": True}
+
+        if segments == ["recherche"] and methode == "GET":
+            articles = await self.lire(gestion_stock.rechercher_article_par_nom, parametres.get("nom", ""),
+                                       lire_entier(parametres, "limite", 20))
+            return HTTPStatus.OK, {"articles": [article_en_json(article) for article in articles]}
+
+        if len(segments) == 1 and segments[0] in ("ventes", "achats"):
+            nature = segments[0]
+            if methode == "GET":
+                date_debut, date_fin = lire_date(parametres, "debut"), lire_date(parametres, "fin")
+                id_article = lire_entier(parametres, "id_article", 0) or None
+                limite = lire_entier(parametres, "limite", 100)
+
+                def extrait():
+                    transactions = gestion_stock.iterer_transactions(nature, date_debut, date_fin, id_article,
+                                                                     avec_rang=True)
+                    return [transaction_en_json(rang, transaction)
+                            for rang, transaction in islice(transactions, limite)]
+                return HTTPStatus.OK, {nature: await self.lire(extrait)}
+            if methode == "POST":
+                enregistrer = gestion_stock.enregistrer_vente if nature == "ventes" else gestion_stock.enregistrer_achat
+                enregistre = await self.modifier(enregistrer, champ(corps, "nom", str),
+                                                 champ(corps, "prix_vente", float), champ(corps, "prix_achat", float),
+                                                 champ(corps, "quantite", float))
+                if not enregistre:
+                    raise ErreurRequete(HTTPStatus.NOT_FOUND, "Article inconnu")
+                return HTTPStatus.CREATED, {"enregistre": True}
+            if methode == "PUT":
+                # Obsolète : plusieurs lignes de l'article peuvent partager la seconde donnée, la première est
+                # retenue. La correction passe par son rang, renvoyé pour les appels suivants à PUT /<nature>/<id>.
+                id_article = champ(corps, "id_article", int)
+                date = champ(corps, "date", datetime.fromisoformat)
+                quantite = champ(corps, "quantite", float)
+
+                def corriger():
+                    rang = gestion_stock.rechercher_rang(nature, id_article, date)
+                    if rang is None or not gestion_stock.modifier_transaction(nature, rang, quantite):
+                        return None
+                    return rang
+                rang = await self.modifier(corriger)
+                if rang is None:
+                    raise ErreurRequete(HTTPStatus.NOT_FOUND, "Transaction introuvable")
+                return HTTPStatus.OK, {"modifie": True, "id_transaction": rang,
+                                       "obsolete": f"utiliser PUT /{nature}/{rang}"}
+
+        if len(segments) == 2 and segments[0] in ("ventes", "achats") and methode == "PUT":
+            try:
+                rang = int(segments[1])
+            except ValueError:
+                raise ErreurRequete(HTTPStatus.NOT_FOUND, "Transaction introuvable")
+            if not await self.modifier(gestion_stock.modifier_transaction, segments[0], rang,
+                                       champ(corps, "quantite", float)):
+                raise ErreurRequete(HTTPStatus.NOT_FOUND, "Transaction introuvable")
+            return HTTPStatus.OK, {"modifie": True}
+
+        if segments == ["rapport"] and methode == "GET":
+            date_debut = lire_date(parametres, "debut", datetime.min)
+            date_fin = lire_date(parametres, "fin", datetime.max)
+            moteur = parametres.get("moteur") or gestion_stock.moteur_rapport
+            if moteur == "sql":
+                # Écrit les lignes en attente puis interroge le stockage : c'est le travail du fil d'écriture
+                rapport = await self.modifier(gestion_stock.rapport_inventaire, date_debut, date_fin, moteur)
+            else:
+                rapport = await asyncio.get_running_loop().run_in_executor(
+                    self._lecteurs, gestion_stock.rapport_inventaire, date_debut, date_fin, moteur)
+            return HTTPStatus.OK, {"rapport": rapport}
+
+        raise ErreurRequete(HTTPStatus.NOT_FOUND, f"Pas de route pour {methode} {chemin}")
+
+    async def connexion(self, lecteur, redacteur):
+        # HTTP/1.1 minimal avec connexions persistantes
+        try:
+            while True:
+                ligne = await lecteur.readline()
+                if not ligne:
+                    break
+                try:
+                    methode, cible, version = ligne.decode("latin-1").split()
+                except ValueError:
+                    await self._repondre(redacteur, HTTPStatus.BAD_REQUEST, {"erreur": "Requête invalide"}, False)
+                    break
+                entetes = {}
+                while True:
+                    ligne = await lecteur.readline()
+                    if ligne in (b"\r\n", b"\n", b""):
+                        break
+                    nom, _, valeur = ligne.decode("latin-1").partition(":")
+                    entetes[nom.strip().lower()] = valeur.strip()
+                garder = entetes.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                taille = int(entetes.get("content-length", 0) or 0)
+                if taille > TAILLE_MAX_CORPS:
+                    await self._repondre(redacteur, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"erreur": "Corps trop grand"},
+                                         False)
+                    break
+                brut = await lecteur.readexactly(taille) if taille else b""
+                url = urlsplit(cible)
+                parametres = {nom: valeurs[-1] for nom, valeurs in parse_qs(url.query).items()}
+                try:
+                    corps = json.loads(brut) if brut else {}
+                    if not isinstance(corps, dict):
+                        raise ErreurRequete(HTTPStatus.BAD_REQUEST, "Objet JSON attendu")
+                    statut, reponse = await self.traiter(methode.upper(), url.path, parametres, corps)
+                except ErreurRequete as erreur:
+                    statut, reponse = erreur.statut, {"erreur": str(erreur)}
+                except json.JSONDecodeError:
+                    statut, reponse = HTTPStatus.BAD_REQUEST, {"erreur": "JSON invalide"}
+                except ValueError as erreur:
+                    statut, reponse = HTTPStatus.UNPROCESSABLE_ENTITY, {"erreur": str(erreur)}
+                except Exception as erreur:
+                    statut, reponse = HTTPStatus.INTERNAL_SERVER_ERROR, {"erreur": str(erreur)}
+                await self._repondre(redacteur, statut, reponse, garder)
+                if not garder:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            redacteur.close()
+
+    @staticmethod
+    async def _repondre(redacteur, statut, reponse, garder):
+        corps = json.dumps(reponse, ensure_ascii=False, default=str).encode("utf-8")
+        redacteur.write(f"HTTP/1.1 {statut.value} {statut.phrase}\r\n"
+                        f"Content-Type: application/json; charset=utf-8\r\n"
+                        f"Content-Length: {len(corps)}\r\n"
+                        f"Connection: {'keep-alive' if garder else 'close'}\r\n\r\n".encode("latin-1") + corps)
+        await redacteur.drain()
+
+
+def creer_stockage(type_stockage, dossier):
+    if type_stockage == "sqlite":
+        return StockageSQLite(f"{dossier}/{StockageSQLite.FILENAME}")
+    if type_stockage == "colonnes":
+        return StockageColonnes(dossier)
+    if type_stockage == "segments":
+        return StockageSegments(dossier)
+    return StockageCSV(dossier, journal=True)
+
+
+async def servir(args):
+    gestion_stock = GestionStock(stockage=creer_stockage(args.stockage, args.dossier),
+                                 politique_ecriture=args.politique, processus_rapport=args.processus_rapport)
+    serveur_stock = ServeurStock(gestion_stock)
+    await serveur_stock.demarrer()
+    serveur = await asyncio.start_server(serveur_stock.connexion, args.hote, args.port)
+    arret = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_arret in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_arret, arret.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows : Ctrl+C lève KeyboardInterrupt dans asyncio.run
+            pass
+    print(f"GestionStock servi sur http://{args.hote}:{args.port} ({len(gestion_stock.lister_articles())} articles)")
+    try:
+        async with serveur:
+            await arret.wait()
+    finally:
+        serveur.close()
+        await serveur_stock.arreter()
+        print("Arrêt : écritures terminées, fichiers fermés.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP/JSON de GestionStock")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--dossier", default=".")
+    parser.add_argument("--stockage", choices=("csv", "sqlite", "colonnes", "segments"), default="csv")
+    parser.add_argument("--politique", choices=GestionStock.POLITIQUES_ECRITURE, default="groupee")
+    parser.add_argument("--processus-rapport", type=int, default=0,
+                        help="processus de calcul pour les rapports sur de longues périodes (0 : aucun)")
+    asyncio.run(servir(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
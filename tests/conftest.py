@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Article import FORMAT_DATE  # noqa: E402
+
+DEBUT = datetime(2024, 1, 1, 8)
+
+
+def ecrire_donnees(dossier, nb_articles=40, nb_ventes=3000, nb_achats=800, nb_jours=60, graine=0):
+    # Quantités à une décimale et prix non entiers : les sommes de réels y dépendent de l'ordre
+    alea = random.Random(graine)
+    with open(os.path.join(dossier, "articles.csv"), "w", newline='') as fichier:
+        fichier.write("id_article,nom,prix_vente,prix_achat,stock,date\n")
+        for id_article in range(1, nb_articles + 1):
+            prix_achat = round(alea.uniform(0.5, 80), 2)
+            fichier.write(f"{id_article},ARTICLE {id_article},{round(prix_achat * 1.3, 2)},{prix_achat},"
+                          f"{alea.randint(0, 500)},{DEBUT.strftime(FORMAT_DATE)}\n")
+    for nom, nombre in (("ventes.csv", nb_ventes), ("achats.csv", nb_achats)):
+        secondes = sorted(alea.randrange(nb_jours * 86400) for _ in range(nombre))
+        with open(os.path.join(dossier, nom), "w", newline='') as fichier:
+            fichier.write("id_article,quantite,date\n")
+            for seconde in secondes:
+                fichier.write(f"{alea.randint(1, nb_articles)},{round(alea.uniform(0.1, 9.9), 1)},"
+                              f"{(DEBUT + timedelta(seconds=seconde)).strftime(FORMAT_DATE)}\n")
+    return dossier
+
+
+@pytest.fixture
+def donnees(tmp_path):
+    return str(ecrire_donnees(tmp_path))
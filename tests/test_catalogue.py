@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from Article import GestionStock, StockageCSV, ecrire_classeur, openpyxl
+
+
+def test_index_id_et_cle_composite(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    assert gestion_stock.rechercher_article(7).nom == "ARTICLE 7"
+    assert gestion_stock.rechercher_article(999) is None
+    assert gestion_stock.ajouter_article("STYLO", 1.2, 0.8)
+    stylo = gestion_stock.rechercher_article(41)
+    assert stylo.nom == "STYLO"
+    # Même (nom, prix_vente, prix_achat) : refusé ; un autre prix fait un autre article
+    assert not gestion_stock.ajouter_article("STYLO", 1.2, 0.8)
+    assert gestion_stock.ajouter_article("STYLO", 1.5, 0.8)
+    assert gestion_stock.enregistrer_vente("STYLO", 1.2, 0.8, 3)
+    assert gestion_stock.ventes[-1]["id_article"] == 41
+    assert not gestion_stock.enregistrer_vente("STYLO", 9.9, 0.8, 3)
+
+    # Une modification déplace l'article dans l'index composite
+    assert gestion_stock.modifier_article(41, prix_vente=1.3)
+    assert not gestion_stock.enregistrer_vente("STYLO", 1.2, 0.8, 1)
+    assert gestion_stock.enregistrer_vente("STYLO", 1.3, 0.8, 1)
+    assert gestion_stock.ajouter_article("STYLO", 1.2, 0.8)
+    assert gestion_stock.supprimer_article(41)
+    assert gestion_stock.rechercher_article(41) is None
+    assert not gestion_stock.enregistrer_vente("STYLO", 1.3, 0.8, 1)
+    assert not gestion_stock.supprimer_article(41)
+
+    # Les index reconstruits au chargement donnent les mêmes réponses
+    relu = GestionStock(stockage=StockageCSV(donnees))
+    assert relu.rechercher_article(41) is None and relu.rechercher_article(43).prix_vente == 1.2
+    assert not relu.ajouter_article("STYLO", 1.5, 0.8)
+    assert relu.ajouter_article("STYLO", 1.3, 0.8)
+    assert relu.rechercher_article(44).nom == "STYLO"
+
+
+def test_recherche_par_prefixe(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    for nom in ("Éclair café", "eclair chocolat", "Écran", "CAFÉ"):
+        assert gestion_stock.ajouter_article(nom, 2.0, 1.0)
+    noms = lambda articles: sorted(article.nom for article in articles)
+    # Sans casse ni accents, préfixe seulement
+    assert noms(gestion_stock.rechercher_article_par_nom("ECLAIR")) == ["eclair chocolat", "Éclair café"]
+    assert noms(gestion_stock.rechercher_article_par_nom("éc")) == ["eclair chocolat", "Éclair café", "Écran"]
+    assert noms(gestion_stock.rechercher_article_par_nom("café")) == ["CAFÉ"]
+    assert len(gestion_stock.rechercher_article_par_nom("article 1")) == 11
+    assert len(gestion_stock.rechercher_article_par_nom("article", limite=5)) == 5
+    assert gestion_stock.rechercher_article_par_nom("zzz") == []
+
+    # L'index suit les modifications et suppressions
+    ecran = gestion_stock.rechercher_article_par_nom("écran")[0]
+    assert gestion_stock.modifier_article(ecran.id_article, nom="Agrafeuse")
+    assert gestion_stock.rechercher_article_par_nom("écran") == []
+    assert gestion_stock.rechercher_article_par_nom("agraf") == [ecran]
+    assert gestion_stock.supprimer_article(ecran.id_article)
+    assert gestion_stock.rechercher_article_par_nom("agraf") == []
+    relu = GestionStock(stockage=StockageCSV(donnees))
+    assert noms(relu.rechercher_article_par_nom("ec")) == ["eclair chocolat", "Éclair café"]
+
+
+def test_import_en_masse(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    lignes = [{"nom": "GOMME", "prix_vente": "0.9", "prix_achat": "0.4"},
+              {"nom": " GOMME ", "prix_vente": 0.9, "prix_achat": 0.4},
+              {"nom": "ARTICLE 1", "prix_vente": gestion_stock.rechercher_article(1).prix_vente,
+               "prix_achat": gestion_stock.rechercher_article(1).prix_achat},
+              {"nom": "", "prix_vente": "1", "prix_achat": "1"},
+              {"nom": "REGLE", "prix_vente": "abc", "prix_achat": "1"},
+              {"nom": "REGLE", "prix_vente": "nan", "prix_achat": "1"},
+              {"nom": "REGLE"},
+              {"nom": "REGLE", "prix_vente": "1.1", "prix_achat": "0.5"}]
+    assert gestion_stock.importer_articles(lignes) == {"inseres": 2, "ignores": 2, "rejetes": 4}
+    assert [article.nom for article in gestion_stock.rechercher_article_par_nom("gom")] == ["GOMME"]
+    assert gestion_stock.enregistrer_vente("REGLE", 1.1, 0.5, 2)
+    relu = GestionStock(stockage=StockageCSV(donnees))
+    assert [(article.id_article, article.nom) for article in relu.lister_articles()[-2:]] == [(41, "GOMME"), (42, "REGLE")]
+
+    # Fichier fournisseur : séparateur détecté, BOM ignoré
+    filename = os.path.join(donnees, "fournisseur.csv")
+    with open(filename, "w", encoding="utf-8-sig", newline='') as fichier:
+        fichier.write("nom;prix_vente;prix_achat\r\nGOMME;0.9;0.4\r\nCRAYON;0.5;0.2\r\nFEUTRE;;1\r\n")
+    assert relu.importer_fichier_articles(filename) == {"inseres": 1, "ignores": 1, "rejetes": 1}
+    assert relu.rechercher_article(43).nom == "CRAYON"
+
+
+@pytest.mark.skipif(openpyxl is None, reason="openpyxl absent")
+def test_import_classeur(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    filename = os.path.join(donnees, "fournisseur.xlsx")
+    ecrire_classeur(filename, [("prix", ["nom", "prix_vente", "prix_achat"],
+                                [(f"CLASSEUR {i}", 1.5 + i, 1.0 + i) for i in range(300)] + [("CLASSEUR 0", 1.5, 1.0)])])
+    assert gestion_stock.importer_fichier_articles(filename) == {"inseres": 300, "ignores": 1, "rejetes": 0}
+    assert len(GestionStock(stockage=StockageCSV(donnees)).lister_articles()) == 340
@@ -0,0 +1,96 @@
+import csv
+import gzip
+from datetime import datetime
+
+import pytest
+
+import Article
+from Article import GestionStock, StockageCSV, lire_classeur, lire_colonnes_compressees, openpyxl
+
+FORMATS = ["csv", "csv.gz", "colz", pytest.param("xlsx", marks=pytest.mark.skipif(openpyxl is None,
+                                                                                   reason="openpyxl absent"))]
+
+
+def relire(filename):
+    # Lignes d'un export, quel que soit son format, en dictionnaires de valeurs typées
+    if filename.endswith(".colz"):
+        return list(lire_colonnes_compressees(filename))
+    if filename.endswith(".xlsx"):
+        classeur = openpyxl.load_workbook(filename, read_only=True)
+        titres = classeur.sheetnames
+        classeur.close()
+        return [ligne for titre in titres for ligne in lire_classeur(filename, titre)]
+    with (gzip.open if filename.endswith(".gz") else open)(filename, "rt", newline='', encoding="utf-8") as fichier:
+        lignes = list(csv.DictReader(fichier))
+    for ligne in lignes:
+        for cle, valeur in ligne.items():
+            if cle == "date":
+                ligne[cle] = datetime.fromisoformat(valeur)
+            elif cle not in ("nom", "id_article") or valeur.isdigit():
+                ligne[cle] = int(valeur) if valeur.isdigit() else float(valeur)
+    return lignes
+
+
+@pytest.mark.skipif(openpyxl is None, reason="openpyxl absent")
+def test_classeur_decoupe_en_feuilles(donnees, monkeypatch):
+    monkeypatch.setattr(Article, "LIGNES_MAX_FEUILLE", 1000)
+    monkeypatch.setattr(Article, "TAILLE_BLOC_EXPORT", 300)
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    filename = gestion_stock.exporter_classeur(f"{donnees}/stock.xlsx")
+    classeur = openpyxl.load_workbook(filename, read_only=True)
+    assert classeur.sheetnames == ["articles", "ventes", "ventes 2", "ventes 3", "achats"]
+    assert [sum(1 for _ in classeur[titre].iter_rows()) for titre in classeur.sheetnames] == \
+        [41, 1001, 1001, 1001, 801]
+    classeur.close()
+    ventes = [ligne for titre in ("ventes", "ventes 2", "ventes 3") for ligne in lire_classeur(filename, titre)]
+    assert [(vente["id_article"], vente["quantite"]) for vente in ventes] == \
+        [(vente["id_article"], vente["quantite"]) for vente in gestion_stock.ventes]
+
+
+@pytest.mark.parametrize("extension", FORMATS)
+def test_export_transactions_par_blocs(donnees, monkeypatch, extension):
+    monkeypatch.setattr(Article, "LIGNES_MAX_FEUILLE", 1000)
+    monkeypatch.setattr(Article, "TAILLE_BLOC_EXPORT", 300)
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    debut, fin = datetime(2024, 1, 10, 13, 30), datetime(2024, 2, 20)
+    attendu = list(gestion_stock.iterer_transactions("ventes", debut, fin))
+    avancement = []
+    filename = gestion_stock.exporter_transactions("ventes", f"{donnees}/ventes.{extension}", debut, fin,
+                                                   lambda ecrites, total: avancement.append((ecrites, total)))
+    assert [ecrites for ecrites, _ in avancement] == list(range(300, len(attendu), 300)) + [len(attendu)]
+    assert {total for _, total in avancement} == {len(attendu)}
+    lignes = relire(filename)
+    assert [(ligne["id_article"], ligne["quantite"], ligne["date"]) for ligne in lignes] == \
+        [(vente["id_article"], vente["quantite"], vente["date"]) for vente in attendu]
+    article = gestion_stock.rechercher_article(lignes[0]["id_article"])
+    assert (lignes[0]["nom"], lignes[0]["prix_unitaire"]) == (article.nom, article.prix_vente)
+    assert lignes[0]["valeur"] == pytest.approx(lignes[0]["quantite"] * article.prix_vente)
+    if extension == "xlsx":
+        classeur = openpyxl.load_workbook(filename, read_only=True)
+        assert classeur.sheetnames == ["export"] + [f"export {numero}" for numero in range(2, len(attendu) // 1000 + 2)]
+        assert sum(1 for _ in classeur["export"].iter_rows()) == 1001
+        classeur.close()
+
+
+@pytest.mark.parametrize("extension", FORMATS)
+def test_export_rapport(donnees, extension):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    rapport = gestion_stock.rapport_inventaire(datetime.min, datetime.max)
+    avancement = []
+    filename = gestion_stock.exporter_rapport(f"{donnees}/rapport.{extension}", datetime.min, datetime.max,
+                                              lambda ecrites, total: avancement.append((ecrites, total)))
+    assert avancement == [(len(rapport), len(rapport))]
+    lignes = relire(filename)
+    assert [ligne["id_article"] for ligne in lignes] == list(rapport)
+    for ligne in lignes:
+        details = rapport[ligne["id_article"]]
+        # Excel ne garde que 15 chiffres significatifs
+        assert (ligne["valeur_vente"], ligne["valeur_achat"]) == \
+            pytest.approx((details["valeur_vente"], details["valeur_achat"]), rel=1e-14)
+        assert ligne["benefice"] == pytest.approx(details["valeur_vente"] - details["valeur_achat"])
+
+
+def test_export_format_inconnu(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    with pytest.raises(ValueError):
+        gestion_stock.exporter_transactions("ventes", f"{donnees}/ventes.txt")
@@ -0,0 +1,168 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from Article import (GestionStock, MoteurRapportNumpy, StockageColonnes, StockageCSV, StockageSQLite,
+                     migrer_csv_vers_colonnes, migrer_csv_vers_sqlite, np)
+
+PERIODES = [(datetime.min, datetime.max), (datetime(2024, 1, 10, 13, 30), datetime(2024, 2, 3, 9, 15))]
+
+
+def rapports(gestion_stock, moteur=None):
+    return [gestion_stock.rapport_inventaire(debut, fin, moteur) for debut, fin in PERIODES]
+
+
+@pytest.fixture
+def reference(donnees):
+    # Historique non chargé : boucle Python directe, sans cache
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), paresseux=True, moteur_rapport="python")
+    return rapports(gestion_stock)
+
+
+@pytest.mark.skipif(np is None, reason="NumPy absent")
+def test_moteur_numpy_identique_au_moteur_python(donnees, reference):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), moteur_rapport="numpy")
+    assert rapports(gestion_stock) == reference
+
+
+def test_moteur_sql_identique_au_moteur_python(donnees, reference):
+    migrer_csv_vers_sqlite(donnees)
+    stockage = StockageSQLite(f"{donnees}/stock.db")
+    gestion_stock = GestionStock(stockage=stockage, paresseux=True)
+    assert gestion_stock.moteur_rapport == "sql"
+    assert rapports(gestion_stock) == reference
+    stockage.fermer()
+
+
+@pytest.mark.skipif(np is None, reason="NumPy absent")
+def test_moteur_numpy_rapports_concurrents(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), moteur_rapport="numpy")
+    articles = gestion_stock.lister_articles()
+    erreurs = []
+
+    def lire():
+        try:
+            for _ in range(30):
+                gestion_stock.rapport_inventaire(datetime.min, datetime.max)
+        except Exception as exception:
+            erreurs.append(exception)
+    lecteurs = [threading.Thread(target=lire) for _ in range(4)]
+    for lecteur in lecteurs:
+        lecteur.start()
+    for i in range(300):
+        article = articles[i % len(articles)]
+        gestion_stock.enregistrer_vente(article.nom, article.prix_vente, article.prix_achat, 0.1)
+        if i % 50 == 0:
+            gestion_stock.ajouter_article(f"NOUVEAU {i}", 2.5, 1.25)
+    for lecteur in lecteurs:
+        lecteur.join()
+    assert not erreurs
+    # L'état publié pendant les écritures est reconstruit à jour : même rapport qu'un moteur neuf
+    assert gestion_stock.rapport_inventaire(datetime.min, datetime.max) == \
+        MoteurRapportNumpy(gestion_stock).rapport_inventaire(datetime.min, datetime.max)
+
+
+def test_cache_identique_sans_cache(donnees, reference):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), moteur_rapport="python")
+    # Journées fusionnées depuis le cache, puis rapports relus du cache
+    assert rapports(gestion_stock) == reference
+    assert rapports(gestion_stock) == reference
+
+
+def test_cache_independant_de_son_historique(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True), moteur_rapport="python")
+    rapports(gestion_stock)
+    alea = random.Random(1)
+    for _ in range(200):
+        date = datetime(2024, 1, 1, 8) + timedelta(seconds=alea.randrange(60 * 86400))
+        transaction = {"id_article": alea.randint(1, 40), "quantite": round(alea.uniform(0.1, 9.9), 1), "date": date}
+        if alea.random() < 0.7:
+            gestion_stock._ajouter_transaction("ventes", transaction)
+        else:
+            gestion_stock._corriger_transaction("achats", alea.randrange(len(gestion_stock.achats)), transaction)
+    # Entrées mises à jour par ajouts et corrections, puis le même calcul cache vide, puis sans cache
+    mis_a_jour = rapports(gestion_stock)
+    gestion_stock._cache_rapports.vider()
+    assert rapports(gestion_stock) == mis_a_jour
+    gestion_stock.fermer()
+    assert rapports(GestionStock(stockage=StockageCSV(donnees, journal=True), paresseux=True)) == mis_a_jour
+
+
+def test_cache_memoire_sans_double_compte(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), moteur_rapport="python")
+    cache = gestion_stock._cache_rapports
+    debut, fin = PERIODES[1]
+    cache.rapport_inventaire(debut, fin)
+    cle = next(cle for cle in cache._entrees if cle[0] == "rapport")
+    # Un second lecteur qui avait calculé la même période en même temps l'insère à son tour
+    with cache._verrou:
+        cache._inserer(cle, dict(cache._entrees[cle]))
+    assert cache._memoire == sum(cache._taille(cle) for cle in cache._entrees)
+
+
+@pytest.mark.parametrize("disposition", ["ordonnee", "desordonnee", "colonnes"])
+def test_rapport_parallele_identique_au_calcul_en_serie(donnees, disposition):
+    if disposition == "desordonnee":
+        # Index hors de l'ordre des rangs : les tranches reçoivent la liste des rangs
+        with open(f"{donnees}/ventes.csv") as fichier:
+            lignes = fichier.readlines()
+        lignes[1:] = lignes[:0:-1]
+        with open(f"{donnees}/ventes.csv", "w") as fichier:
+            fichier.writelines(lignes)
+    reference = rapports(GestionStock(stockage=StockageCSV(donnees), paresseux=True, moteur_rapport="python"))
+    if disposition == "colonnes":
+        migrer_csv_vers_colonnes(donnees)
+        stockage = StockageColonnes(donnees)
+    else:
+        stockage = StockageCSV(donnees)
+    gestion_stock = GestionStock(stockage=stockage, moteur_rapport="python", processus_rapport=3)
+    cache = gestion_stock._cache_rapports
+    cache.SEUIL_PARALLELE = 100
+    copies = []
+    bloc = cache._bloc
+    cache._bloc = lambda colonne, blocs: copies.append(len(colonne)) or bloc(colonne, blocs)
+    try:
+        assert rapports(gestion_stock) == reference
+        assert cache._executeur is not None
+        # Seconde période : seule sa fenêtre est copiée en mémoire partagée
+        copies.clear()
+        cache.vider()
+        assert gestion_stock.rapport_inventaire(*PERIODES[1]) == reference[1]
+        assert disposition == "colonnes" or 0 < max(copies) < len(gestion_stock.ventes) // 2
+    finally:
+        gestion_stock.fermer()
+
+
+def test_rapport_sans_processus_ne_releve_pas_les_rangs(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees), moteur_rapport="python")
+    gestion_stock._chronos["ventes"].plage_horodatages = None
+    assert gestion_stock._cache_rapports._agreger_en_parallele("ventes", 0, 1 << 62) is None
+
+
+def test_index_chronologique_plages(donnees):
+    # Lignes déplacées hors de l'ordre chronologique, puis une correction qui date une ligne de maintenant
+    with open(f"{donnees}/ventes.csv") as fichier:
+        lignes = fichier.readlines()
+    lignes[1:41] = lignes[40:0:-1]
+    with open(f"{donnees}/ventes.csv", "w") as fichier:
+        fichier.writelines(lignes)
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees))
+    assert gestion_stock.modifier_transaction("ventes", 500, 4.5)
+    ventes = gestion_stock.ventes
+    ordre = list(gestion_stock.ordre_chronologique("ventes"))
+    assert sorted(ordre) == list(range(len(ventes)))
+    assert ordre == sorted(ordre, key=lambda rang: (ventes[rang]["date"], rang))
+    assert ordre[-1] == 500
+
+    alea = random.Random(1)
+    dates = [vente["date"] for vente in ventes]
+    for _ in range(50):
+        debut, fin = sorted(alea.sample(dates, 2))
+        fin += timedelta(seconds=alea.randint(0, 3600))
+        attendu = [rang for rang in range(len(ventes)) if debut <= ventes[rang]["date"] <= fin]
+        obtenu = [rang for rang, _ in gestion_stock.iterer_transactions("ventes", debut, fin, avec_rang=True)]
+        assert sorted(obtenu) == attendu
+        assert [vente["date"] for vente in gestion_stock._transactions_periode("ventes", debut, fin)] == \
+            sorted(ventes[rang]["date"] for rang in attendu)
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from Article import GestionStock, StockageCSV, StockageSQLite, migrer_csv_vers_sqlite
+from serveur import ErreurRequete, ServeurStock, VerrouLectureEcriture
+
+
+def test_lectures_pendant_les_ecritures(donnees):
+    async def scenario():
+        serveur = ServeurStock(GestionStock(stockage=StockageCSV(donnees, journal=True)))
+        await serveur.demarrer()
+        try:
+            _, reponse = await serveur.traiter("GET", "/articles", {"limite": "5"}, None)
+            article = reponse["articles"][0]
+            ecritures = [serveur.traiter("POST", "/ventes", {}, {"nom": article["nom"], "quantite": 1,
+                                                                "prix_vente": article["prix_vente"],
+                                                                "prix_achat": article["prix_achat"]})
+                         for _ in range(50)]
+            ecritures += [serveur.traiter("POST", "/articles", {}, {"nom": f"NOUVEAU {i}", "prix_vente": 2,
+                                                                   "prix_achat": 1}) for i in range(20)]
+            lectures = [serveur.traiter("GET", "/recherche", {"nom": "NOUVEAU", "limite": "100"}, None)
+                        for _ in range(50)]
+            lectures += [serveur.traiter("GET", "/ventes", {"limite": "1000"}, None) for _ in range(20)]
+            resultats = await asyncio.gather(*ecritures, *lectures)
+            assert all(statut < 400 for statut, _ in resultats)
+            _, reponse = await serveur.traiter("GET", "/recherche", {"nom": "NOUVEAU", "limite": "100"}, None)
+            assert len(reponse["articles"]) == 20
+        finally:
+            await serveur.arreter()
+    asyncio.run(scenario())
+
+
+def test_modification_par_identifiant(donnees):
+    async def scenario():
+        gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+        serveur = ServeurStock(gestion_stock)
+        await serveur.demarrer()
+        try:
+            _, reponse = await serveur.traiter("GET", "/ventes", {"debut": "2024-01-05", "limite": "2"}, None)
+            premiere, seconde = reponse["ventes"]
+            statut, _ = await serveur.traiter("PUT", f"/ventes/{seconde['id_transaction']}", {}, {"quantite": 0})
+            assert statut == 200 and gestion_stock.ventes[seconde["id_transaction"]]["quantite"] == 0
+            assert gestion_stock.ventes[premiere["id_transaction"]]["quantite"] == premiere["quantite"]
+            with pytest.raises(ErreurRequete):
+                await serveur.traiter("PUT", f"/ventes/{len(gestion_stock.ventes)}", {}, {"quantite": 1})
+            # Route obsolète : corrige la première ligne de la seconde et renvoie son identifiant
+            statut, reponse = await serveur.traiter("PUT", "/ventes", {}, {"id_article": premiere["id_article"],
+                                                                         "date": premiere["date"], "quantite": 2.5})
+            assert reponse["id_transaction"] == premiere["id_transaction"] and "obsolete" in reponse
+            assert gestion_stock.ventes[premiere["id_transaction"]]["quantite"] == 2.5
+        finally:
+            await serveur.arreter()
+    asyncio.run(scenario())
+
+
+def test_verrou_lecteurs_ensemble_ecrivain_seul():
+    verrou = VerrouLectureEcriture()
+    ordre = []
+    fin_lecture = threading.Event()
+
+    def lire(nom):
+        with verrou.lecture():
+            ordre.append(nom)
+            fin_lecture.wait(2)
+
+    def ecrire():
+        with verrou.ecriture():
+            ordre.append("ecrivain")
+    fils = [threading.Thread(target=lire, args=(nom,)) for nom in ("lecteur 1", "lecteur 2")]
+    for fil in fils:
+        fil.start()
+    # Les deux lecteurs sont entrés ensemble
+    while len(ordre) < 2:
+        pass
+    fils.append(threading.Thread(target=ecrire))
+    fils[-1].start()
+    while not verrou._ecrivains_en_attente:
+        pass
+    # Écrivain en attente : un nouveau lecteur passe après lui
+    fils.append(threading.Thread(target=lire, args=("lecteur 3",)))
+    fils[-1].start()
+    fils[-1].join(0.2)
+    assert sorted(ordre) == ["lecteur 1", "lecteur 2"]
+    fin_lecture.set()
+    for fil in fils:
+        fil.join(2)
+    assert ordre[2:] == ["ecrivain", "lecteur 3"]
+
+
+def test_rapport_sql_par_le_fil_d_ecriture(donnees):
+    migrer_csv_vers_sqlite(donnees)
+
+    async def scenario():
+        gestion_stock = GestionStock(stockage=StockageSQLite(os.path.join(donnees, StockageSQLite.FILENAME)),
+                                     politique_ecriture="groupee", intervalle_lot=60)
+        fils = []
+        flush = gestion_stock.flush
+        gestion_stock.flush = lambda: fils.append(threading.current_thread().name) or flush()
+        serveur = ServeurStock(gestion_stock)
+        await serveur.demarrer()
+        try:
+            article = gestion_stock.rechercher_article(4)
+            _, avant = await serveur.traiter("GET", "/rapport", {}, None)
+            for _ in range(3):
+                await serveur.traiter("POST", "/ventes", {}, {"nom": article.nom, "quantite": 2.5,
+                                                             "prix_vente": article.prix_vente,
+                                                             "prix_achat": article.prix_achat})
+            _, apres = await serveur.traiter("GET", "/rapport", {}, None)
+            assert apres["rapport"][article.nom]["valeur_vente"] == \
+                pytest.approx(avant["rapport"][article.nom]["valeur_vente"] + 7.5 * article.prix_vente)
+            assert fils and all(nom.startswith("ecrivain") for nom in fils)
+        finally:
+            await serveur.arreter()
+    asyncio.run(scenario())
@@ -0,0 +1,383 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from Article import (GestionStock, StockageColonnes, StockageCSV, StockageSegments, StockageSQLite,
+                     migrer_csv_vers_colonnes, migrer_csv_vers_segments, migrer_csv_vers_sqlite)
+
+
+def stockage_csv(dossier):
+    return StockageCSV(dossier, journal=True)
+
+
+def stockage_segments(dossier):
+    migrer_csv_vers_segments(dossier)
+    return StockageSegments(dossier)
+
+
+def stockage_sqlite(dossier):
+    migrer_csv_vers_sqlite(dossier)
+    return StockageSQLite(os.path.join(dossier, StockageSQLite.FILENAME))
+
+
+def stockage_colonnes(dossier):
+    migrer_csv_vers_colonnes(dossier)
+    return StockageColonnes(dossier)
+
+
+def rouvrir(stockage):
+    if isinstance(stockage, StockageSQLite):
+        return StockageSQLite(stockage.filename)
+    if stockage.journaux:
+        return StockageCSV(stockage.dossier, journal=True)
+    return type(stockage)(stockage.dossier)
+
+
+@pytest.mark.parametrize("fabrique", [stockage_csv, stockage_segments])
+def test_bornes_avec_microsecondes(donnees, fabrique):
+    stockage = fabrique(donnees)
+    charge = GestionStock(stockage=StockageCSV(donnees))
+    seconde = charge.ventes[100]["date"]
+    # Bornes au milieu de la seconde d'une ligne : la ligne est avant le début et après la fin
+    debut, fin = seconde.replace(microsecond=500000), seconde.replace(microsecond=0)
+    for date_debut, date_fin in ((debut, datetime.max), (datetime.min, fin), (debut, fin.replace(hour=23))):
+        attendu = sorted(rang for rang, _ in charge.iterer_transactions("ventes", date_debut, date_fin, avec_rang=True))
+        assert sorted(rang for rang, _ in stockage.iterer_transactions("ventes", date_debut, date_fin)) == attendu
+
+
+@pytest.mark.parametrize("politique", GestionStock.POLITIQUES_ECRITURE)
+def test_segments_dossier_vide(tmp_path, politique):
+    gestion_stock = GestionStock(stockage=StockageSegments(str(tmp_path)), politique_ecriture=politique)
+    assert gestion_stock.lister_ventes() is not None and len(gestion_stock.achats) == 0
+    assert gestion_stock.ajouter_article("CAHIER", 2.5, 1.5)
+    assert gestion_stock.enregistrer_vente("CAHIER", 2.5, 1.5, 1.5)
+    gestion_stock.fermer()
+    gestion_stock = GestionStock(stockage=StockageSegments(str(tmp_path)))
+    assert len(gestion_stock.ventes) == 1 and len(gestion_stock.achats) == 0
+    gestion_stock.fermer()
+
+
+def test_segments_migration_sans_achats(donnees):
+    os.remove(os.path.join(donnees, "achats.csv"))
+    migrer_csv_vers_segments(donnees)
+    gestion_stock = GestionStock(stockage=StockageSegments(donnees))
+    assert len(gestion_stock.ventes) == 3000 and len(gestion_stock.achats) == 0
+    gestion_stock.fermer()
+
+
+def test_segments_sauvegarde_garde_les_archives(donnees):
+    migrer_csv_vers_segments(donnees)
+    stockage = StockageSegments(donnees)
+    gestion_stock = GestionStock(stockage=stockage)
+    assert stockage.compresser_segments("ventes", datetime(2024, 2, 1)) == 1
+    archive = stockage._manifeste("ventes")[0]["fichier"]
+    assert archive.endswith(".gz")
+    lus = []
+    ouvrir = stockage._ouvrir_segment
+    stockage._ouvrir_segment = lambda nature, segment: lus.append(segment["fichier"]) or ouvrir(nature, segment)
+    gestion_stock.sauvegarder_ventes()
+    # Segment inchangé : ni relu ni récrit, toujours compressé
+    assert lus == [] and stockage._manifeste("ventes")[0]["fichier"] == archive
+    assert os.path.exists(os.path.join(donnees, "ventes", archive))
+
+    # Une correction dans l'archive fait récrire ce segment seulement
+    vente = dict(gestion_stock.ventes[10], quantite=99.5)
+    gestion_stock._corriger_transaction("ventes", 10, vente)
+    fichiers = [segment["fichier"] for segment in stockage._manifeste("ventes")]
+    gestion_stock.sauvegarder_ventes()
+    apres = [segment["fichier"] for segment in stockage._manifeste("ventes")]
+    assert apres[0] != archive and apres[1:-1] == fichiers[1:-1]
+    assert not os.path.exists(os.path.join(donnees, "ventes", archive))
+    gestion_stock.fermer()
+    assert GestionStock(stockage=StockageSegments(donnees)).ventes[10]["quantite"] == 99.5
+
+
+def test_journal_rejoue_apres_ecriture_tronquee(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert gestion_stock.enregistrer_vente("ARTICLE 3", *prix(gestion_stock, 3), 2.5)
+    assert gestion_stock.enregistrer_vente("ARTICLE 4", *prix(gestion_stock, 4), 1.5)
+    attendu = [(vente["id_article"], vente["quantite"]) for vente in gestion_stock.ventes]
+    # Arrêt brutal : le journal n'est pas replié et sa dernière ligne est coupée
+    gestion_stock.stockage.fermer()
+    with open(os.path.join(donnees, "ventes.journal"), "a", newline='') as journal:
+        journal.write("+,3002,5,7.")
+
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert [(vente["id_article"], vente["quantite"]) for vente in gestion_stock.ventes] == attendu
+    # La ligne suivante ne se colle pas au morceau tronqué
+    assert gestion_stock.enregistrer_vente("ARTICLE 5", *prix(gestion_stock, 5), 4.0)
+    gestion_stock.stockage.fermer()
+    relu = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert len(relu.ventes) == 3003 and relu.ventes[3002]["quantite"] == 4.0
+    assert relu.rechercher_article(5).stock == gestion_stock.rechercher_article(5).stock
+    relu.fermer()
+
+
+def test_segment_ouvert_relu_apres_ecriture_tronquee(donnees):
+    migrer_csv_vers_segments(donnees)
+
+    def couper_segment_ouvert():
+        segment = StockageSegments(donnees)._manifeste("ventes")[-1]
+        with open(os.path.join(donnees, "ventes", segment["fichier"]), "a", newline='') as fichier:
+            fichier.write("5,2.0,2024-0")
+
+    # Dernier segment migré coupé, puis clos par une vente datée d'aujourd'hui
+    couper_segment_ouvert()
+    gestion_stock = GestionStock(stockage=StockageSegments(donnees))
+    assert len(gestion_stock.ventes) == 3000
+    assert gestion_stock.enregistrer_vente("ARTICLE 3", *prix(gestion_stock, 3), 2.5)
+    gestion_stock.fermer()
+    # Le nouveau segment ouvert est coupé à son tour
+    couper_segment_ouvert()
+    gestion_stock = GestionStock(stockage=StockageSegments(donnees), paresseux=True)
+    assert gestion_stock.nb_transactions("ventes") == 3001
+    assert gestion_stock.enregistrer_vente("ARTICLE 5", *prix(gestion_stock, 5), 4.0)
+    gestion_stock.fermer()
+    relu = GestionStock(stockage=StockageSegments(donnees))
+    assert [(vente["id_article"], vente["quantite"]) for vente in relu.ventes[3000:]] == [(3, 2.5), (5, 4.0)]
+    assert relu.ventes[:3000] == list(GestionStock(stockage=StockageCSV(donnees)).ventes)
+    assert relu.verifier_stocks() == {}
+    relu.fermer()
+
+
+def prix(gestion_stock, id_article):
+    article = gestion_stock.rechercher_article(id_article)
+    return article.prix_vente, article.prix_achat
+
+
+@pytest.mark.parametrize("politique", ["immediate", "groupee"])
+@pytest.mark.parametrize("fabrique", [stockage_csv, stockage_segments, stockage_sqlite, stockage_colonnes])
+def test_ajout_paresseux_sans_charger_l_historique(donnees, fabrique, politique):
+    stockage = fabrique(donnees)
+    stockage.SEUIL_COMPACTION = 20
+    gestion_stock = GestionStock(stockage=stockage, paresseux=True, politique_ecriture=politique)
+    stock = gestion_stock.rechercher_article(3).stock
+    for i in range(30):
+        assert gestion_stock.enregistrer_vente("ARTICLE 3", *prix(gestion_stock, 3), i + 0.5)
+    assert gestion_stock._transactions["ventes"] is None
+    assert gestion_stock.nb_transactions("ventes") == 3030
+    assert gestion_stock.rechercher_article(3).stock == pytest.approx(stock - sum(i + 0.5 for i in range(30)))
+    page = gestion_stock.page_transactions("ventes", 3025, 3040)
+    assert [rang for rang, _ in page] == list(range(3025, 3030)) and page[-1][1]["quantite"] == 29.5
+    assert gestion_stock._transactions["ventes"] is None
+    gestion_stock.fermer()
+
+    relu = GestionStock(stockage=rouvrir(stockage))
+    assert len(relu.ventes) == 3030
+    assert [vente["quantite"] for vente in relu.ventes[3000:]] == [i + 0.5 for i in range(30)]
+    assert relu.verifier_stocks() == {}
+    relu.fermer()
+
+
+def test_stocks_incrementaux_et_point_de_controle(donnees):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    gestion_stock.INTERVALLE_CHECKPOINT = 10
+    for i in range(25):
+        assert gestion_stock.enregistrer_vente("ARTICLE 2", *prix(gestion_stock, 2), 1.5)
+    assert gestion_stock.enregistrer_achat("ARTICLE 2", *prix(gestion_stock, 2), 100)
+    stocks = {article.id_article: article.stock for article in gestion_stock.lister_articles()}
+    assert gestion_stock.verifier_stocks() == {}
+    point = gestion_stock.stockage.lire_checkpoint()
+    assert point["ventes"]["rang"] == 3020 and point["achats"]["rang"] == 800
+
+    # Rechargement : seules les lignes après le point de contrôle sont rejouées
+    gestion_stock.stockage.fermer()
+    relu = GestionStock(stockage=StockageCSV(donnees, journal=True), paresseux=True)
+    lues = []
+    iterer = relu.stockage.iterer_transactions
+    relu.stockage.iterer_transactions = lambda nature, *args, depuis=0, **kwargs: \
+        lues.append((nature, depuis)) or iterer(nature, *args, depuis=depuis, **kwargs)
+    assert {article.id_article: article.stock for article in relu.lister_articles()} == stocks
+    assert sorted(lues) == [("achats", 799), ("ventes", 3019)]
+    assert relu._transactions["ventes"] is None
+
+    # Une correction déjà couverte refait le point de contrôle
+    relu.stockage.iterer_transactions = iterer
+    assert relu.modifier_transaction("ventes", 5, 0)
+    point = relu.stockage.lire_checkpoint()["ventes"]
+    assert point["cumuls"] == {str(id_article): quantite for id_article, quantite in relu._cumuls["ventes"].items()}
+    assert relu.verifier_stocks() == {}
+    relu.fermer()
+
+    # Un point de contrôle qui ne correspond plus aux fichiers est ignoré
+    with open(os.path.join(donnees, "ventes.csv")) as fichier:
+        lignes = fichier.readlines()
+    with open(os.path.join(donnees, "ventes.csv"), "w") as fichier:
+        fichier.writelines(lignes[:-1])
+    tronque = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert tronque.verifier_stocks() == {}
+    tronque.fermer()
+
+
+def test_modification_par_date_quantite_nulle(donnees, capsys):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    for nature, modifier in (("ventes", gestion_stock.modifier_vente), ("achats", gestion_stock.modifier_achat)):
+        transaction = gestion_stock.lire_transaction(nature, 7)
+        date = transaction["date"].strftime("%Y-%m-%d %H:%M:%S.%f")
+        assert modifier(transaction["id_article"], 0, date)
+        assert gestion_stock.lire_transaction(nature, 7)["quantite"] == 0
+        assert not modifier(transaction["id_article"], 1, "1999-01-01 00:00:00.000000")
+    assert gestion_stock.verifier_stocks() == {}
+    assert capsys.readouterr().out == ""
+    gestion_stock.fermer()
+
+
+def test_instantane_relu_puis_invalide(donnees, monkeypatch):
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert gestion_stock.enregistrer_vente("ARTICLE 6", *prix(gestion_stock, 6), 2.5)
+    attendu = [list(gestion_stock.ventes), list(gestion_stock.achats)]
+    stocks = [(article.id_article, article.nom, article.stock) for article in gestion_stock.lister_articles()]
+    gestion_stock.fermer()
+    filename = os.path.join(donnees, StockageCSV.FILENAME_INSTANTANE)
+    assert os.path.exists(filename)
+
+    def relire(instantane_attendu):
+        lectures = []
+        iterer = StockageCSV.iterer_transactions
+        monkeypatch.setattr(StockageCSV, "iterer_transactions", lambda self, nature, *args, **kwargs:
+                            lectures.append(nature) or iterer(self, nature, *args, **kwargs))
+        relu = GestionStock(stockage=StockageCSV(donnees, journal=True))
+        monkeypatch.setattr(StockageCSV, "iterer_transactions", iterer)
+        # Avec l'instantané, aucune ligne CSV n'est relue
+        assert (lectures == []) == instantane_attendu
+        return relu
+
+    relu = relire(True)
+    assert [(article.id_article, article.nom, article.stock) for article in relu.lister_articles()] == stocks
+    assert [list(relu.ventes), list(relu.achats)] == attendu
+    relu.stockage.fermer()
+
+    # Fichier source modifié : l'instantané est périmé
+    with open(os.path.join(donnees, "achats.csv"), "a") as fichier:
+        fichier.write("6,10.0,2024-03-01 10:00:00\n")
+    relu = relire(False)
+    assert len(relu.achats) == 801 and relu.rechercher_article(6).stock == stocks[5][2] + 10
+    relu.fermer()
+    relu = relire(True)
+    assert len(relu.achats) == 801
+    relu.stockage.fermer()
+
+    # Contenu abîmé : rejeté par le CRC
+    with open(filename, "r+b") as fichier:
+        fichier.seek(-3, os.SEEK_END)
+        fichier.write(b"\xff\xff\xff")
+    relu = relire(False)
+    assert len(relu.ventes) == 3001
+    relu.stockage.fermer()
+
+
+def test_colonnes_lecteur_ne_tronque_pas(donnees):
+    migrer_csv_vers_colonnes(donnees)
+    filename = os.path.join(donnees, "ventes.ids")
+    # Ajout d'un autre processus en cours : la colonne des ids a déjà sa nouvelle valeur
+    with open(filename, "ab") as fichier:
+        fichier.write((7).to_bytes(8, "little"))
+    lecteur = StockageColonnes(donnees)
+    assert len(lecteur.lire_table("ventes")) == 3000
+    assert os.path.getsize(filename) == 3001 * 8
+    lecteur.fermer()
+    assert os.path.getsize(filename) == 3001 * 8
+
+    # Arrêt de cet ajout : le surplus est coupé par le prochain ajout
+    gestion_stock = GestionStock(stockage=StockageColonnes(donnees))
+    assert gestion_stock.enregistrer_vente("ARTICLE 9", *prix(gestion_stock, 9), 3.5)
+    gestion_stock.fermer()
+    assert {os.path.getsize(os.path.join(donnees, f"ventes.{colonne}")) for colonne in ("ids", "quantites", "dates")} \
+        == {3001 * 8}
+    relu = GestionStock(stockage=StockageColonnes(donnees))
+    assert relu.ventes[3000]["id_article"] == 9 and relu.ventes[3000]["quantite"] == 3.5
+    relu.fermer()
+
+
+@pytest.mark.parametrize("fabrique", [stockage_csv, stockage_colonnes])
+def test_index_chronologique_sans_copie(donnees, fabrique):
+    gestion_stock = GestionStock(stockage=fabrique(donnees))
+    chrono = gestion_stock._chronos["ventes"]
+    # Historique dans l'ordre : la colonne de dates de la table sert d'index
+    assert chrono._base is gestion_stock.ventes and len(chrono._dates) == 0
+    assert gestion_stock.enregistrer_vente("ARTICLE 1", *prix(gestion_stock, 1), 1.0)
+    assert len(chrono._dates) == 0
+    for rang in (0, 1500, 2999, 1500):
+        assert gestion_stock.modifier_transaction("ventes", rang, 2.0)
+    vente = {"id_article": 2, "quantite": 1.0, "date": datetime(2024, 1, 15, 12)}
+    gestion_stock._ajouter_transaction("ventes", vente)
+    assert sorted(chrono._anciennes) == [0, 1500, 2999] and len(chrono._dates) == 4
+
+    ventes = gestion_stock.ventes
+    attendu = sorted(range(len(ventes)), key=lambda rang: (ventes[rang]["date"], rang))
+    assert list(gestion_stock.ordre_chronologique("ventes")) == attendu
+    for debut, fin in ((datetime.min, datetime.max), (datetime(2024, 1, 15), datetime(2024, 1, 16)),
+                       (datetime(2024, 1, 1), datetime(2024, 1, 1, 9)), (datetime.now(), datetime.max)):
+        assert list(gestion_stock._chronos["ventes"].plage(debut, fin)) == \
+            [rang for rang in attendu if debut <= ventes[rang]["date"] <= fin]
+    gestion_stock.fermer()
+
+
+def test_ecritures_groupees(donnees):
+    lues = lambda: sum(1 for _ in StockageCSV(donnees, journal=True).iterer_transactions("ventes"))
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True), politique_ecriture="groupee",
+                                 taille_lot=5, intervalle_lot=60)
+    vendre = lambda: gestion_stock.enregistrer_vente("ARTICLE 8", *prix(gestion_stock, 8), 1.0)
+    for _ in range(4):
+        assert vendre()
+    # Les ventes en attente sont déjà visibles en mémoire, pas encore sur disque
+    assert len(gestion_stock.ventes) == 3004 and lues() == 3000
+    assert vendre()
+    assert lues() == 3005
+    gestion_stock.intervalle_lot = 0.05
+    assert vendre()
+    time.sleep(0.5)
+    assert lues() == 3006
+    gestion_stock.fermer()
+
+    gestion_stock = GestionStock(stockage=StockageCSV(donnees, journal=True), politique_ecriture="fermeture")
+    for _ in range(20):
+        assert vendre()
+    assert lues() == 3006
+    assert gestion_stock.flush() == 20 and gestion_stock.flush() == 0
+    assert lues() == 3026
+    gestion_stock.fermer()
+    assert GestionStock(stockage=StockageCSV(donnees)).verifier_stocks() == {}
+
+
+def vendre_en_parallele(dossier, nombre):
+    gestion_stock = GestionStock(stockage=StockageCSV(dossier, journal=True), paresseux=True, partage=True)
+    for _ in range(nombre):
+        assert gestion_stock.enregistrer_vente("ARTICLE 12", *prix(gestion_stock, 12), 1.0)
+    gestion_stock.fermer()
+
+
+def test_coordination_entre_processus(donnees):
+    caisse = GestionStock(stockage=StockageCSV(donnees, journal=True), partage=True)
+    bureau = GestionStock(stockage=StockageCSV(donnees, journal=True), partage=True)
+    assert caisse.enregistrer_vente("ARTICLE 5", *prix(caisse, 5), 2.0)
+    assert bureau.synchroniser() and not bureau.synchroniser()
+    assert len(bureau.ventes) == 3001 and bureau.rechercher_article(5).stock == caisse.rechercher_article(5).stock
+    assert bureau.ajouter_article("AGENDA", 9.0, 6.0)
+    assert bureau.modifier_transaction("ventes", 10, 0)
+    assert caisse.synchroniser()
+    assert [article.nom for article in caisse.rechercher_article_par_nom("agenda")] == ["AGENDA"]
+    assert caisse.ventes[10]["quantite"] == 0
+    # Rang attribué sous le verrou : la vente de la caisse suit celle du bureau, sans rattrapage explicite
+    assert bureau.enregistrer_vente("AGENDA", 9.0, 6.0, 1.0)
+    assert caisse.enregistrer_vente("AGENDA", 9.0, 6.0, 2.0)
+    assert [vente["quantite"] for vente in caisse.ventes[3001:]] == [1.0, 2.0]
+    caisse.fermer()
+    bureau.fermer()
+
+    contexte = multiprocessing.get_context("spawn")
+    processus = [contexte.Process(target=vendre_en_parallele, args=(donnees, 40)) for _ in range(2)]
+    for fil in processus:
+        fil.start()
+    for fil in processus:
+        fil.join(60)
+    assert [fil.exitcode for fil in processus] == [0, 0]
+    relu = GestionStock(stockage=StockageCSV(donnees, journal=True))
+    assert len(relu.ventes) == 3083
+    assert sum(1 for vente in relu.ventes if vente["id_article"] == 12) == \
+        sum(1 for vente in caisse.ventes[:3003] if vente["id_article"] == 12) + 80
+    assert relu.verifier_stocks() == {}
+    relu.fermer()